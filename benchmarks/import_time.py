@@ -0,0 +1,116 @@
+"""Measures the startup cost of pcshell in fresh interpreters:
+
+- `import`: importing the package
+- `oneshot`: running a single command of a small app, as a script or a cron job would
+
+Also reports which interactive-only modules (prompt_toolkit, pygments, ...) each scenario loaded.
+
+Usage: python benchmarks/import_time.py [--runs N] [--json] [--check]
+"""
+
+from collections import OrderedDict
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that only the interactive shell should need
+INTERACTIVE_MODULES = ('prompt_toolkit', 'pygments', 'pcshell._lexer', 'pcshell._completion', 'asyncio')
+
+
+APP = '''
+import pcshell
+
+@pcshell.shell(prompt='bench', intro='')
+def app():
+    pass
+
+@app.command()
+@pcshell.option('--name', default='world')
+def hello(name):
+    return {'hello': name}
+
+if __name__ == '__main__':
+    app()
+'''
+
+PROBE = '''
+import sys, time, json, runpy
+start = time.perf_counter()
+sys.argv = {argv!r}
+{body}
+elapsed = time.perf_counter() - start
+sys.stdout.flush()
+sys.stderr.write(json.dumps({{'elapsed': elapsed, 'modules': [m for m in {modules!r} if m in sys.modules]}}) + '\\n')
+'''
+
+SCENARIOS = OrderedDict([
+    ('import', dict(argv=['-c'], body='import pcshell')),
+    ('oneshot', dict(argv=['app.py', 'hello', '--name', 'bench'], body='''
+try: runpy.run_path(sys.argv[0], run_name='__main__')
+except SystemExit: pass
+''')),
+])
+
+
+def RunScenario(name: str, app: str, runs: int) -> dict:
+    scenario = SCENARIOS[name]
+    argv = [app if arg == 'app.py' else arg for arg in scenario['argv']]
+    code = PROBE.format(argv=argv, body=scenario['body'], modules=INTERACTIVE_MODULES)
+
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT, env.get('PYTHONPATH')]))
+
+    samples, modules = [], []
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, '-c', code], env=env, cwd=os.path.dirname(app),
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+        result = json.loads(proc.stderr.strip().splitlines()[-1])
+        samples.append(result['elapsed'] * 1000)
+        modules = result['modules']
+
+    return OrderedDict([
+        ('runs', runs),
+        ('min_ms', round(min(samples), 2)),
+        ('median_ms', round(statistics.median(samples), 2)),
+        ('max_ms', round(max(samples), 2)),
+        ('interactive_modules', modules),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the startup cost of pcshell')
+    parser.add_argument('--runs', type=int, default=10, help='Fresh interpreters per scenario')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    parser.add_argument('--check', action='store_true', help='Fail if a scenario loaded an interactive-only module')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = os.path.join(directory, 'app.py')
+        with open(app, 'w') as f: f.write(APP)
+
+        # Warm up the bytecode cache, so the first run is not an outlier
+        RunScenario('oneshot', app, 1)
+        results = OrderedDict((name, RunScenario(name, app, args.runs)) for name in SCENARIOS)
+
+    report = OrderedDict([('python', sys.version.split()[0]), ('scenarios', results)])
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for name, result in results.items():
+            print('{:<8} min {:>8.2f} ms   median {:>8.2f} ms   max {:>8.2f} ms   interactive modules: {}'.format(
+                name, result['min_ms'], result['median_ms'], result['max_ms'], ', '.join(result['interactive_modules']) or 'none'))
+
+    if args.check and any(result['interactive_modules'] for result in results.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+"""Measures how pcshell scales with the size & shape of an application, using synthetic command hierarchies.
+
+Each scenario builds an app in a fresh interpreter, then measures:
+
+- `import`: importing pcshell
+- `register`: creating the shell & registering every group, command, alias & option
+- `completion_tree`: `BuildCompletionTree`
+- `first_prompt`: creating & rendering the first prompt (prompt_toolkit, without a terminal)
+- `completion` / `lexing`: per keystroke, while typing sample command lines
+- `parse` / `invoke`: per sample command line
+- `help`: rendering `get_help` of the shell & sample commands
+
+Usage:
+    python benchmarks/startup.py [--commands 100,1000,10000] [--depth 1,3,6] [--options 0,10,50]
+                                 [--aliases N] [--matrix] [--samples N] [--output results.json]
+
+By default each dimension is varied on its own around a baseline (1000 commands, depth 3, 10 options);
+`--matrix` runs every combination instead. The results are written as JSON (to stdout, or `--output`)
+"""
+
+from collections import OrderedDict
+from itertools import product
+
+import os
+import sys
+import json
+import time
+import shlex
+import argparse
+import platform
+import tempfile
+import subprocess
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BASELINE = OrderedDict([('commands', 1000), ('depth', 3), ('options', 10)])
+
+# Sub-groups created under each group, until the requested depth is reached
+FANOUT = 3
+
+
+#------------------------------------------------------------------------------
+#  ANCHOR Scenarios (parent process)
+
+def Scenarios(args) -> list:
+    values = OrderedDict([('commands', args.commands), ('depth', args.depth), ('options', args.options)])
+
+    if args.matrix:
+        combos = [OrderedDict(zip(values, combo)) for combo in product(*values.values())]
+    else:
+        combos = []
+        for key, choices in values.items():
+            for value in choices:
+                combo = OrderedDict(BASELINE)
+                combo[key] = value
+                if combo not in combos: combos.append(combo)
+
+    for combo in combos:
+        combo['aliases'] = args.aliases
+        combo['samples'] = args.samples
+    return combos
+
+
+def RunScenario(config: dict) -> dict:
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT, env.get('PYTHONPATH')]))
+    # Keep the user's history untouched (the home directory is HOME on POSIX, USERPROFILE on Windows)
+    env['HOME'] = env['USERPROFILE'] = tempfile.gettempdir()
+
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--probe', json.dumps(config)], env=env,
+        stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if proc.returncode != 0:
+        return OrderedDict([('config', config), ('error', proc.stderr.strip().splitlines()[-1:])])
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+#------------------------------------------------------------------------------
+#  ANCHOR Probe (child process)
+
+class Timer(object):
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+        return False
+
+
+def BuildApp(pcshell, config: dict):
+    """Creates the synthetic application. Returns the shell & a sample of (command path, command) pairs"""
+    count, depth, noptions, naliases = config['commands'], config['depth'], config['options'], config['aliases']
+    choice = pcshell.types.Choice(['alpha', 'beta', 'gamma'])
+
+    @pcshell.shell(prompt='bench', intro='')
+    def app():
+        """Synthetic benchmark application"""
+
+    # Groups nested up to the requested depth; commands are spread over the deepest ones
+    containers = [((), app)]
+    for level in range(1, depth):
+        nested = []
+        for path, parent in containers:
+            for i in range(FANOUT):
+                name = 'g{}x{}'.format(level, i)
+                nested.append((path + (name,), parent.group(name, help='Group {}'.format(name))(lambda: None)))
+        containers = nested
+
+    def add_options(f):
+        for i in range(noptions):
+            name = '--opt{}'.format(i)
+            if i % 5 == 4: f = pcshell.option(name, default=[], literal_tuple_type=[str, float, bool, choice], help='A typed tuple literal')(f)
+            elif i % 7 == 6: f = pcshell.option(name, default=(None, None), type=(str, int), help='A click tuple')(f)
+            elif i % 3 == 0: f = pcshell.option(name, type=int, help='An integer')(f)
+            elif i % 3 == 1: f = pcshell.option(name, type=choice, help='A choice')(f)
+            else: f = pcshell.option(name, is_flag=True, help='A flag')(f)
+        return pcshell.argument('target', type=str, required=False, help='A string argument')(f)
+
+    def callback(target=None, **kwargs):
+        return target
+
+    sample = []
+    every = max(count // config['samples'], 1)
+    for index in range(count):
+        path, container = containers[index % len(containers)]
+        name = 'cmd{}'.format(index)
+        names = [name] + ['{}a{}'.format(name, i) for i in range(naliases)]
+        f = add_options(lambda **kwargs: callback(**kwargs))
+
+        if isinstance(container, pcshell.MultiCommandShell):
+            cmd = container.command(names, help='Command {}'.format(index))(f)
+        else:
+            # Plain groups have no alias support; their commands are registered under every name
+            cmd = pcshell.command(name, help='Command {}'.format(index))(f)
+            container.add_command(cmd, names)
+
+        if index % every == 0: sample.append((list(path) + [name], cmd))
+
+    return app, sample[:config['samples']]
+
+
+def SampleArgs(cmd) -> str:
+    """Valid arguments for a sample command, as typed in the shell: a value for its first options & the argument"""
+    args = []
+    for param in cmd.params[:6]:
+        if not param.opts or not param.opts[0].startswith('--'): continue
+        if getattr(param, 'literal_tuple_type', None): args += [param.opts[0], '[text, 1.5, true, alpha]']
+        elif param.is_flag: args += [param.opts[0]]
+        elif param.nargs == 2: args += [param.opts[0], 'text', '2']
+        elif param.type.name == 'integer': args += [param.opts[0], '3']
+        elif param.type.name == 'choice': args += [param.opts[0], 'beta']
+    return ' '.join(args + ['target'])
+
+
+def Probe(config: dict) -> OrderedDict:
+    results = OrderedDict([('config', config)])
+    # The shell (rather than a single command) is being started
+    sys.argv = [sys.argv[0]]
+
+    with Timer() as t:
+        import pcshell
+    results['import_ms'] = round(t.elapsed * 1000, 3)
+
+    import click
+    from pcshell._replay import Summary
+    from io import StringIO
+    from contextlib import redirect_stdout
+
+    with Timer() as t:
+        app, sample = BuildApp(pcshell, config)
+    results['register_ms'] = round(t.elapsed * 1000, 3)
+
+    ctx = app.make_context('bench', [])
+    ctx.info_name = None
+    app.shell.ctx = ctx
+
+    from pcshell._completion import BuildCompletionTree, get_completer
+    with Timer() as t:
+        BuildCompletionTree(ctx)
+    results['completion_tree_ms'] = round(t.elapsed * 1000, 3)
+
+    from prompt_toolkit.document import Document
+    from prompt_toolkit.completion import CompleteEvent
+    from prompt_toolkit.lexers import PygmentsLexer
+    from pcshell._lexer import ShellLexer
+
+    with Timer() as t:
+        RenderFirstPrompt(app, get_completer, ShellLexer)
+    results['first_prompt_ms'] = round(t.elapsed * 1000, 3)
+
+    lines = [' '.join(path + [SampleArgs(cmd)]) for path, cmd in sample]
+    completer, lexer = get_completer(True), PygmentsLexer(ShellLexer)
+    completion, lexing = [], []
+    for line in lines:
+        for end in range(1, len(line) + 1):
+            document = Document(line[:end])
+            with Timer() as t:
+                list(completer.get_completions(document, CompleteEvent(text_inserted=True)))
+            completion.append(t.elapsed)
+
+            with Timer() as t:
+                lexer.lex_document(document)(0)
+            lexing.append(t.elapsed)
+    results['completion_per_keystroke'] = Summary(completion)
+    results['lexing_per_keystroke'] = Summary(lexing)
+
+    parse, invoke = [], []
+    with redirect_stdout(StringIO()):
+        for (path, cmd), line in zip(sample, lines):
+            # Split as the shell does before handing the arguments to click (typed tuples are parsed from the line)
+            args = shlex.split(SampleArgs(cmd))
+            app.shell.current_line = line
+            with Timer() as t:
+                with cmd.make_context(path[-1], args, parent=ctx): pass
+            parse.append(t.elapsed)
+
+            with Timer() as t:
+                app.shell.onecmd(line)
+            invoke.append(t.elapsed)
+            if app.shell.last_error is not None:
+                results.setdefault('invoke_errors', []).append('{}: {}'.format(line, app.shell.last_error))
+    results['parse'] = Summary(parse)
+    results['invoke'] = Summary(invoke)
+
+    help = []
+    for target in [app] + [cmd for _, cmd in sample]:
+        with Timer() as t:
+            with click.Context(target, info_name=target.name, parent=ctx if target is not app else None) as help_ctx:
+                target.get_help(help_ctx)
+        help.append(t.elapsed)
+    results['help'] = Summary(help)
+
+    return results
+
+
+def RenderFirstPrompt(app, get_completer, ShellLexer) -> None:
+    """Creates the prompt as the shell does, renders it without a terminal, and submits an empty line"""
+    from prompt_toolkit.shortcuts import PromptSession
+    from prompt_toolkit.lexers import PygmentsLexer
+    from prompt_toolkit.output import DummyOutput
+    from pcshell import colors
+    from pcshell.chars import PROMPT_SYMBOL
+    from pcshell._utils import CreatePipeInput
+
+    with CreatePipeInput() as pipe:
+        pipe.send_text('\r')
+        session = PromptSession([('class:name', app.shell.get_prompt()), ('class:prompt', PROMPT_SYMBOL)],
+            style=colors.prompt_style, completer=get_completer(True), lexer=PygmentsLexer(ShellLexer),
+            input=pipe, output=DummyOutput())
+        session.prompt()
+
+
+#------------------------------------------------------------------------------
+
+def main():
+    def ints(value): return [int(item) for item in value.split(',') if item]
+
+    parser = argparse.ArgumentParser(description='Measure how pcshell scales with synthetic command hierarchies')
+    parser.add_argument('--commands', type=ints, default=[100, 1000, 10000], help='Comma-separated numbers of commands')
+    parser.add_argument('--depth', type=ints, default=[1, 3, 6], help='Comma-separated depths of the group hierarchy')
+    parser.add_argument('--options', type=ints, default=[0, 10, 50], help='Comma-separated numbers of options per command')
+    parser.add_argument('--aliases', type=int, default=3, help='Aliases per command')
+    parser.add_argument('--samples', type=int, default=20, help='Commands sampled for the per-command measurements')
+    parser.add_argument('--matrix', action='store_true', help='Run every combination of the dimensions')
+    parser.add_argument('--output', help='Write the results to this file instead of stdout')
+    parser.add_argument('--probe', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        print(json.dumps(Probe(json.loads(args.probe, object_pairs_hook=OrderedDict))))
+        return
+
+    results = []
+    for config in Scenarios(args):
+        sys.stderr.write('{}\n'.format(', '.join('{}={}'.format(k, v) for k, v in config.items())))
+        results.append(RunScenario(config))
+
+    report = OrderedDict([
+        ('python', platform.python_version()),
+        ('platform', platform.platform()),
+        ('scenarios', results),
+    ])
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f: f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
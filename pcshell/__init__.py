@@ -27,16 +27,27 @@ from . import chars
 from . import utils
 from . import multicommand
 from . import types
+from . import jobs
+from . import resources
+from . import output
+from . import metrics
+from . import daemon
 
 # Class Exports
 
 from ._cmd_factories import ClickCmdShell
 from .shell import MultiCommandShell, Shell
 
-try:
-    from ._lexer import ShellLexer
-    from ._completion import ClickCompleter, StyledFuzzyCompleter
-except: pass
+# The lexer & completers (which require prompt_toolkit & pygments) are only imported when first accessed
+
+def __getattr__(name):
+    if name == 'ShellLexer':
+        from ._lexer import ShellLexer
+        return ShellLexer
+    if name in ('ClickCompleter', 'StyledFuzzyCompleter'):
+        from . import _completion
+        return getattr(_completion, name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
 # Decorator Exports
 
@@ -44,7 +55,8 @@ from .decorators import (
     shell, argument, option,
     prettyCommand as command,
     prettyGroup as group,
-    repeatable, add_options
+    repeatable, add_options,
+    pass_resource, memoize
 )
 
 
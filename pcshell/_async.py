@@ -0,0 +1,98 @@
+from typing import TYPE_CHECKING
+
+import atexit
+import threading
+
+from . import globals as globs
+from ._jobs import IsCancelled, JobCancelled
+
+# asyncio is only imported once an async command is run
+if TYPE_CHECKING: import asyncio
+
+
+__LOOP__ = None
+__LOOP_THREAD__ = None
+__LOOP_LOCK__ = threading.Lock()
+
+
+def GetSessionLoop() -> 'asyncio.AbstractEventLoop':
+    """The event loop shared by every async command for the lifetime of the shell session.
+
+    The loop runs on its own thread, so loop-bound resources (client sessions, connection pools, etc.) survive
+    between commands, and commands running on any thread (e.g. background jobs) can use it
+    """
+    global __LOOP__, __LOOP_THREAD__
+    import asyncio
+
+    with __LOOP_LOCK__:
+        if __LOOP__ is None or __LOOP__.is_closed():
+            __LOOP__ = asyncio.new_event_loop()
+            __LOOP_THREAD__ = threading.Thread(target=__LOOP__.run_forever, name='pcshell-event-loop', daemon=True)
+            __LOOP_THREAD__.start()
+        return __LOOP__
+
+
+async def _await(awaitable):
+    return await awaitable
+
+
+def RunCoroutine(coro):
+    """Runs a coroutine (or any awaitable) on the session loop and blocks until it completes, returning its result.
+
+    A KeyboardInterrupt, or the cancellation of the job running it, cancels the coroutine
+    """
+    import asyncio
+    from concurrent.futures import TimeoutError as FutureTimeoutError
+
+    if not asyncio.iscoroutine(coro): coro = _await(coro)
+
+    loop = GetSessionLoop()
+    if threading.current_thread() is __LOOP_THREAD__:
+        raise RuntimeError('Cannot block on a coroutine from within the session event loop')
+
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    try:
+        while True:
+            try: return future.result(timeout=globs.JOB_POLL_INTERVAL)
+            except FutureTimeoutError:
+                if IsCancelled():
+                    future.cancel()
+                    raise JobCancelled()
+    except KeyboardInterrupt:
+        future.cancel()
+        raise
+
+
+def IterateAsync(iterator):
+    """Iterates over an async iterator (e.g. an `async def` generator) from synchronous code, one item at a time"""
+    while True:
+        try: yield RunCoroutine(iterator.__anext__())
+        except StopAsyncIteration: return
+
+
+def CloseSessionLoop() -> None:
+    """Cancels any remaining tasks, and stops & closes the session loop"""
+    global __LOOP__, __LOOP_THREAD__
+
+    with __LOOP_LOCK__:
+        loop, thread = __LOOP__, __LOOP_THREAD__
+        __LOOP__, __LOOP_THREAD__ = None, None
+
+    if loop is None or loop.is_closed(): return
+    import asyncio
+
+    async def shutdown():
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks: task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await loop.shutdown_asyncgens()
+
+    try: asyncio.run_coroutine_threadsafe(shutdown(), loop).result(timeout=globs.ASYNC_SHUTDOWN_TIMEOUT)
+    except Exception: pass
+
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout=globs.ASYNC_SHUTDOWN_TIMEOUT)
+    if not thread.is_alive(): loop.close()
+
+
+atexit.register(CloseSessionLoop)
@@ -0,0 +1,252 @@
+from typing import Hashable
+from collections import OrderedDict
+from copy import deepcopy
+
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+import traceback
+
+from logging import NullHandler
+
+import click
+
+from . import globals as globs
+from ._types import HiddenPassword
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(NullHandler())
+
+
+class LRUCache(object):
+    """A simple Least-Recently-Used mapping with a maximum number of entries"""
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key: Hashable):
+        return key in self._data
+
+    def get(self, key: Hashable, default=None):
+        try:
+            self._data.move_to_end(key)
+            return self._data[key]
+        except KeyError: return default
+
+    def put(self, key: Hashable, value: object) -> None:
+        if self.maxsize is not None and self.maxsize <= 0: return
+
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if self.maxsize is not None:
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def items(self):
+        return list(self._data.items())
+
+    def pop(self, key: Hashable, default=None):
+        return self._data.pop(key, default)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+#------------------------------------------------------------------------------
+#  ANCHOR Parse-Result Cache
+
+class ParseResult(object):
+    """The converted result of parsing a command's arguments"""
+
+    def __init__(self, ctx: click.Context):
+        self.params = deepcopy(ctx.params)
+        self.args = list(ctx.args)
+        self.original_params = list(getattr(ctx, 'original_params', []))
+        self.original_args = list(getattr(ctx, 'original_args', []))
+
+    def apply(self, ctx: click.Context) -> list:
+        ctx.params = deepcopy(self.params)
+        ctx.args = list(self.args)
+        ctx.original_params = list(self.original_params)
+        ctx.original_args = list(self.original_args)
+        return ctx.args
+
+
+PARSE_CACHE = LRUCache(globs.PARSE_CACHE_SIZE)
+
+
+def _opens_resource(param_type: click.ParamType) -> bool:
+    if isinstance(param_type, click.File): return True
+    return any(_opens_resource(t) for t in getattr(param_type, 'types', ()))
+
+
+def IsParseCacheable(cmd: click.Command) -> bool:
+    """A command may have its parse results cached if it has opted-in (`parse_cache=True`) and none of
+    its parameters can produce a different value for the same input (callbacks, prompts, env vars & callable defaults)
+    or convert to a live resource (`click.File`)
+    """
+    try: return cmd.__parse_cacheable__
+    except AttributeError: pass
+
+    ret = bool(getattr(cmd, 'parse_cache', False))
+    if ret:
+        for param in cmd.params:
+            if param.callback is not None or param.envvar or callable(param.default) or getattr(param, 'prompt', None) \
+                    or _opens_resource(param.type):
+                ret = False
+                break
+
+    cmd.__parse_cacheable__ = ret
+    return ret
+
+
+def GetParseCacheKey(ctx: click.Context, args: list) -> tuple:
+    return (ctx.command_path, tuple(args))
+
+
+def CacheParseResult(key: tuple, ctx: click.Context) -> None:
+    try: result = ParseResult(ctx)
+    except Exception:
+        # Values that cannot be copied are simply parsed again the next time
+        logger.debug('Could not cache the parse result of "%s"\n%s', ctx.command_path, traceback.format_exc())
+        return
+
+    # Size is read on every write so that `globals.PARSE_CACHE_SIZE` can be changed at any time
+    PARSE_CACHE.maxsize = globs.PARSE_CACHE_SIZE
+    PARSE_CACHE.put(key, result)
+
+
+def ApplyParseResult(key: tuple, ctx: click.Context) -> list:
+    """Applies the cached parse result for `key` onto `ctx`, returning the remaining args;
+    or `None` when nothing usable is cached and the arguments must be parsed normally
+    """
+    cached = PARSE_CACHE.get(key)
+    if cached is None: return None
+
+    try: return cached.apply(ctx)
+    except Exception:
+        logger.debug('Could not apply the cached parse result of "%s"\n%s', ctx.command_path, traceback.format_exc())
+        PARSE_CACHE.pop(key)
+        ctx.params = {}
+        return None
+
+
+def ClearParseCache() -> None:
+    PARSE_CACHE.clear()
+
+#------------------------------------------------------------------------------
+
+
+#------------------------------------------------------------------------------
+#  ANCHOR Command Result Cache
+
+class CachedResult(object):
+    def __init__(self, value: object, output: str, ttl: float = None):
+        self.value = value
+        self.output = output
+        self.expires = time.time() + ttl if ttl else None
+
+    @property
+    def expired(self) -> bool:
+        return self.expires is not None and time.time() >= self.expires
+
+
+def _normalize(value: object) -> object:
+    if isinstance(value, HiddenPassword): return { 'HiddenPassword': value.password }
+    if isinstance(value, (set, frozenset)): return sorted(value, key=repr)
+    return repr(value)
+
+
+class ResultCache(object):
+    """The memoized results (return value & output) of a command, keyed by its parameters.
+
+    Entries expire after `ttl` seconds (if given), the least recently used entries are dropped beyond `maxsize`,
+    and the cache is optionally persisted to the file at `path`
+    """
+
+    def __init__(self, ttl: float = None, maxsize: int = 128, path: str = None):
+        self.ttl = ttl
+        self.path = path
+        self._entries = LRUCache(maxsize)
+        self._loaded = path is None
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def key(params: dict) -> str:
+        data = json.dumps(params, sort_keys=True, default=_normalize)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> CachedResult:
+        with self._lock:
+            self.__load()
+            entry = self._entries.get(key)
+            if entry is not None and entry.expired:
+                self._entries.pop(key)
+                return None
+            return entry
+
+    def put(self, key: str, value: object, output: str = '') -> None:
+        with self._lock:
+            self.__load()
+            self._entries.put(key, CachedResult(value, output, self.ttl))
+            self.__save()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._loaded = True
+            if self.path and os.path.isfile(self.path):
+                try: os.remove(self.path)
+                except OSError: pass
+
+
+    def __load(self) -> None:
+        if self._loaded: return
+        self._loaded = True
+        import pickle
+
+        try:
+            with open(self.path, 'rb') as f:
+                entries = pickle.load(f)
+            for key, entry in entries:
+                if not entry.expired: self._entries.put(key, entry)
+        except FileNotFoundError: pass
+        except Exception:
+            logger.warning('Could not load the result cache "%s"\n%s', self.path, traceback.format_exc())
+
+    def __save(self) -> None:
+        if not self.path: return
+        import pickle
+
+        try:
+            data = pickle.dumps([(key, entry) for key, entry in self._entries.items() if not entry.expired])
+            directory = os.path.dirname(self.path)
+            if not os.path.isdir(directory): os.makedirs(directory)
+
+            # Written to a temporary file first, so that the cache file is replaced atomically
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+            try:
+                with os.fdopen(fd, 'wb') as f: f.write(data)
+                os.replace(tmp, self.path)
+            except BaseException:
+                os.remove(tmp)
+                raise
+        except Exception:
+            logger.warning('Could not save the result cache "%s"\n%s', self.path, traceback.format_exc())
+
+
+def GetResultCachePath(name: str) -> str:
+    filename = re.sub(r'[^\w.-]', '_', name) + '.cache'
+    return os.path.join(os.path.expanduser('~'), globs.RESULT_CACHE_DIRNAME, filename)
+
+#------------------------------------------------------------------------------
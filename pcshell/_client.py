@@ -0,0 +1,110 @@
+"""Thin client of the pcshell daemon (see `pcshell.daemon`).
+
+Forwards its arguments, environment, working directory & standard streams to the daemon listening on a Unix socket,
+and exits with the exit code of the command. Only the standard library is used, and nothing is imported from pcshell,
+so that running this file directly starts in a few milliseconds. It must be run in isolated mode (`-I`), otherwise
+the modules of the package directory (e.g. `types.py`) would shadow those of the standard library:
+
+    python -I -S /path/to/pcshell/_client.py <socket> [ARGS]...
+
+The socket may instead be given with the `PCSHELL_SOCKET` environment variable
+"""
+
+import os
+import sys
+import json
+import array
+import signal
+import socket
+import struct
+
+
+SOCKET_ENVVAR = 'PCSHELL_SOCKET'
+
+HEADER = struct.Struct('!I')
+STATUS = struct.Struct('!i')
+
+# Exit code of the client when the daemon could not run the command
+EXIT_UNAVAILABLE = 255
+
+
+def SendRequest(sock: socket.socket, request: dict, fds) -> None:
+    """Sends the length-prefixed JSON request, along with the file descriptors of the standard streams"""
+    payload = json.dumps(request).encode('utf-8')
+    data = HEADER.pack(len(payload)) + payload
+
+    sent = sock.sendmsg([data], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array('i', fds))])
+    if sent < len(data): sock.sendall(data[sent:])
+
+
+def ReceiveRequest(sock: socket.socket, nfds: int = 3):
+    """Receives a request sent with :func:`SendRequest`. Returns the request & the received file descriptors"""
+    fds = array.array('i')
+    data, ancdata, _, _ = sock.recvmsg(65536, socket.CMSG_LEN(nfds * fds.itemsize))
+    for level, kind, cdata in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(cdata[:len(cdata) - (len(cdata) % fds.itemsize)])
+
+    while len(data) < HEADER.size or len(data) < HEADER.size + HEADER.unpack_from(data)[0]:
+        chunk = sock.recv(65536)
+        if not chunk: raise EOFError('Incomplete request')
+        data += chunk
+
+    size = HEADER.unpack_from(data)[0]
+    return json.loads(data[HEADER.size:HEADER.size + size].decode('utf-8')), list(fds)
+
+
+def ReceiveInt(sock: socket.socket):
+    """Reads one status integer from the daemon, or returns None if the connection was closed first"""
+    data = b''
+    while len(data) < STATUS.size:
+        chunk = sock.recv(STATUS.size - len(data))
+        if not chunk: return None
+        data += chunk
+    return STATUS.unpack(data)[0]
+
+
+def RunClient(path: str, args, prog_name: str = None) -> int:
+    """Runs a command in the daemon listening at `path`, and returns its exit code"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        SendRequest(sock, dict(argv=list(args), prog_name=prog_name, cwd=os.getcwd(), env=dict(os.environ)), [0, 1, 2])
+
+        # The daemon replies with the pid of the process running the command (so that Ctrl+C can be forwarded to it),
+        # then with its exit code once it completes
+        pid = ReceiveInt(sock)
+        if pid is None: return EXIT_UNAVAILABLE
+
+        def forward(signum, frame):
+            try: os.kill(pid, signum)
+            except OSError: pass
+
+        for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP):
+            signal.signal(signum, forward)
+
+        code = ReceiveInt(sock)
+        return EXIT_UNAVAILABLE if code is None else code
+    finally:
+        sock.close()
+
+
+def main(argv=None) -> None:
+    argv = sys.argv[1:] if argv is None else list(argv)
+
+    path = os.environ.get(SOCKET_ENVVAR)
+    if not path:
+        if not argv:
+            sys.stderr.write('Usage: {} <socket> [ARGS]...\n'.format(os.path.basename(sys.argv[0])))
+            sys.exit(2)
+        path = argv.pop(0)
+
+    try: code = RunClient(path, argv)
+    except OSError as e:
+        sys.stderr.write('Could not connect to the pcshell daemon at "{}": {}\n'.format(path, e.strerror or e))
+        code = EXIT_UNAVAILABLE
+    sys.exit(code)
+
+
+if __name__ == '__main__':
+    main()
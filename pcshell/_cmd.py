@@ -1,23 +1,18 @@
 from typing import List
+from collections import OrderedDict
 import inspect
 import os
 import sys
+import time
+import threading
 
 import re
+import shlex
 
 try: 
     import readline
 except: pass
 
-try:
-    from prompt_toolkit.history import FileHistory
-    from prompt_toolkit.shortcuts import PromptSession
-    
-    from prompt_toolkit.lexers import PygmentsLexer
-
-    from prompt_toolkit.input.defaults import create_pipe_input
-except: pass
-
 from cmd import Cmd
 
 import click
@@ -29,15 +24,41 @@ from . import globals as globs
 from . import _colors as colors
 from . import utils
 from .chars import IGNORE_LINE, PROMPT_SYMBOL
+from ._script import ScriptReader, BatchedStdOut
+from ._jobs import SubmitBackground, EmitFinished, PromptOutput, CancelJobs
+from ._async import GetSessionLoop, CloseSessionLoop, IterateAsync
+from ._resources import GetResource, CloseResources
+from ._pipes import SplitPipeline, PipeInput
+from ._metrics import FlushMetrics
+from ._utils import CreatePipeInput
+
+# prompt_toolkit, pygments & the completion modules are only imported once a shell is started,
+# so that running a single command does not pay for them
 
-try:
-    from ._completion import get_completer, BuildCompletionTree
-except: pass
 
+def IsShellInvocation(argv: List[str]) -> bool:
+    if len(argv) == 1: return True
 
-########################################
-globs.__IsShell__ = len(sys.argv) == 1 #
-########################################
+    # Executing a script is the same as entering each of its lines into the shell
+    opt = globs.SHELL_SCRIPT_OPTION
+    return (len(argv) == 3 and argv[1] == opt) or (len(argv) == 2 and argv[1].startswith(opt + '='))
+
+
+def fixTupleSpacing(val):
+    if '[' in val or ']' in val:
+        val = re.sub(r"(\[[\s])", '[', val)
+        val = re.sub(r"([\s]\])", ']', val)
+        val = re.sub(r"(\[,)", ']', val)
+        val = re.sub(r"(,\])", ']', val)
+    if ',' in val:
+        val = re.sub(r"(\",\")", "\", \"", val)
+        val = re.sub(r"([,]{1,999}.(?<=,))", ',', val)
+    return val
+
+
+#################################################
+globs.__IsShell__ = IsShellInvocation(sys.argv) #
+#################################################
 
 
 class ClickCmd(Cmd, object):
@@ -48,6 +69,9 @@ class ClickCmd(Cmd, object):
     nohelp = "No help on %s"
     nocommand = "\n\t{}Command not found: {}%s{}".format(colors.COMMAND_NOT_FOUND_TEXT_STYLE, colors.COMMAND_NOT_FOUND_TEXT_FORE, Style.RESET_ALL)
 
+    # The do_/help_ methods defined by each shell class, listed once per class (see `get_names`)
+    __class_names = {}
+
     def __init__(self, 
         ctx: click.Context =None, 
         on_finished=None, 
@@ -58,6 +82,7 @@ class ClickCmd(Cmd, object):
         fuzzy_completion=True, 
         mouse_support=False,
         lexer=True,
+        stream_piped_input=True,
     *args, **kwargs):
         self._stdout = kwargs.get('stdout')
         super(ClickCmd, self).__init__(*args, **kwargs)
@@ -72,7 +97,11 @@ class ClickCmd(Cmd, object):
         self.fuzzy_completion = fuzzy_completion
         self.mouse_support = mouse_support
         self.lexer = lexer
-        self._pipe_input = create_pipe_input() if not self.readline else None
+        self.__pipe_input = None
+        self.__pipe_context = None
+
+        # Non-interactive stdin is streamed directly into the shell, bypassing the prompt
+        self.stream_piped_input = stream_piped_input
 
         # A callback function that will be excuted before loading up the shell. 
         # By default this changes the color to 0a on a Windows machine
@@ -82,14 +111,87 @@ class ClickCmd(Cmd, object):
         self.ctx = ctx
         self.on_finished = on_finished
 
+        # The line being executed, and the error raised by & the return value of the most recently executed command. Tracked per thread
+        self._local = threading.local()
+
+        # Registered commands by name (see `_cmd_factories.CommandEntry`), from which their do_/help_/complete_ handlers are served
+        self.registry = OrderedDict()
+
         # Define the history file
         hist_file = hist_file or os.path.join(os.path.expanduser('~'), globs.HISTORY_FILENAME)
         self.hist_file = os.path.abspath(hist_file)
         if not os.path.isdir(os.path.dirname(self.hist_file)):
             os.makedirs(os.path.dirname(self.hist_file))
+        self.__history = None
+
+
+    @property
+    def history(self):
+        """The prompt_toolkit history of the shell, shared with the other shells using the same file.
+        It is loaded in the background (most recent entries first) once a prompt is displayed
+        """
+        from ._history import GetHistory
+
+        # A keystroke replay gives the shell a history file of its own, unless told otherwise (see `KeystrokeReplay`)
+        path = self.hist_file if globs.__REPLAY__ is None else globs.__REPLAY__.history_file(self.hist_file)
+        if path != self.hist_file: return GetHistory(path)
+
+        if self.__history is None: self.__history = GetHistory(path)
+        return self.__history
+
+    @property
+    def _pipe_input(self):
+        """Programmatic input for the prompt (used to repeat commands), created on first use"""
+        if self.readline: return None
+        if self.__pipe_input is None:
+            # Kept open for the lifetime of the shell
+            self.__pipe_context = CreatePipeInput()
+            self.__pipe_input = self.__pipe_context.__enter__()
+        return self.__pipe_input
+
 
-        self.history = FileHistory(self.hist_file)
-        self.history.load_history_strings()
+    @property
+    def last_error(self) -> BaseException:
+        return getattr(self._local, 'last_error', None)
+
+    @last_error.setter
+    def last_error(self, value: BaseException):
+        self._local.last_error = value
+
+    @property
+    def last_result(self) -> object:
+        return getattr(self._local, 'last_result', None)
+
+    @last_result.setter
+    def last_result(self, value: object):
+        self._local.last_result = value
+
+
+    @property
+    def current_line(self) -> str:
+        """The line being executed on this thread, which typed tuple literals are parsed from (see :func:`GetCurrentLine`)"""
+        return getattr(self._local, 'current_line', '')
+
+    @current_line.setter
+    def current_line(self, value: str):
+        self._local.current_line = value
+
+
+    @property
+    def piping(self) -> bool:
+        """True while the command being executed on this thread has its return value piped into another command"""
+        return getattr(self._local, 'piping', False)
+
+
+    @property
+    def loop(self):
+        """The event loop that async commands run on, shared for the lifetime of the session"""
+        return GetSessionLoop()
+
+
+    def get_resource(self, name: str) -> object:
+        """Returns a session resource, creating it on first use. See :class:`pcshell.resources.ResourceRegistry`"""
+        return GetResource(name)
 
 
     def clear_history(self) -> bool:
@@ -97,10 +199,8 @@ class ClickCmd(Cmd, object):
             if self.readline: 
                 readline.clear_history()
             else:
-                if not len(self.prompter.history._loaded_strings): return True
-
-                os.remove(self.hist_file)
-                self.prompter.history._loaded_strings = []
+                # Replaced by an empty file, which other sessions go on appending to
+                self.history.clear()
             return True
                 
         except Exception as e:
@@ -121,15 +221,55 @@ class ClickCmd(Cmd, object):
         if self.readline:
             # Write history before cmdloop() returns
             try: 
-                readline.set_history_length(1000)
+                readline.set_history_length(globs.HISTORY_MAX_ENTRIES or -1)
                 readline.write_history_file(self.hist_file)
             except IOError: pass
 
+        self.close_session()
+
         # Invoke callback before shell closes
         if self.on_finished: self.on_finished(self.ctx)
 
 
+    def stdin_is_piped(self) -> bool:
+        try: return not sys.stdin.isatty()
+        except (AttributeError, ValueError): return False
+
+    def close_session(self):
+        # Background commands are asked to stop once the application closes, 
+        # then session resources are torn down before the event loop they may be bound to
+        if globs.__MASTER_SHELL__ == self.ctx.command.name: 
+            CancelJobs()
+            CloseResources()
+            CloseSessionLoop()
+            FlushMetrics()
+
+            # History files are synced, and compacted if they outgrew their limits during the session
+            if self.__history is not None:
+                from ._history import CloseHistories
+                CloseHistories()
+
+
     def cmdloop(self, intro=None):
+        if threading.current_thread() is not threading.main_thread():
+            raise click.UsageError('A shell cannot be started from a background command')
+
+        if globs.__SCRIPT__ is None and globs.__REPLAY__ is None and self.stream_piped_input and self.stdin_is_piped():
+            # Read stdin as if it were a script, with no per-line reporting or history, and batched output
+            with ScriptReader(sys.stdin, report=False) as script, BatchedStdOut():
+                stop = self.cmdloop(intro)
+            # As for a script, the exit status tells whether every line succeeded
+            if script.failed: self.ctx.exit(1)
+            return stop
+
+        if globs.__SCRIPT__ is not None:
+            # A script is being executed; consume its lines instead of starting the prompt
+            if self.before_start and callable(self.before_start): self.before_start()
+            try: return self.scriptloop()
+            finally:
+                self.close_session()
+                if self.on_finished: self.on_finished(self.ctx)
+
         self.preloop()
 
         # Readline Handling
@@ -158,6 +298,11 @@ class ClickCmd(Cmd, object):
             stop = None
 
             if not self.readline:
+                from prompt_toolkit.shortcuts import PromptSession
+                from prompt_toolkit.lexers import PygmentsLexer
+                from prompt_toolkit.output.color_depth import ColorDepth
+                from ._completion import get_completer, BuildCompletionTree
+
                 # Initialize Completion Tree for Master Shell
                 if globs.__MASTER_SHELL__ == self.ctx.command.name:
                     BuildCompletionTree(self.ctx)
@@ -166,13 +311,15 @@ class ClickCmd(Cmd, object):
                 try:
                     from ._lexer import ShellLexer
                 except: pass
-                from prompt_toolkit.output.color_depth import ColorDepth
 
                 message = [
                     ('class:name', self.get_prompt()),
                     ('class:prompt', PROMPT_SYMBOL),
                 ]
 
+                # A keystroke replay (see `_replay.KeystrokeReplay`) provides the terminal, and instruments the prompt
+                replay = globs.__REPLAY__
+
                 self.prompter = PromptSession(
                     message,
 
@@ -185,8 +332,12 @@ class ClickCmd(Cmd, object):
                     completer=get_completer(self.fuzzy_completion),
                     complete_in_thread=self.complete_while_typing,
                     complete_while_typing=self.complete_while_typing,
-                    lexer=PygmentsLexer(ShellLexer) if self.lexer else None
+                    lexer=PygmentsLexer(ShellLexer) if self.lexer else None,
+
+                    input=replay.input if replay else None,
+                    output=replay.output if replay else None
                 )
+                if replay is not None: replay.attach(self.prompter)
 
                 self.piped_prompter = PromptSession(
                     message,
@@ -207,12 +358,16 @@ class ClickCmd(Cmd, object):
                 if self.cmdqueue:
                     line = self.cmdqueue.pop(0)
                 else:
+                    # Display the output of any background commands that finished in the meantime
+                    EmitFinished()
+
                     try:
                         if self.readline:
                             line = get_input(self.get_prompt() + PROMPT_SYMBOL)
                         else:
                             if not globs.__IS_REPEAT_EOF__:
-                                line = self.prompter.prompt()
+                                with PromptOutput():
+                                    line = self.prompter.prompt()
                             elif self._pipe_input:
                                 if not globs.__IS_EXITING__:
                                     line = self.piped_prompter.prompt()
@@ -252,28 +407,22 @@ class ClickCmd(Cmd, object):
                             # If stream source is from the 'repeat' command, display the "visible" repeated command
                             click.echo(globs.__LAST_COMMAND_VISIBLE__)
 
-                    def fixTupleSpacing(val):
-                        if '[' in val or ']' in val:
-                            val = re.sub(r"(\[[\s])", '[', val)
-                            val = re.sub(r"([\s]\])", ']', val)
-                            val = re.sub(r"(\[,)", ']', val)
-                            val = re.sub(r"(,\])", ']', val)
-                        if ',' in val:
-                            val = re.sub(r"(\",\")", "\", \"", val)
-                            val = re.sub(r"([,]{1,999}.(?<=,))", ',', val)
-                        return val
-
                     line = fixTupleSpacing(line)
-                    globs.__CURRENT_LINE__ = line
+                    self.last_error = None
 
+                    start = time.perf_counter()
                     try:
                         line = self.precmd(line)
                         stop = self.onecmd(line)
                         stop = self.postcmd(stop, line)
+                        if globs.__REPLAY__ is not None:
+                            globs.__REPLAY__.record(line, self.last_error, self.last_result, time.perf_counter() - start)
                         if not stop and not globs.__IS_EXITING__: 
                             line = ''
                             click.echo(file=self._stdout)
                     except KeyboardInterrupt:
+                        if globs.__REPLAY__ is not None:
+                            globs.__REPLAY__.record(line, self.last_error or click.Abort(), None, time.perf_counter() - start)
                         click.echo(file=self._stdout)
                         continue
                     finally:
@@ -303,6 +452,53 @@ class ClickCmd(Cmd, object):
                 except IOError: pass
 
 
+    # ----------------------------------------------------------------------------------------------
+    # ANCHOR Script Execution
+    # ----------------------------------------------------------------------------------------------
+
+    def scriptloop(self):
+        """Executes the lines of the active script until it ends or the shell is exited, without rendering any prompt"""
+        script: ScriptReader = globs.__SCRIPT__
+
+        if not self.readline:
+            # Typed tuple parsing relies on the Completion Tree
+            if globs.__MASTER_SHELL__ == self.ctx.command.name:
+                from ._completion import BuildCompletionTree
+                BuildCompletionTree(self.ctx)
+
+        stop = None
+        while not stop:
+            EmitFinished()
+
+            if self.cmdqueue:
+                line = self.cmdqueue.pop(0)
+            else:
+                line = script.readline()
+                if line is None: break
+
+            line = fixTupleSpacing(line)
+            self.last_error = None
+            lineno = script.lineno
+
+            start = time.perf_counter()
+            try:
+                line = self.precmd(line)
+                stop = self.onecmd(line)
+                stop = self.postcmd(stop, line)
+            except KeyboardInterrupt:
+                self.last_error = click.Abort()
+                stop = True
+            script.record(line, lineno, self.last_error, time.perf_counter() - start)
+
+        return stop
+
+    def run_script(self, path: str) -> bool:
+        """Executes every line of a script file within this shell. Returns True if every line succeeded"""
+        with ScriptReader(path) as script:
+            self.scriptloop()
+        return not script.failed
+
+
     # ----------------------------------------------------------------------------------------------
     # ANCHOR Default Handling & Click Forwards
     # ----------------------------------------------------------------------------------------------
@@ -317,28 +513,111 @@ class ClickCmd(Cmd, object):
             return self.prompt(**kwargs)
         else: return self.prompt
 
+    def onecmd(self, line):
+        line = fixTupleSpacing(line)
+        stripped = line.rstrip()
+        suffix = globs.BACKGROUND_SUFFIX
+        if stripped.endswith(suffix) and not stripped.endswith(suffix * 2):
+            # Run the command in the background & return to the prompt immediately
+            stripped = stripped[:-len(suffix)].rstrip()
+            if stripped:
+                job = SubmitBackground(self, stripped)
+                click.echo('\t{}[{}]{} {}'.format(colors.JOB_ID_STYLE, job.id, Style.RESET_ALL, stripped), file=self._stdout)
+                return False
+
+        stages = SplitPipeline(line)
+        if len(stages) > 1: return self.pipeline(stages)
+
+        return self.dispatch(line)
+
+    def pipeline(self, stages: List[str]):
+        """Executes each command in turn, passing the return value of each directly to the next (without any serialization).
+        A returned generator is only consumed as the next command iterates over it
+        """
+        if not all(stages):
+            self.last_error = click.UsageError('Invalid pipeline: "{}"'.format(' {} '.format(globs.PIPE_OPERATOR).join(stages)))
+            click.echo('\t{}Error: {}{}'.format(colors.USAGE_ERROR_STYLE, self.last_error.format_message(), Style.RESET_ALL), err=True)
+            return False
+
+        stop = False
+        result = None
+        for i, stage in enumerate(stages):
+            self.last_error = None
+            self.last_result = None
+
+            pipe = PipeInput(result) if i else None
+            self._local.piping = i < len(stages) - 1
+            try:
+                if pipe is None:
+                    stop = self.dispatch(stage)
+                else:
+                    with pipe: stop = self.dispatch(stage)
+            finally:
+                self._local.piping = False
+
+            if pipe is not None and not pipe.consumed and self.last_error is None:
+                self.last_error = click.UsageError('"{}" does not accept piped input'.format(stage))
+                click.echo('\t{}Error: {}{}'.format(colors.USAGE_ERROR_STYLE, self.last_error.format_message(), Style.RESET_ALL), err=True)
+
+            # A failed command ends the pipeline
+            if stop or self.last_error is not None: break
+            result = self.last_result
+            if hasattr(result, '__anext__'): result = IterateAsync(result)
+
+        return stop
+
     def emptyline(self):
         return False
 
     def default(self, line):
+        self.last_error = click.UsageError('No such command "%s"' % line)
         self.VerifyCommand(line)
 
+    def dispatch(self, line):
+        """Executes a single command, as :meth:`cmd.Cmd.onecmd` does, looking its handler up in the registry"""
+        self.current_line = line
+        cmd, arg, line = self.parseline(line)
+        if not line: return self.emptyline()
+        if not cmd: return self.default(line)
+
+        self.lastcmd = line if line != 'EOF' else ''
+        func = self.get_handler('do', cmd)
+        if func is None: return self.default(line)
+        return func(arg)
+
+    def get_handler(self, kind: str, name: str):
+        """The `do`, `help` or `complete` handler of a command: one assigned to the shell itself (e.g. by an
+        `add_command_callback`), else that of the registered command, else a method of the class (e.g. `do_exit`)
+        """
+        attr = '{}_{}'.format(kind, name)
+        func = self.__dict__.get(attr)
+        if func is not None: return func
+
+        entry = self.registry.get(name)
+        if entry is not None: return entry.handler(kind, self)
+        return getattr(self, attr) if hasattr(type(self), attr) else None
+
+    def __getattr__(self, attr: str):
+        # Serves cmd.Cmd's own handler lookups (e.g. `getattr(self, 'complete_' + cmd)`) from the registry
+        kind, _, name = attr.partition('_')
+        entry = self.__dict__.get('registry', {}).get(name) if kind in ('do', 'help', 'complete') else None
+        if entry is None:
+            raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, attr))
+        return entry.handler(kind, self)
+
     def get_names(self):
-        return dir(self)
+        names = ClickCmd.__class_names.get(type(self))
+        if names is None:
+            names = ClickCmd.__class_names[type(self)] = [name for name in dir(type(self)) if name.startswith(('do_', 'help_'))]
+        # Registered commands may also have a method of the class (e.g. `do_help`), and are only listed once
+        return list(dict.fromkeys(names + [handler for name in self.registry for handler in ('do_' + name, 'help_' + name)]))
 
 
     def VerifyCommand(self, line):
-        commands = []
-        names = self.get_names()
-
-        for key in names:
-            if not '--' in key:
-                if 'do_' in key[0: 3]:
-                    if not 'hidden_{}'.format(key[3:]) in names:
-                        commands.append(key[3:])
-                    elif 'orig_{}'.format(key[3:]) in names:
-                        commands.append(key[3:])
-                        
+        commands = [name[3:] for name in self.get_names() if name.startswith('do_') and name[3:] not in self.registry]
+        commands += [name for name, entry in self.registry.items() if entry.listed]
+        commands = [name for name in commands if not '--' in name]
+
         suggest = utils.suggest(commands, line) if len(commands) else None
         click.echo(
             self.nocommand % line if not suggest else (self.nocommand % line) + '.\n\n\t{}{}Did you mean "{}{}{}"?{}'.format(
@@ -361,22 +640,16 @@ class ClickCmd(Cmd, object):
             super(ClickCmd, self).do_help(arg)
             return
 
-        try:
-            func = getattr(self, 'help_' + arg)
-        except AttributeError:
-            try:
-                do_fun = getattr(self, 'do_' + arg, None)
-
-                if do_fun is None:
-                    self.VerifyCommand(arg)
-                    return
-
-                doc = do_fun.__doc__
-                if doc:
-                    click.echo(doc, file=self._stdout)
-                    return
-            except AttributeError:
-                pass
+        func = self.get_handler('help', arg)
+        if func is None:
+            do_fun = self.get_handler('do', arg)
+            if do_fun is None:
+                self.VerifyCommand(arg)
+                return
+
+            if do_fun.__doc__:
+                click.echo(do_fun.__doc__, file=self._stdout)
+                return
             click.echo(self.nohelp % arg, file=self._stdout)
             return
         func()
@@ -389,11 +662,8 @@ class ClickCmd(Cmd, object):
     def __strip_hidden(self, cmds) -> List[str]:
         ret: List[str] = []
         for cmd in cmds:
-            try:
-                hidden: bool = getattr(self, 'hidden_' + cmd)
-                if not hidden:
-                    ret.append(cmd)
-            except AttributeError:
+            entry = self.registry.get(cmd)
+            if entry is None or not entry.hidden:
                 ret.append(cmd)
         return ret
 
@@ -407,4 +677,32 @@ class ClickCmd(Cmd, object):
                 if self.ruler:
                     click.echo(str(self.ruler * len(header)), file=self._stdout)
                 self.columnize(cmds, maxcol - 1)
-                click.echo(file=self._stdout)
\ No newline at end of file
+                click.echo(file=self._stdout)
+
+def GetCurrentLine(ctx: click.Context = None) -> str:
+    """The line being executed on this thread by the shell that `ctx` (by default, the current context) was invoked from.
+    Outside of a shell command (e.g. while lexing the prompt), the line last stored in `globals.__CURRENT_LINE__`
+    """
+    ctx = ctx or click.get_current_context(silent=True)
+    while ctx is not None:
+        shell = getattr(ctx.command, 'shell', None)
+        if isinstance(shell, ClickCmd): return shell.current_line
+        ctx = ctx.parent
+    return globs.__CURRENT_LINE__
+
+
+def GetTrailingLine(ctx: click.Context, args) -> str:
+    """The text of the current line (see :func:`GetCurrentLine`) that click split into `args`, the trailing arguments
+    of the command (e.g. the command line given to 'time'). It is kept as typed, since typed tuple literals (`[1, a]`)
+    are parsed from the line rather than from its arguments
+    """
+    line = GetCurrentLine(ctx)
+    lexer = shlex.shlex(line, posix=True)
+    lexer.whitespace_split = True
+
+    try: ends = [lexer.instream.tell() for _ in iter(lexer.get_token, None)]
+    except ValueError: ends = []
+
+    skip = len(ends) - len(args)
+    if not args or skip < 0: return ' '.join(shlex.quote(arg) for arg in args)
+    return line[ends[skip - 1] if skip else 0:].strip()
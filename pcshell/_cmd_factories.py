@@ -3,6 +3,7 @@ import logging
 import shlex
 import traceback
 import sys
+import time
 
 from functools import update_wrapper
 from logging import NullHandler
@@ -15,6 +16,9 @@ from colorama import Style
 
 from ._cmd import ClickCmd
 from ._utils import HasKey
+from ._output import IsStreamable, DrainOutput
+from ._timing import Phase
+from ._metrics import METRICS
 
 from . import _colors as colors
 from . import globals as globs
@@ -30,16 +34,28 @@ def get_invoke(cmd: click.Command):
     """
     assert isinstance(cmd, click.Command)
 
+    # Metrics are labelled with the name of the command an alias stands for
+    canonical = getattr(cmd, 'alias_of', cmd).name
+
     def invoke_(self, arg):
+        self.last_error = None
+        self.last_result = None
+        start = time.perf_counter()
         try:
             # Invoke the command
-            cmd.main(args=shlex.split(arg),
+            self.last_result = cmd.main(args=shlex.split(arg),
                          prog_name=cmd.name,
                          standalone_mode=False,
                          parent=self.ctx)
 
+            # A generator only runs as it is consumed. Unless it is piped into the next command, run it to completion here
+            if IsStreamable(self.last_result) and not self.piping:
+                with Phase('output'): DrainOutput(self.last_result)
+                self.last_result = None
+
         except click.UsageError as e:
             # Shows the usage subclass error message
+            self.last_error = e
             file = get_text_stderr()
 
             color = None
@@ -57,12 +73,14 @@ def get_invoke(cmd: click.Command):
 
         except click.ClickException as e:
             # Shows the standard click exception message
+            self.last_error = e
             file = get_text_stderr()
             click.echo("\t{err_color}Error: {msg}{reset}".format(err_color=colors.CLICK_ERROR_STYLE, reset=Style.RESET_ALL, msg=e.format_message()), file=file)
 
-        except click.Abort:
+        except click.Abort as e:
             # An EOF or KeyboardInterrupt was returned
             # Raise as a new KeyboardInterrupt
+            self.last_error = e
             click.echo(file=self._stdout)
             raise KeyboardInterrupt()
 
@@ -72,6 +90,7 @@ def get_invoke(cmd: click.Command):
 
         except Exception as e:
             # Catch and pretty-format a Python Exception caught from the click command
+            self.last_error = e
 
             formatter = click.HelpFormatter(4, 128, 128)
             formatter.indent()
@@ -88,6 +107,9 @@ def get_invoke(cmd: click.Command):
             click.echo(formatter.getvalue())
             logger.warning(traceback.format_exc())
 
+        finally:
+            METRICS.record(' '.join(globs.__SHELL_PATH__ + [canonical]), time.perf_counter() - start, self.last_error)
+
         # Do not allow shell to exit
         return False
 
@@ -134,6 +156,45 @@ def get_complete(command):
     return complete_
 
 
+HANDLER_FACTORIES = {
+    'do': get_invoke,
+    'help': get_help,
+    'complete': get_complete,
+}
+
+
+class CommandEntry(object):
+    """A click command registered in a shell under one of its names.
+
+    Its handlers (do, help & complete) are only created by the factory methods when first used,
+    and may be wrapped by decorators registered beforehand (see :meth:`decorate`)
+    """
+
+    __slots__ = ('command', 'name', 'hidden', 'listed', '_handlers', '_decorators')
+
+    def __init__(self, command: click.Command, name: str):
+        self.command = command
+        self.name = name
+        self.hidden = command.hidden
+        # Hidden names are not suggested for mistyped commands, unless it is the command's primary name
+        self.listed = not command.hidden or (hasattr(command, 'alias') and not command.alias)
+        self._handlers = {}
+        self._decorators = {}
+
+    def handler(self, kind: str, shell: ClickCmd):
+        func = self._handlers.get(kind)
+        if func is None:
+            func = types.MethodType(HANDLER_FACTORIES[kind](self.command), shell)
+            for decorator in self._decorators.get(kind, ()): func = decorator(func)
+            self._handlers[kind] = func
+        return func
+
+    def decorate(self, kind: str, decorator) -> None:
+        """Wraps the handler: `decorator` receives the bound handler and returns its replacement"""
+        self._decorators.setdefault(kind, []).append(decorator)
+        self._handlers.pop(kind, None)
+
+
 # An implementation of ClickCmd that will use the factory methods to assign the command methods
 class ClickCmdShell(ClickCmd):
 
@@ -142,16 +203,7 @@ class ClickCmdShell(ClickCmd):
         super(ClickCmdShell, self).__init__(ctx, on_finished, hist_file, *args, **kwargs)
 
     def add_command(self, cmd, name):
-        setattr(self, 'do_%s' % name, types.MethodType(get_invoke(cmd), self))
-        setattr(self, 'help_%s' % name, types.MethodType(get_help(cmd), self))
-        setattr(self, 'complete_%s' % name, types.MethodType(get_complete(cmd), self))
-
-        setattr(self, 'hidden_%s' % name, cmd.hidden)
-
-        keys = dir(cmd)
-        if 'alias' in keys:
-            if not cmd.alias:
-                setattr(self, 'orig_%s' % name, True)
+        self.registry[name] = CommandEntry(cmd, name)
 
         if self.add_command_callback:
-            self.add_command_callback(self, cmd, name)
\ No newline at end of file
+            self.add_command_callback(self, cmd, name)
@@ -93,6 +93,24 @@ SHELL_HISTORY_CLEARED_STYLE = Style.DIM
 SHELL_HISTORY_CLEARED_TRUE = Fore.GREEN
 SHELL_HISTORY_CLEARED_FALSE = Fore.RED + Style.BRIGHT
 
+SCRIPT_LINE_STYLE = Style.DIM
+SCRIPT_STATUS_OK = Fore.GREEN
+SCRIPT_STATUS_FAILED = Fore.RED + Style.BRIGHT
+SCRIPT_TIMING_STYLE = Fore.CYAN + Style.DIM
+
+JOB_ID_STYLE = Fore.MAGENTA
+JOB_STATUS_OK = Fore.GREEN
+JOB_STATUS_FAILED = Fore.RED + Style.BRIGHT
+JOB_STATUS_OTHER = Fore.YELLOW
+JOB_TIMING_STYLE = Fore.CYAN + Style.DIM
+
+TIME_HEADER_STYLE = Fore.MAGENTA
+TIME_LABEL_STYLE = Style.DIM
+TIME_VALUE_STYLE = Fore.CYAN
+
+PROFILE_HEADER_STYLE = Fore.MAGENTA
+PROFILE_TIMING_STYLE = Fore.CYAN + Style.DIM
+
 
 # Lexer Colors
 
@@ -119,36 +137,42 @@ PYGMENTS_PARAMETER_CHOICE = '#3385ff'
 
 # Shell Prompt Style
 
-try:
-    from prompt_toolkit.styles import Style
+def __getattr__(name):
+    # The prompt_toolkit style is built on first use, so that it reflects any colors customized before the shell starts,
+    # and so that prompt_toolkit is not imported when no shell is started
+    if name == 'prompt_style':
+        from prompt_toolkit.styles import Style
+
+        style = Style.from_dict({
+            '': PROMPT_DEFAULT_TEXT,
 
-    prompt_style = Style.from_dict({
-        '': PROMPT_DEFAULT_TEXT,
+            'name': PROMPT_NAME,
+            'prompt': PROMPT_SYMBOL,
 
-        'name': PROMPT_NAME,
-        'prompt': PROMPT_SYMBOL,
+            'pygments.text': PROMPT_DEFAULT_TEXT,
+            'pygments.name.help': PYGMENTS_NAME_HELP,
+            'pygments.name.exit': PYGMENTS_NAME_EXIT,
+            'pygments.name.symbol': PYGMENTS_NAME_SYMBOL,
 
-        'pygments.text': PROMPT_DEFAULT_TEXT,
-        'pygments.name.help': PYGMENTS_NAME_HELP,
-        'pygments.name.exit': PYGMENTS_NAME_EXIT,
-        'pygments.name.symbol': PYGMENTS_NAME_SYMBOL,
+            'pygments.name.label': PYGMENTS_NAME_SHELL,
 
-        'pygments.name.label': PYGMENTS_NAME_SHELL,
+            'pygments.name.invalidcommand': PYGMENTS_NAME_INVALIDCOMMAND,
+            'pygments.name.command': PYGMENTS_NAME_COMMAND,
+            'pygments.name.subcommand': PYGMENTS_NAME_SUBCOMMAND,
 
-        'pygments.name.invalidcommand': PYGMENTS_NAME_INVALIDCOMMAND,
-        'pygments.name.command': PYGMENTS_NAME_COMMAND,
-        'pygments.name.subcommand': PYGMENTS_NAME_SUBCOMMAND,
+            'pygments.name.attribute': PYGMENTS_PARAMETER_CHOICE,
 
-        'pygments.name.attribute': PYGMENTS_PARAMETER_CHOICE,
+            'pygments.name.tag': PYGMENTS_OPTION,
 
-        'pygments.name.tag': PYGMENTS_OPTION,
+            'pygments.operator': PYGMENTS_OPERATOR,
+            'pygments.keyword': PYGMENTS_KEYWORD,
 
-        'pygments.operator': PYGMENTS_OPERATOR,
-        'pygments.keyword': PYGMENTS_KEYWORD,
+            'pygments.literal.number': PYGMENTS_LITERAL_NUMBER,
 
-        'pygments.literal.number': PYGMENTS_LITERAL_NUMBER,
+            'pygments.literal.string': PYGMENTS_LITERAL_STRING,
+            'pygments.literal.string.symbol': PYGMENTS_LITERAL_STRING_LITERAL
+        })
+        globals()['prompt_style'] = style
+        return style
 
-        'pygments.literal.string': PYGMENTS_LITERAL_STRING,
-        'pygments.literal.string.symbol': PYGMENTS_LITERAL_STRING_LITERAL
-    })
-except: pass
\ No newline at end of file
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
@@ -887,14 +887,26 @@ def BuildCompletionTree(ctx: click.Context):
         return ret
 
 
+    # Aliases share the params of the command they alias, so those are only extracted once per definition
+    shared_params = {}
+
+    def get_shared_params(ctx: Union[click.Context, click.Command]):
+        cmd = ctx.command if isinstance(ctx, click.Context) else ctx
+        source = getattr(cmd, 'alias_of', None) or (cmd if getattr(cmd, 'aliases', None) else None)
+        if source is None: return get_params(ctx, True), get_params(ctx)
+
+        params = shared_params.get(id(source))
+        if params is None:
+            params = shared_params[id(source)] = (get_params(source, True), get_params(source))
+        return params
+
     # Recursive function to build completion dictionary
     
     def build_tree(ctx: Union[click.Context, click.Command], parents: List[str], root=False):
         cmd: click.Command = ctx.command if isinstance(ctx, click.Context) else ctx
 
         commands = get_subcommands(ctx)
-        args = get_params(ctx, True)
-        opts = get_params(ctx)
+        args, opts = get_shared_params(ctx)
 
         if not parents: parents = []
         if len(commands):
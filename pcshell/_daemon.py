@@ -0,0 +1,178 @@
+from typing import List
+
+import io
+import os
+import sys
+import atexit
+import signal
+import socket
+import struct
+import logging
+import traceback
+
+from logging import NullHandler
+
+import click
+
+from . import globals as globs
+from ._cmd import IsShellInvocation
+from ._client import ReceiveRequest, STATUS, EXIT_UNAVAILABLE
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(NullHandler())
+
+
+def IsDaemonSupported() -> bool:
+    return hasattr(socket, 'AF_UNIX') and hasattr(os, 'fork') and hasattr(socket.socket, 'sendmsg')
+
+
+def Listen(path: str) -> socket.socket:
+    """Binds the daemon socket, readable & writable by the current user only.
+    A socket file left behind by a daemon that is no longer running is replaced
+    """
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+            raise click.UsageError('A daemon is already listening at "{}"'.format(path))
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.remove(path)
+        finally:
+            probe.close()
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o177)
+    try: sock.bind(path)
+    finally: os.umask(umask)
+    sock.listen(globs.DAEMON_BACKLOG)
+    return sock
+
+
+def IsSameUser(conn: socket.socket) -> bool:
+    """Commands run with the privileges of the daemon, so only clients of the same user are served (where the peer is known)"""
+    if not hasattr(socket, 'SO_PEERCRED'): return True
+    ucred = struct.Struct('3i')
+    _, uid, _ = ucred.unpack(conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, ucred.size))
+    return uid == os.getuid()
+
+
+def AttachStreams(fds: List[int]) -> None:
+    """Makes the client's stdin, stdout & stderr those of the current process"""
+    for stream in (sys.stdin, sys.stdout, sys.stderr):
+        try: stream.flush()
+        except Exception: pass
+
+    for target, fd in enumerate(fds[:3]):
+        os.dup2(fd, target)
+        os.close(fd)
+
+    def reopen(fd, mode, stream):
+        interactive = os.isatty(fd)
+        return io.open(fd, mode, buffering=1 if interactive and 'w' in mode else -1, closefd=False,
+            encoding=getattr(stream, 'encoding', None), errors=getattr(stream, 'errors', None))
+
+    sys.stdin = sys.__stdin__ = reopen(0, 'r', sys.__stdin__)
+    sys.stdout = sys.__stdout__ = reopen(1, 'w', sys.__stdout__)
+    sys.stderr = sys.__stderr__ = reopen(2, 'w', sys.__stderr__)
+
+
+def RunRequest(cli: click.BaseCommand, conn: socket.socket, request: dict, fds: List[int], prog_name: str) -> None:
+    """Runs one command in a forked copy of the daemon, as if the client's process had run it. Never returns"""
+    code = EXIT_UNAVAILABLE
+    try:
+        os.setsid()
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+
+        AttachStreams(fds)
+        os.chdir(request['cwd'])
+        os.environ.clear()
+        os.environ.update(request['env'])
+
+        argv = request['argv']
+        prog_name = request.get('prog_name') or prog_name
+        sys.argv = [prog_name] + argv
+
+        conn.sendall(STATUS.pack(os.getpid()))
+
+        if IsShellInvocation(sys.argv):
+            click.echo('The daemon only runs single commands. Run the application itself to start the shell', err=True)
+            code = 2
+        else:
+            try:
+                cli.main(args=argv, prog_name=prog_name)
+                code = 0
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+                if e.code is not None and not isinstance(e.code, int): click.echo(e.code, err=True)
+            except KeyboardInterrupt:
+                code = 130
+            except Exception:
+                # As the interpreter does for an uncaught exception. 255 is kept for failures of the daemon itself
+                traceback.print_exc()
+                code = 1
+
+        # The same teardown as a process exiting (session resources, async loop, metrics)
+        atexit._run_exitfuncs()
+    except BaseException:
+        try: traceback.print_exc()
+        except BaseException: pass
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except BaseException: pass
+
+        try: conn.sendall(STATUS.pack(code))
+        except BaseException: pass
+        os._exit(code)
+
+
+def ServeDaemon(cli: click.BaseCommand, path: str, prog_name: str = None) -> None:
+    """Serves the commands of the (already loaded) application to clients connecting to the Unix socket at `path`,
+    until interrupted.
+
+    Each command runs in a fork of this process, which receives the client's arguments, environment, working directory
+    & standard streams, so imports & building the command hierarchy are only paid once. See :mod:`pcshell._client`
+    """
+    if not IsDaemonSupported():
+        raise click.UsageError('The daemon requires Unix domain sockets & fork(), which are not available on this platform')
+
+    path = os.path.abspath(path)
+    prog_name = prog_name or cli.name
+
+    sock = Listen(path)
+    # Forked commands are never waited for, so let the system reap them
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    click.echo('Serving {} at {}'.format(prog_name, path), err=True)
+    try:
+        while True:
+            conn, _ = sock.accept()
+            try:
+                if not IsSameUser(conn):
+                    logger.warning('Refused a daemon client of another user')
+                    continue
+
+                request, fds = ReceiveRequest(conn)
+                sys.stdout.flush()
+                sys.stderr.flush()
+
+                if os.fork() == 0:
+                    sock.close()
+                    RunRequest(cli, conn, request, fds, prog_name)
+
+                for fd in fds: os.close(fd)
+            except Exception:
+                logger.warning('Could not serve a daemon client\n%s', traceback.format_exc())
+            finally:
+                conn.close()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
+        try: os.remove(path)
+        except OSError: pass
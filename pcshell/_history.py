@@ -0,0 +1,491 @@
+from typing import Iterator, Iterable, List, Tuple
+from contextlib import contextmanager
+
+import os
+import mmap
+import inspect
+import stat
+import time
+import logging
+import datetime
+import tempfile
+import threading
+
+from logging import NullHandler
+
+try: import fcntl
+except ImportError: fcntl = None
+
+try: import msvcrt
+except ImportError: msvcrt = None
+
+from prompt_toolkit.history import History
+
+try: from prompt_toolkit.history import ThreadedHistory
+except ImportError: ThreadedHistory = None
+
+from . import globals as globs
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(NullHandler())
+
+
+DEDUPLICATE_MODES = ('consecutive', 'all', None)
+
+
+#------------------------------------------------------------------------------
+#  ANCHOR Reading
+
+def ReadRecordsReversed(source, size: int = None) -> Iterator[Tuple[str, bytes]]:
+    """The entries of a history file (in prompt_toolkit's `FileHistory` format), most recent first, along with their
+    record in the file (the timestamp comment & the '+' prefixed lines). `source` is a path or a binary file, of which
+    only the first `size` bytes are read if given.
+
+    The file is memory-mapped & scanned backwards from its end, so the most recent entries are available
+    without reading the rest of the file
+    """
+    if isinstance(source, str):
+        try: f = open(source, 'rb')
+        except FileNotFoundError: return
+        with f:
+            yield from ReadRecordsReversed(f, size)
+        return
+
+    def record(lines, comment):
+        lines.reverse()
+        entry = b'\n'.join(line[1:] for line in lines).decode('utf-8', errors='replace')
+        return entry, b'\n'.join(([comment] if comment is not None else []) + lines) + b'\n'
+
+    size = os.fstat(source.fileno()).st_size if size is None else size
+    if not size: return
+
+    with mmap.mmap(source.fileno(), size, access=mmap.ACCESS_READ) as data:
+        # The lines of the entry being read, last line first
+        lines = []
+        end = len(data)
+        while end >= 0:
+            start = data.rfind(b'\n', 0, end) + 1
+            line = data[start:end]
+
+            if line.startswith(b'+'): lines.append(line)
+            elif lines:
+                yield record(lines, line if line.startswith(b'#') else None)
+                lines = []
+            end = start - 1
+
+        if lines: yield record(lines, None)
+
+
+def ReadEntriesReversed(path: str) -> Iterator[str]:
+    """The entries of a history file, most recent first (see :func:`ReadRecordsReversed`)"""
+    for entry, _ in ReadRecordsReversed(path):
+        yield entry
+
+
+def ParseEntries(data: bytes) -> List[str]:
+    """The entries of a chunk of a history file made of whole records, oldest first"""
+    entries = []
+    lines = []
+    for line in data.split(b'\n'):
+        if line.startswith(b'+'): lines.append(line[1:])
+        elif lines:
+            entries.append(b'\n'.join(lines).decode('utf-8', errors='replace'))
+            lines = []
+    if lines: entries.append(b'\n'.join(lines).decode('utf-8', errors='replace'))
+    return entries
+
+
+def FilterRecords(records: Iterable[Tuple[str, bytes]], max_entries: int = None, max_bytes: int = None,
+    deduplicate: str = None) -> Iterator[Tuple[str, bytes]]:
+    """Drops the duplicates (see `globals.HISTORY_DEDUPLICATE`) from records read most recent first,
+    and stops once either limit is reached
+    """
+    if deduplicate not in DEDUPLICATE_MODES:
+        raise ValueError('Invalid history deduplication: {!r} (expected one of {})'.format(deduplicate, DEDUPLICATE_MODES))
+
+    seen = set()
+    previous = None
+    count = size = 0
+
+    for entry, record in records:
+        if deduplicate == 'all':
+            if entry in seen: continue
+            seen.add(entry)
+        elif deduplicate == 'consecutive':
+            if entry == previous: continue
+            previous = entry
+
+        count += 1
+        size += len(record) + 1
+        if (max_entries is not None and count > max_entries) or (max_bytes is not None and size > max_bytes): return
+        yield entry, record
+
+
+def Limits() -> dict:
+    return dict(max_entries=globs.HISTORY_MAX_ENTRIES, max_bytes=globs.HISTORY_MAX_BYTES, deduplicate=globs.HISTORY_DEDUPLICATE)
+
+
+def FileIdentity(st: os.stat_result) -> tuple:
+    return (st.st_dev, st.st_ino)
+
+
+#------------------------------------------------------------------------------
+#  ANCHOR Locking
+
+# Serializes the access of the threads of the session, and counts the locks each thread holds (so locking is re-entrant)
+__LOCK__ = threading.RLock()
+__HELD__ = threading.local()
+
+
+@contextmanager
+def LockHistory(path: str):
+    """Exclusive access to a history file, across every session using it: appends, compactions & clears are made
+    while holding it. The lock is taken on `<path>.lock` rather than the file itself, since compacting replaces the file
+    """
+    with __LOCK__:
+        held = getattr(__HELD__, 'paths', None)
+        if held is None: held = __HELD__.paths = {}
+        if held.get(path):
+            held[path] += 1
+            try: yield
+            finally: held[path] -= 1
+            return
+
+        fd = os.open(path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None: fcntl.flock(fd, fcntl.LOCK_EX)
+            elif msvcrt is not None: msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+
+            held[path] = 1
+            try: yield
+            finally:
+                held[path] = 0
+                if fcntl is not None: fcntl.flock(fd, fcntl.LOCK_UN)
+                elif msvcrt is not None:
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(fd)
+
+
+#------------------------------------------------------------------------------
+#  ANCHOR Compaction
+
+def CompactHistory(path: str, **limits) -> bool:
+    """Rewrites a history file without its duplicates & the oldest entries beyond either limit (by default, those of
+    the globals). The file is replaced atomically, so it is never seen partially written. Returns True if it was rewritten
+    """
+    limits = dict(Limits(), **limits)
+
+    with LockHistory(path):
+        try: size = os.path.getsize(path)
+        except OSError: return False
+
+        records = [record for _, record in FilterRecords(ReadRecordsReversed(path, size), **limits)]
+        if sum(len(record) + 1 for record in records) == size: return False
+
+        ReplaceHistory(path, reversed(records))
+
+    logger.debug('Compacted the history file "%s" to %d entries', path, len(records))
+    return True
+
+
+def ReplaceHistory(path: str, records: Iterable[bytes]) -> None:
+    """Replaces a history file atomically with `records` (oldest first). Requires the lock.
+    \nThe file is never modified in place: sessions reading it (memory-mapped) keep reading the file they opened
+    """
+    fd, temp = tempfile.mkstemp(prefix='.%s.' % os.path.basename(path), suffix='.tmp', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for record in records: f.write(b'\n' + record)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.chmod(temp, stat.S_IMODE(os.stat(path).st_mode))
+        os.replace(temp, path)
+    except BaseException:
+        try: os.remove(temp)
+        except OSError: pass
+        raise
+
+
+#------------------------------------------------------------------------------
+#  ANCHOR Shell History
+
+class ShellHistory(History):
+    """The history file of the shells, in the same format as prompt_toolkit's `FileHistory`, safe to share between
+    concurrent sessions.
+
+    - It is read from its end (see :func:`ReadRecordsReversed`), so the most recent entries are loaded first. Only the
+      entries kept by the limits of the globals (`HISTORY_MAX_ENTRIES`, `HISTORY_MAX_BYTES` & `HISTORY_DEDUPLICATE`)
+      are loaded, and if the file holds more, it is compacted once loaded
+    - Entries are appended (whole, while holding :func:`LockHistory`) & synced to disk at most every
+      `globals.HISTORY_FSYNC_INTERVAL` seconds
+    - Entries appended by other sessions are picked up from the offset the file was last read to (see :meth:`poll`)
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        super(ShellHistory, self).__init__()
+
+        # Entries loaded from the file & added during the session, to tell whether the file outgrew the limits
+        self.loaded = 0
+        self.stored = 0
+        self.duplicates = 0
+        self.entries = set()
+
+        # The file read so far (identity & offset), and entries of other sessions not yet handed to the prompt
+        self.identity = None
+        self.offset = 0
+        self.incoming = []
+        self._started = False
+
+        self._fd = None
+        self._dirty = False
+        self._synced = time.monotonic()
+
+    def load_history_strings(self) -> Iterator[str]:
+        limits = Limits()
+        read = 0
+
+        with LockHistory(self.filename):
+            try: f = open(self.filename, 'rb')
+            except FileNotFoundError: f = None
+
+            # Everything up to the current end is loaded below; entries appended later are polled
+            if f is not None:
+                st = os.fstat(f.fileno())
+                self.identity, self.offset = FileIdentity(st), st.st_size
+                size = st.st_size
+            self._started = True
+
+        if f is None: return
+
+        def records():
+            nonlocal read
+            for record in ReadRecordsReversed(f, size):
+                read += 1
+                yield record
+
+        with f:
+            for entry, _ in FilterRecords(records(), **limits):
+                self.loaded += 1
+                if limits['deduplicate'] == 'all': self.entries.add(entry)
+                yield entry
+
+        if read > self.loaded: self.compact()
+
+
+    def read_new(self) -> List[str]:
+        """Entries appended to the file by other sessions since it was last read, oldest first. Requires the lock"""
+        if not self._started: return []
+
+        try: f = open(self.filename, 'rb')
+        except FileNotFoundError:
+            self.identity, self.offset = None, 0
+            return []
+
+        with f:
+            st = os.fstat(f.fileno())
+            if self.identity is not None and FileIdentity(st) != self.identity:
+                # Compacted or cleared by another session: its entries are already part of the history (or were dropped)
+                self.identity, self.offset = FileIdentity(st), st.st_size
+                return []
+
+            # Created since loaded, or truncated by another program
+            if self.identity is None or st.st_size < self.offset: self.offset = 0
+            self.identity = FileIdentity(st)
+
+            f.seek(self.offset)
+            data = f.read(st.st_size - self.offset)
+            self.offset = st.st_size
+
+        entries = ParseEntries(data)
+        self.loaded += len(entries)
+        return entries
+
+    def poll(self) -> List[str]:
+        """Entries appended by other sessions that the prompt has not been given yet, oldest first"""
+        with LockHistory(self.filename):
+            entries = self.incoming + self.read_new()
+            self.incoming = []
+        return entries
+
+
+    def append(self, string: str) -> List[str]:
+        """Appends an entry to the file. Returns the entries other sessions appended before it, oldest first"""
+        self.stored += 1
+        if globs.HISTORY_DEDUPLICATE == 'all':
+            if string in self.entries: self.duplicates += 1
+            self.entries.add(string)
+
+        data = '\n# {}\n{}'.format(datetime.datetime.now(), ''.join('+%s\n' % line for line in string.split('\n'))).encode('utf-8')
+
+        with LockHistory(self.filename):
+            fd = self.open()
+            entries = self.incoming + self.read_new()
+            self.incoming = []
+
+            os.write(fd, data)
+            st = os.fstat(fd)
+            self.identity, self.offset = FileIdentity(st), st.st_size
+
+            self._dirty = True
+            self.sync()
+        return entries
+
+    def store_string(self, string: str) -> None:
+        self.append(string)
+
+    def open(self) -> int:
+        """The file descriptor entries are appended to, (re)opened if the file was replaced. Requires the lock"""
+        if self._fd is not None:
+            try: replaced = FileIdentity(os.stat(self.filename)) != FileIdentity(os.fstat(self._fd))
+            except FileNotFoundError: replaced = True
+            if not replaced: return self._fd
+            self.close()
+
+        self._fd = os.open(self.filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+        return self._fd
+
+    def sync(self, force: bool = False) -> None:
+        """Flushes the appended entries to disk, at most every `globals.HISTORY_FSYNC_INTERVAL` seconds unless forced"""
+        if self._fd is None or not self._dirty: return
+
+        now = time.monotonic()
+        if force or now - self._synced >= globs.HISTORY_FSYNC_INTERVAL:
+            os.fsync(self._fd)
+            self._synced = now
+            self._dirty = False
+
+    def close(self) -> None:
+        if self._fd is None: return
+        try: self.sync(force=True)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+
+    def compact(self) -> bool:
+        """Compacts the file (see :func:`CompactHistory`), keeping track of the entries other sessions appended before"""
+        with LockHistory(self.filename):
+            self.incoming += self.read_new()
+            try:
+                # The file cannot be replaced while open on some platforms
+                self.close()
+                compacted = CompactHistory(self.filename, **Limits())
+            except OSError as e:
+                logger.warning('Could not compact the history file "%s": %s', self.filename, e)
+                return False
+
+            if compacted:
+                st = os.stat(self.filename)
+                self.identity, self.offset = FileIdentity(st), st.st_size
+        return compacted
+
+    def clear(self) -> None:
+        """Empties the file (replacing it, as sessions may be reading it) & the loaded entries.
+        Sessions appending to it reopen it (see :meth:`open`)
+        """
+        with LockHistory(self.filename):
+            self.close()
+            try: ReplaceHistory(self.filename, [])
+            except FileNotFoundError: pass
+
+            self.identity = None
+            self.offset = 0
+            self.incoming = []
+            self.loaded = self.stored = self.duplicates = 0
+            self.entries.clear()
+            self._loaded_strings = []
+
+    def exceeds_limits(self) -> bool:
+        """True if entries added during the session made the file outgrow the limits"""
+        if not self.stored: return False
+        if self.duplicates: return True
+        if globs.HISTORY_MAX_ENTRIES is not None and self.loaded + self.stored > globs.HISTORY_MAX_ENTRIES: return True
+
+        try: return globs.HISTORY_MAX_BYTES is not None and os.path.getsize(self.filename) > globs.HISTORY_MAX_BYTES
+        except OSError: return False
+
+
+def IsSharedLoadingSupported(threaded_history: type) -> bool:
+    """True if `threaded_history` is the `ThreadedHistory` of prompt_toolkit 3.0.17+, whose internals (an async `load`,
+    `_lock` & `_loaded`) :class:`SharedHistory` builds on. Earlier versions (e.g. 2.0) have a different history API
+    """
+    return threaded_history is not None and inspect.isasyncgenfunction(getattr(threaded_history, 'load', None))
+
+
+if IsSharedLoadingSupported(ThreadedHistory):
+    class SharedHistory(ThreadedHistory):
+        """Loads a :class:`ShellHistory` in a background thread, and adds the entries appended by other sessions
+        each time a prompt is displayed
+        """
+
+        async def load(self):
+            if self._loaded:
+                try: entries = self.history.poll()
+                except OSError as e:
+                    logger.warning('Could not read the history file "%s": %s', self.history.filename, e)
+                    entries = None
+
+                if entries:
+                    with self._lock:
+                        for entry in entries: self._loaded_strings.insert(0, entry)
+
+            async for item in super(SharedHistory, self).load():
+                yield item
+
+        def append_string(self, string: str) -> None:
+            # Entries of other sessions appended before this one are older
+            entries = self.history.append(string)
+            with self._lock:
+                for entry in entries: self._loaded_strings.insert(0, entry)
+                self._loaded_strings.insert(0, string)
+
+        def clear(self) -> None:
+            self.history.clear()
+            with self._lock: self._loaded_strings = []
+else:
+    SharedHistory = None
+
+
+__HISTORIES__ = {}
+__HISTORIES_LOCK__ = threading.Lock()
+
+
+def GetHistory(path: str) -> History:
+    """The history of a history file, shared by every shell of the session so the file is only loaded once.
+    Entries are loaded in a background thread (most recent first), so the prompt is not delayed by large files.
+
+    With versions of prompt_toolkit that :class:`SharedHistory` does not support, the :class:`ShellHistory` itself
+    is returned: the prompt loads it, and entries of other sessions are only seen once the file is loaded again
+    """
+    path = os.path.abspath(path)
+    with __HISTORIES_LOCK__:
+        history = __HISTORIES__.get(path)
+        if history is None:
+            history = ShellHistory(path)
+            if SharedHistory is not None: history = SharedHistory(history)
+            __HISTORIES__[path] = history
+        return history
+
+
+def ForgetHistory(path: str) -> None:
+    """Syncs the history of a file to disk, and stops sharing it with the shells of the session (e.g. before the file is removed)"""
+    with __HISTORIES_LOCK__: history = __HISTORIES__.pop(os.path.abspath(path), None)
+    if history is not None: getattr(history, 'history', history).close()
+
+
+def CloseHistories() -> None:
+    """Syncs the history files of the session to disk, and compacts those that outgrew the limits.
+    Called when the session closes
+    """
+    with __HISTORIES_LOCK__: histories = list(__HISTORIES__.values())
+
+    for history in histories:
+        history = getattr(history, 'history', history)
+        try: history.close()
+        except OSError as e: logger.warning('Could not sync the history file "%s": %s', history.filename, e)
+        if history.exceeds_limits(): history.compact()
@@ -0,0 +1,453 @@
+from typing import List, Callable, TYPE_CHECKING
+from collections import OrderedDict
+from contextlib import contextmanager
+from io import StringIO
+
+import sys
+import time
+import threading
+
+import click
+
+from colorama import Style
+
+from . import globals as globs
+from . import _colors as colors
+
+# Thread pools are only imported once a command runs in the background, in parallel or with a timeout
+if TYPE_CHECKING: from concurrent.futures import ThreadPoolExecutor
+
+
+#------------------------------------------------------------------------------
+#  ANCHOR Per-Thread Output Capture
+
+class OutputRouter(object):
+    """A stand-in for `sys.stdout` / `sys.stderr` that writes to a per-thread stream when one is set,
+    otherwise to the stream it replaced
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._local = threading.local()
+
+    @property
+    def target(self):
+        return getattr(self._local, 'stream', None) or self.stream
+
+    def write(self, s):
+        return self.target.write(s)
+
+    def writelines(self, lines):
+        return self.target.writelines(lines)
+
+    def flush(self):
+        return self.target.flush()
+
+    def isatty(self):
+        # Output captured for a thread should look the same as if it was not (e.g. keep its colors once displayed)
+        try: return self.stream.isatty()
+        except AttributeError: return False
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def InstallOutputRouters() -> None:
+    if not isinstance(sys.stdout, OutputRouter): sys.stdout = OutputRouter(sys.stdout)
+    if not isinstance(sys.stderr, OutputRouter): sys.stderr = OutputRouter(sys.stderr)
+
+
+class TeeStream(object):
+    """Writes to several text streams at once"""
+
+    def __init__(self, *streams):
+        self.streams = streams
+
+    def write(self, s):
+        for stream in self.streams: stream.write(s)
+        return len(s)
+
+    def flush(self):
+        for stream in self.streams: stream.flush()
+
+    def isatty(self):
+        # Output should look the same as if it was not being captured
+        try: return self.streams[-1].isatty()
+        except AttributeError: return False
+
+
+@contextmanager
+def CaptureOutput(stream, tee=False):
+    """Redirects stdout & stderr of the current thread only into the given stream.
+    If `tee` is True, the output is also still written to where it was going before
+    """
+    InstallOutputRouters()
+    routers = (sys.stdout, sys.stderr)
+    previous = [getattr(router._local, 'stream', None) for router in routers]
+
+    for router in routers: 
+        router._local.stream = TeeStream(stream, router.target) if tee else stream
+    try: yield stream
+    finally:
+        for router, prev in zip(routers, previous): router._local.stream = prev
+
+
+#------------------------------------------------------------------------------
+#  ANCHOR Jobs
+
+class JobCancelled(click.ClickException):
+    """Raised from within a command once its job has been asked to stop"""
+
+    def __init__(self, message='The command was cancelled'):
+        super(JobCancelled, self).__init__(message)
+
+
+class JobTimeout(click.ClickException):
+    """The error of a command that did not finish before its timeout"""
+
+    def __init__(self, timeout: float):
+        super(JobTimeout, self).__init__('The command timed out after {:g} seconds'.format(timeout))
+
+
+class Job(object):
+    """A command line executed on a worker thread, with its output captured.
+    If given, `target` is called instead of executing the line in the shell
+    """
+
+    __counter = 0
+    __counter_lock = threading.Lock()
+
+    def __init__(self, line: str, target: Callable = None):
+        with Job.__counter_lock:
+            Job.__counter += 1
+            self.id = Job.__counter
+
+        self.line = line
+        self.target = target
+        self.output = StringIO()
+        self.error = None
+        self.result = None
+        self.elapsed = 0.0
+        self.future = None
+        self.timed_out = False
+
+        self.cancel_event = threading.Event()
+        self._started = None
+        self._emitted = 0
+
+    @property
+    def done(self) -> bool:
+        return self.future is not None and self.future.done()
+
+    @property
+    def status(self) -> str:
+        if self.future is None: return 'Pending'
+        if self.future.cancelled(): return 'Cancelled'
+        if not self.future.done():
+            if self._started is None: return 'Pending'
+            if self.timed_out: return 'Timed out, still running'
+            return 'Cancelling' if self.cancel_event.is_set() else 'Running'
+        if self.error is None: return 'Done'
+        if self.cancel_event.is_set() and isinstance(self.error, JobCancelled): return 'Timed out' if self.timed_out else 'Cancelled'
+        return 'Failed'
+
+    @property
+    def runtime(self) -> float:
+        if self._started is None: return 0.0
+        return self.elapsed if self.done else time.perf_counter() - self._started
+
+
+    def run(self, shell) -> 'Job':
+        __CURRENT__.job = self
+        with CaptureOutput(self.output):
+            self._started = time.perf_counter()
+            try:
+                shell.last_error = None
+                if self.target is not None: self.target()
+                else: shell.onecmd(self.line)
+                self.error = shell.last_error
+                self.result = shell.last_result
+            except KeyboardInterrupt:
+                self.error = click.Abort()
+            except BaseException as e:
+                self.error = e
+            finally:
+                self.elapsed = time.perf_counter() - self._started
+                __CURRENT__.job = None
+        return self
+
+    def submit(self, shell, executor) -> 'Job':
+        self.future = executor.submit(self.run, shell)
+        return self
+
+    def cancel(self) -> None:
+        """Asks the command to stop (see :func:`CheckCancelled`). A job that has not started yet will never run"""
+        self.cancel_event.set()
+        if self.future is not None: self.future.cancel()
+
+    def expire(self) -> None:
+        """Asks the command to stop once it has passed its timeout"""
+        self.timed_out = True
+        self.cancel()
+
+    def wait(self, interval: float = None) -> None:
+        # Polls, so that a KeyboardInterrupt can always stop the wait
+        while not self.done:
+            time.sleep(interval or globs.JOB_POLL_INTERVAL)
+
+
+    def emit_output(self) -> None:
+        """Writes any captured output that has not been written yet"""
+        output = self.output.getvalue()
+        chunk = output[self._emitted:]
+        self._emitted = len(output)
+        if chunk: click.echo(chunk, nl=False)
+
+    def emit(self, output=True) -> None:
+        status = self.status
+        if status == 'Done': status = '{}OK'.format(colors.JOB_STATUS_OK)
+        elif status == 'Failed': status = '{}{}'.format(colors.JOB_STATUS_FAILED, type(self.error).__name__)
+        else: status = '{}{}'.format(colors.JOB_STATUS_OTHER, status)
+
+        click.echo('\t{style}[{id}]{reset} {status}{reset} {timing}{ms:.2f} ms{reset}  {line}'.format(
+            style=colors.JOB_ID_STYLE, id=self.id, status=status,
+            timing=colors.JOB_TIMING_STYLE, ms=self.runtime * 1000, line=self.line, reset=Style.RESET_ALL
+        ))
+        if output: self.emit_output()
+
+
+__CURRENT__ = threading.local()
+
+
+def CurrentJob() -> Job:
+    """The job running on the current thread, if any"""
+    return getattr(__CURRENT__, 'job', None)
+
+def IsCancelled() -> bool:
+    """True if the command running on the current thread has been asked to stop"""
+    job = CurrentJob()
+    return job is not None and job.cancel_event.is_set()
+
+def CheckCancelled() -> None:
+    """Call periodically from long-running commands to stop cooperatively once cancelled"""
+    if IsCancelled(): raise JobCancelled()
+
+
+#------------------------------------------------------------------------------
+#  ANCHOR Background Job Table
+
+JOBS = OrderedDict()
+
+__EXECUTOR__ = None
+__FINISHED__: List[Job] = []
+__EMIT_LOCK__ = threading.RLock()
+__PROMPT_ACTIVE__ = False
+
+
+def GetExecutor() -> 'ThreadPoolExecutor':
+    """The shared pool used for background (`&`) jobs"""
+    global __EXECUTOR__
+    if __EXECUTOR__ is None:
+        from concurrent.futures import ThreadPoolExecutor
+        __EXECUTOR__ = ThreadPoolExecutor(max_workers=globs.PARALLEL_MAX_WORKERS, thread_name_prefix='pcshell-job')
+    return __EXECUTOR__
+
+
+def GetJob(id: int) -> Job:
+    try: return JOBS[id]
+    except KeyError: raise click.ClickException('No such job: {}'.format(id))
+
+
+def ReportJob(job: Job) -> None:
+    """Emits a background job's status & remaining output, and removes it from the job table"""
+    with __EMIT_LOCK__:
+        if JOBS.pop(job.id, None) is not None:
+            job.emit()
+
+
+def TrackBackground(job: Job) -> Job:
+    """Adds a submitted job to the job table. Its output is written above the prompt once it finishes,
+    or by :func:`EmitFinished` when no prompt is displayed
+    """
+    JOBS[job.id] = job
+
+    def on_done(future):
+        with __EMIT_LOCK__:
+            if __PROMPT_ACTIVE__: ReportJob(job)
+            else: __FINISHED__.append(job)
+
+    job.future.add_done_callback(on_done)
+    return job
+
+
+def SubmitBackground(shell, line: str) -> Job:
+    """Runs a command line on the shared pool, and returns immediately"""
+    return TrackBackground(Job(line).submit(shell, GetExecutor()))
+
+
+def EmitFinished() -> None:
+    """Emits the output of every background job that has finished since the last call"""
+    with __EMIT_LOCK__:
+        jobs = __FINISHED__.copy()
+        __FINISHED__.clear()
+        for job in jobs: ReportJob(job)
+
+
+def ForegroundJob(job: Job) -> None:
+    """Writes a background job's output as it is produced, until it finishes. A KeyboardInterrupt leaves it running"""
+    click.echo('\t{}[{}]{} {}'.format(colors.JOB_ID_STYLE, job.id, Style.RESET_ALL, job.line))
+    try:
+        while not job.done:
+            job.emit_output()
+            time.sleep(globs.JOB_POLL_INTERVAL)
+    except KeyboardInterrupt:
+        click.echo()
+        click.echo('\t{}[{}]{} {}continues in the background{}'.format(colors.JOB_ID_STYLE, job.id, Style.RESET_ALL, colors.JOB_STATUS_OTHER, Style.RESET_ALL))
+        return
+
+    job.emit_output()
+    ReportJob(job)
+
+
+def HasRunningJobs() -> bool:
+    return any(not job.done for job in list(JOBS.values()))
+
+
+def CancelJobs() -> None:
+    for job in list(JOBS.values()): job.cancel()
+
+
+@contextmanager
+def PromptOutput():
+    """While the prompt is displayed, background jobs that finish are written above it (through prompt_toolkit's
+    `patch_stdout`) rather than over the input line
+    """
+    global __PROMPT_ACTIVE__
+
+    if not HasRunningJobs():
+        yield
+        return
+
+    from prompt_toolkit.patch_stdout import patch_stdout
+
+    InstallOutputRouters()
+    routers = (sys.stdout, sys.stderr)
+    streams = [router.stream for router in routers]
+
+    with patch_stdout(raw=True):
+        # Keep the routers in place so job output is still captured, but send everything else through the proxy
+        proxy = sys.stdout
+        sys.stdout, sys.stderr = routers
+        for router in routers: router.stream = proxy
+
+        with __EMIT_LOCK__: __PROMPT_ACTIVE__ = True
+        try:
+            EmitFinished()
+            yield
+        finally:
+            with __EMIT_LOCK__: __PROMPT_ACTIVE__ = False
+            for router, stream in zip(routers, streams): router.stream = stream
+
+
+#------------------------------------------------------------------------------
+#  ANCHOR Timeouts
+
+__TIMEOUTS__ = threading.local()
+
+
+@contextmanager
+def NoTimeouts():
+    """Commands executed by the current thread within the block run on it directly, ignoring their timeouts"""
+    prev = getattr(__TIMEOUTS__, 'disabled', False)
+    __TIMEOUTS__.disabled = True
+    try: yield
+    finally: __TIMEOUTS__.disabled = prev
+
+
+def RunWithTimeout(shell, line: str, target: Callable, timeout: float):
+    """Calls `target` (which executes a command in the shell) on a worker thread, writing its output as it is produced.
+
+    Once `timeout` seconds have passed, the command is asked to stop (see :func:`CheckCancelled`), and the shell
+    returns immediately; the command is moved to the job table (listed by `jobs` while it still runs),
+    and reported as timed out once it ends.
+    A command that is already running on a worker thread (e.g. in the background) is instead cancelled in place
+    """
+    if getattr(__TIMEOUTS__, 'disabled', False): return target()
+
+    current = CurrentJob()
+    if current is not None:
+        timer = threading.Timer(timeout, current.expire)
+        timer.daemon = True
+        timer.start()
+        try: return target()
+        finally: timer.cancel()
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    # Each command gets a worker of its own, rather than one from the background pool: a command that ignores
+    # its cancellation keeps running, and would otherwise hold up background jobs & the next timed commands
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pcshell-timeout')
+    job = Job(line, target).submit(shell, executor)
+    executor.shutdown(wait=False)
+
+    deadline = time.monotonic() + timeout
+    try:
+        while not job.done and time.monotonic() < deadline:
+            job.emit_output()
+            time.sleep(globs.JOB_POLL_INTERVAL)
+    except KeyboardInterrupt:
+        job.cancel()
+        TrackBackground(job)
+        raise
+
+    job.emit_output()
+    if job.done:
+        shell.last_error, shell.last_result = job.error, job.result
+        if isinstance(job.error, click.Abort): raise KeyboardInterrupt()
+        return False
+
+    job.expire()
+    TrackBackground(job)
+    shell.last_error = JobTimeout(timeout)
+    click.echo('\t{}Error: {}{}'.format(colors.CLICK_ERROR_STYLE, shell.last_error.format_message(), Style.RESET_ALL), err=True)
+    click.echo('\t{}[{}]{} {}was asked to stop, and will be reported once it ends{}'.format(
+        colors.JOB_ID_STYLE, job.id, Style.RESET_ALL, colors.JOB_STATUS_OTHER, Style.RESET_ALL), err=True)
+    return False
+
+
+#------------------------------------------------------------------------------
+#  ANCHOR Parallel Execution
+
+def ExpandLines(lines: List[str]) -> List[str]:
+    """If the first line contains the placeholder, it is a template expanded once for each remaining value"""
+    if len(lines) > 1 and globs.PARALLEL_PLACEHOLDER in lines[0]:
+        return [lines[0].replace(globs.PARALLEL_PLACEHOLDER, value) for value in lines[1:]]
+    return list(lines)
+
+
+def RunParallel(shell, lines: List[str], workers: int = None, ordered=True) -> List[Job]:
+    """Runs every command line concurrently, emitting each job's output in order or as it completes"""
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    jobs = [Job(line) for line in lines]
+    with ThreadPoolExecutor(max_workers=workers or globs.PARALLEL_MAX_WORKERS, thread_name_prefix='pcshell-parallel') as executor:
+        for job in jobs: job.submit(shell, executor)
+
+        try:
+            if ordered:
+                for job in jobs:
+                    job.wait()
+                    job.emit()
+            else:
+                futures = { job.future: job for job in jobs }
+                for future in as_completed(futures):
+                    futures[future].emit()
+
+        except KeyboardInterrupt:
+            # Commands that have not started yet are cancelled, running commands are asked to stop
+            for job in jobs: job.cancel()
+            raise
+
+    return jobs
+
+#------------------------------------------------------------------------------
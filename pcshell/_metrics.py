@@ -0,0 +1,177 @@
+from collections import Counter, deque, OrderedDict
+
+import os
+import json
+import math
+import time
+import atexit
+import logging
+import tempfile
+import threading
+import traceback
+
+from logging import NullHandler
+
+from . import globals as globs
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(NullHandler())
+
+
+# Upper bounds (in seconds) of the latency histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def Quantile(values: list, q: float) -> float:
+    if not values: return 0.0
+    values = sorted(values)
+    return values[min(int(math.ceil(q * len(values))) - 1, len(values) - 1) if q > 0 else 0]
+
+
+class CommandMetrics(object):
+    """Invocation count, errors by exception type & latency of a single command"""
+
+    def __init__(self, sample_size: int):
+        self.count = 0
+        self.errors = Counter()
+        self.total = 0.0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        # Percentiles are computed from the most recent durations only, so memory stays bounded
+        self.samples = deque(maxlen=sample_size)
+
+    def record(self, duration: float, error: BaseException = None) -> None:
+        self.count += 1
+        self.total += duration
+        self.samples.append(duration)
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if duration <= bound: self.buckets[i] += 1
+        if error is not None: self.errors[type(error).__name__] += 1
+
+    def to_dict(self) -> dict:
+        samples = list(self.samples)
+        return OrderedDict([
+            ('invocations', self.count),
+            ('errors', dict(self.errors)),
+            ('duration_seconds', OrderedDict(
+                [('sum', self.total)] + [('p{}'.format(int(q * 100)), Quantile(samples, q)) for q in QUANTILES]
+            )),
+        ])
+
+
+class MetricsRegistry(object):
+    """Per-command metrics collected for the lifetime of the session, and optionally written to `globals.METRICS_FILE`
+    at most every `globals.METRICS_FLUSH_INTERVAL` seconds: once a command ends if the interval has passed, else once it
+    does (even if the session is idle by then), and when the session closes.
+
+    The file is a Prometheus textfile-collector file, or JSON if its name ends with `.json`
+    """
+
+    def __init__(self):
+        self.commands = OrderedDict()
+        self.started = time.time()
+        self._last_flush = time.monotonic()
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def record(self, command: str, duration: float, error: BaseException = None) -> None:
+        if not globs.METRICS_ENABLED: return
+
+        with self._lock:
+            metrics = self.commands.get(command)
+            if metrics is None:
+                metrics = self.commands[command] = CommandMetrics(globs.METRICS_SAMPLE_SIZE)
+            metrics.record(duration, error)
+
+            flush = False
+            if globs.METRICS_FILE:
+                wait = globs.METRICS_FLUSH_INTERVAL - (time.monotonic() - self._last_flush)
+                flush = wait <= 0
+                # Otherwise written once the interval has passed, as no command may end by then
+                if not flush and self._timer is None:
+                    self._timer = threading.Timer(wait, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+        if flush: self.flush()
+
+    def clear(self) -> None:
+        with self._lock: self.commands.clear()
+
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return OrderedDict([
+                ('started', self.started),
+                ('commands', OrderedDict((name, metrics.to_dict()) for name, metrics in self.commands.items())),
+            ])
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self) -> str:
+        prefix = globs.METRICS_PREFIX
+
+        def label(value: str) -> str:
+            return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+        invocations = ['# HELP {}_invocations_total Commands executed'.format(prefix), '# TYPE {}_invocations_total counter'.format(prefix)]
+        errors = ['# HELP {}_errors_total Commands that failed, by exception type'.format(prefix), '# TYPE {}_errors_total counter'.format(prefix)]
+        durations = ['# HELP {}_duration_seconds Command execution time'.format(prefix), '# TYPE {}_duration_seconds histogram'.format(prefix)]
+        quantiles = ['# HELP {}_duration_quantile_seconds Command execution time percentiles (recent commands)'.format(prefix), '# TYPE {}_duration_quantile_seconds gauge'.format(prefix)]
+
+        with self._lock:
+            for name, metrics in self.commands.items():
+                cmd = 'command="{}"'.format(label(name))
+                invocations.append('{}_invocations_total{{{}}} {}'.format(prefix, cmd, metrics.count))
+
+                for error, count in metrics.errors.items():
+                    errors.append('{}_errors_total{{{},type="{}"}} {}'.format(prefix, cmd, label(error), count))
+
+                for bound, count in zip(DURATION_BUCKETS, metrics.buckets):
+                    durations.append('{}_duration_seconds_bucket{{{},le="{}"}} {}'.format(prefix, cmd, bound, count))
+                durations.append('{}_duration_seconds_bucket{{{},le="+Inf"}} {}'.format(prefix, cmd, metrics.count))
+                durations.append('{}_duration_seconds_sum{{{}}} {}'.format(prefix, cmd, metrics.total))
+                durations.append('{}_duration_seconds_count{{{}}} {}'.format(prefix, cmd, metrics.count))
+
+                samples = list(metrics.samples)
+                for q in QUANTILES:
+                    quantiles.append('{}_duration_quantile_seconds{{{},quantile="{}"}} {}'.format(prefix, cmd, q, Quantile(samples, q)))
+
+        return '\n'.join(invocations + errors + durations + quantiles) + '\n'
+
+
+    def flush(self, path: str = None) -> None:
+        """Writes the metrics to the file (atomically, so a collector never reads a partial file)"""
+        if path is None:
+            path = globs.METRICS_FILE
+            with self._lock:
+                self._last_flush = time.monotonic()
+                timer, self._timer = self._timer, None
+            if timer is not None: timer.cancel()
+        if not path: return
+
+        try:
+            data = self.to_json() if path.endswith('.json') else self.to_prometheus()
+            directory = os.path.dirname(os.path.abspath(path))
+            if not os.path.isdir(directory): os.makedirs(directory)
+
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f: f.write(data)
+                os.replace(tmp, path)
+            except BaseException:
+                os.remove(tmp)
+                raise
+        except Exception:
+            logger.warning('Could not write the metrics file "%s"\n%s', path, traceback.format_exc())
+
+
+METRICS = MetricsRegistry()
+
+
+def FlushMetrics() -> None:
+    if globs.METRICS_FILE and METRICS.commands: METRICS.flush()
+
+
+atexit.register(FlushMetrics)
@@ -1,13 +1,47 @@
 import types
+from functools import update_wrapper
+
 from ._cmd_factories import ClickCmdShell
+from ._jobs import RunWithTimeout
+from ._pipes import CurrentPipeInput, ForwardPipeInput
+from . import globals as globs
 
 from .utils import HasKey
 
 
+# - exit: The command exits the shell it was invoked from
+# - parse_cache: The command's parsed parameters may be cached for identical argument lists (see `globals.PARSE_CACHE_SIZE`)
+# - pipe: The name of the parameter that receives the return value of the previous command in a pipeline (`cmd1 | cmd2`)
+# - timeout: Seconds after which the command is asked to stop & the shell returns to the prompt (see `globals.COMMAND_TIMEOUT`)
 CUSTOM_COMMAND_PROPS = [
     'exit',
+    'parse_cache',
+    'pipe',
+    'timeout',
 ]
 
 def CustomCommandPropsParser(shell: ClickCmdShell, cmd: object, name: str) -> None:
+    entry = shell.registry[name]
+
     if HasKey('exit', cmd):
-        setattr(shell, 'do_%s' % name, types.MethodType(lambda self, arg: True, shell))
\ No newline at end of file
+        entry.decorate('do', lambda invoke: types.MethodType(lambda self, arg: True, shell))
+
+    elif not getattr(cmd, 'isShell', False):
+        # Sub-shells cannot be started from a worker thread, so they are never timed out
+        def with_timeout(invoke):
+            def do_(self, arg):
+                timeout = getattr(cmd, 'timeout', globs.COMMAND_TIMEOUT)
+                if not timeout: return invoke(arg)
+
+                pipe, piping = CurrentPipeInput(), self.piping
+                def target():
+                    self._local.piping = piping
+                    try:
+                        with ForwardPipeInput(pipe): return invoke(arg)
+                    finally: self._local.piping = False
+
+                return RunWithTimeout(self, '{} {}'.format(name, arg).strip(), target, timeout)
+
+            return types.MethodType(update_wrapper(do_, invoke), shell)
+
+        entry.decorate('do', with_timeout)
@@ -0,0 +1,232 @@
+from typing import Union
+from collections import deque, OrderedDict
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+import io
+import os
+import sys
+import json
+import time
+
+import click
+
+from . import globals as globs
+from ._async import IterateAsync
+
+try:
+    import orjson
+except ImportError: orjson = None
+
+
+def IsStreamable(value: object) -> bool:
+    """True if a command returned an iterator (e.g. a generator), whose items are only produced as it is consumed"""
+    return isinstance(value, Iterator) or hasattr(value, '__anext__')
+
+
+def IterateResult(value: object):
+    return IterateAsync(value) if hasattr(value, '__anext__') else value
+
+
+def FormatItem(item: object) -> str:
+    if isinstance(item, str): return item
+    try: return json.dumps(item, sort_keys=True)
+    except (TypeError, ValueError): return str(item)
+
+
+def DrainOutput(value: object) -> None:
+    """Consumes an iterator without keeping any of its items, so that the body of a generator command runs to completion"""
+    deque(IterateResult(value), maxlen=0)
+
+
+#------------------------------------------------------------------------------
+#  ANCHOR Output Encoders
+
+class OutputEncoder(object):
+    """Writes the return value of a command to a text stream, or to a binary stream if the encoder is `binary`.
+
+    An iterator is written item by item as it is produced (only one item is held in memory at a time),
+    and the stream is flushed at least every `globals.STREAM_FLUSH_INTERVAL` seconds
+    """
+
+    binary = False
+
+    def check(self) -> None:
+        """Raises a `click.UsageError` if the format cannot be written (e.g. its package is missing). Called once the
+        format is chosen, before the command runs
+        """
+
+    def write(self, value: object, out) -> None:
+        self._last_flush = time.monotonic()
+        if IsStreamable(value): self.write_items(IterateResult(value), out)
+        else: self.write_value(value, out)
+        out.flush()
+
+    def write_value(self, value: object, out) -> None:
+        self.write_items(iter([value]), out)
+
+    def write_items(self, items, out) -> None:
+        for item in items:
+            out.write(self.encode(item))
+            self.tick(out)
+
+    def encode(self, item: object) -> Union[str, bytes]:
+        raise NotImplementedError()
+
+    def tick(self, out) -> None:
+        now = time.monotonic()
+        if now - self._last_flush >= globs.STREAM_FLUSH_INTERVAL:
+            self._last_flush = now
+            out.flush()
+
+
+class JsonEncoder(OutputEncoder):
+    """Sort-keyed, indentation-free JSON. Iterators are written one item per line"""
+
+    def write_value(self, value, out):
+        try: text = json.dumps(value, sort_keys=True).strip()
+        except (TypeError, ValueError): text = str(value).strip()
+        out.write(text + '\n')
+
+    def encode(self, item):
+        return FormatItem(item) + '\n'
+
+
+class CompactJsonEncoder(OutputEncoder):
+    """JSON without sorted keys or whitespace, using `orjson` when it is installed. Iterators are written one item per line"""
+
+    def encode(self, item):
+        if orjson is not None:
+            try: return orjson.dumps(item, default=str, option=orjson.OPT_APPEND_NEWLINE).decode('utf-8')
+            except TypeError: pass
+        return json.dumps(item, separators=(',', ':'), default=str) + '\n'
+
+
+class NdJsonEncoder(CompactJsonEncoder):
+    """Newline-delimited JSON: one compact JSON document per item of a returned list, tuple or iterator"""
+
+    def write_value(self, value, out):
+        self.write_items(iter(value) if isinstance(value, (list, tuple)) else iter([value]), out)
+
+
+class CsvEncoder(OutputEncoder):
+    """One row per item of a returned list, tuple or iterator. Mappings are written under a header row of
+    the first row's keys; sequences as-is, and anything else as a single column
+    """
+
+    def __init__(self, delimiter: str = ','):
+        self.delimiter = delimiter
+
+    def write_value(self, value, out):
+        self.write_items(iter(value) if isinstance(value, (list, tuple)) else iter([value]), out)
+
+    def write_items(self, items, out):
+        import csv
+
+        # Rows end with a plain newline, which the text stream translates for the platform
+        writer = csv.writer(out, delimiter=self.delimiter, lineterminator='\n')
+        header = None
+
+        for item in items:
+            if isinstance(item, dict):
+                if header is None:
+                    header = list(item.keys())
+                    writer.writerow(header)
+                row = [item.get(key) for key in header]
+            elif isinstance(item, (list, tuple)): row = item
+            else: row = [item]
+
+            writer.writerow(row)
+            self.tick(out)
+
+
+class MsgPackEncoder(OutputEncoder):
+    """MessagePack (requires `msgpack`). Iterators are written as a stream of consecutive objects"""
+
+    binary = True
+
+    def check(self):
+        try: import msgpack
+        except ImportError: raise click.UsageError('The "msgpack" output format requires the msgpack package')
+
+    def write(self, value, out):
+        import msgpack
+        self._packer = msgpack.Packer(default=str)
+        super(MsgPackEncoder, self).write(value, out)
+
+    def encode(self, item):
+        return self._packer.pack(item)
+
+
+ENCODERS = OrderedDict([
+    ('json', JsonEncoder()),
+    ('compact', CompactJsonEncoder()),
+    ('ndjson', NdJsonEncoder()),
+    ('csv', CsvEncoder(',')),
+    ('tsv', CsvEncoder('\t')),
+    ('msgpack', MsgPackEncoder()),
+])
+
+
+def RegisterEncoder(name: str, encoder: OutputEncoder) -> None:
+    """Adds (or replaces) an output format selectable with `--format`"""
+    ENCODERS[name] = encoder
+
+
+def GetEncoder(name: str) -> OutputEncoder:
+    try: encoder = ENCODERS[name]
+    except KeyError: raise click.BadParameter('Unknown output format "{}". Valid formats are: {}'.format(name, ', '.join(ENCODERS)))
+    encoder.check()
+    return encoder
+
+
+def GetOutputFormat(name: str = None) -> str:
+    """The output format given to the command, else that of the environment variable, else `globals.OUTPUT_FORMAT`"""
+    return name or os.environ.get(globs.OUTPUT_FORMAT_ENVVAR) or globs.OUTPUT_FORMAT
+
+
+#------------------------------------------------------------------------------
+#  ANCHOR Buffered Binary Output (used by binary encoders)
+
+class TextStreamWriter(object):
+    """Writes bytes to a text stream that has no binary buffer (e.g. a StringIO)"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, b):
+        self.stream.write(b.decode('utf-8', errors='surrogateescape'))
+        return len(b)
+
+    def flush(self):
+        self.stream.flush()
+
+
+@contextmanager
+def BinaryStdOut():
+    """A large, buffered binary writer over stdout's file descriptor. Falls back to stdout's own buffer, or to its text layer"""
+    stream = sys.stdout
+    stream.flush()
+
+    try:
+        out = open(stream.fileno(), 'wb', buffering=globs.STREAM_BUFFER_SIZE, closefd=False)
+    except (AttributeError, ValueError, OSError, io.UnsupportedOperation):
+        buffer = getattr(stream, 'buffer', None)
+        yield buffer if buffer is not None else TextStreamWriter(stream)
+        return
+
+    try: yield out
+    finally: out.close()
+
+
+def WriteOutput(value: object, format: str = None) -> None:
+    """Writes the return value of a command to stdout in the given (or default) output format"""
+    encoder = GetEncoder(GetOutputFormat(format))
+    if not encoder.binary:
+        encoder.write(value, click.get_text_stream('stdout'))
+        return
+
+    with BinaryStdOut() as out:
+        encoder.write(value, out)
+
+#------------------------------------------------------------------------------
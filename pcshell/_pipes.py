@@ -0,0 +1,96 @@
+from typing import List
+from contextlib import contextmanager
+
+import threading
+
+import click
+
+from . import globals as globs
+
+
+def SplitPipeline(line: str) -> List[str]:
+    """Splits a command line on every pipe operator that is not quoted, escaped, bracketed or doubled (`||`)"""
+    operator = globs.PIPE_OPERATOR
+    stages = []
+    quote = None
+    depth = 0
+    start = 0
+    i = 0
+
+    while i < len(line):
+        char = line[i]
+
+        if char == '\\' and quote != "'":
+            i += 2
+            continue
+
+        if quote:
+            if char == quote: quote = None
+        elif char in ('"', "'"): quote = char
+        elif char == '[': depth += 1
+        elif char == ']': depth = max(depth - 1, 0)
+        elif depth == 0 and line.startswith(operator, i):
+            if line.startswith(operator, i + len(operator)):
+                i += len(operator) * 2
+                continue
+
+            stages.append(line[start:i].strip())
+            i += len(operator)
+            start = i
+            continue
+        i += 1
+
+    stages.append(line[start:].strip())
+    return stages
+
+
+class PipeInput(object):
+    """The return value of the previous command in a pipeline, waiting to be passed to the next command.
+
+    While entered as a context manager, it is the pending input of the current thread, which is consumed by
+    the first command parsed on that thread
+    """
+
+    def __init__(self, value: object):
+        self.value = value
+        self.consumed = False
+        self._prev = None
+
+    def __enter__(self):
+        self._prev = getattr(__PIPE__, 'input', None)
+        __PIPE__.input = self
+        return self
+
+    def __exit__(self, *exc):
+        __PIPE__.input = self._prev
+        return False
+
+
+__PIPE__ = threading.local()
+
+
+def CurrentPipeInput() -> PipeInput:
+    return getattr(__PIPE__, 'input', None)
+
+
+@contextmanager
+def ForwardPipeInput(pipe: PipeInput):
+    """Makes the pending pipe input of another thread (e.g. the one that submitted a job) that of the current thread"""
+    prev = getattr(__PIPE__, 'input', None)
+    __PIPE__.input = pipe
+    try: yield pipe
+    finally: __PIPE__.input = prev
+
+
+def TakePipeInput(cmd: click.Command, ctx: click.Context) -> PipeInput:
+    """Returns the pending pipe input of the current thread (if any), marking it as consumed by the command.
+    Fails if the command has no parameter designated to receive it (`pipe='<param name>'`)
+    """
+    pipe: PipeInput = getattr(__PIPE__, 'input', None)
+    if pipe is None or pipe.consumed or ctx.resilient_parsing: return None
+
+    pipe.consumed = True
+    name = getattr(cmd, 'pipe', None)
+    if not name or name not in [param.name for param in cmd.params]:
+        ctx.fail('Command "{}" does not accept piped input'.format(cmd.name))
+    return pipe
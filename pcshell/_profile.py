@@ -0,0 +1,148 @@
+from typing import Callable, TYPE_CHECKING
+from collections import Counter
+from io import StringIO
+
+import os
+import sys
+import time
+import threading
+
+import click
+
+from colorama import Style
+
+from . import globals as globs
+from . import _colors as colors
+
+# The profilers are only imported once a command is profiled
+if TYPE_CHECKING: import cProfile
+
+
+class StackSampler(threading.Thread):
+    """A sampling profiler: records the call stack of one thread at a fixed interval, counting identical stacks.
+    Only the frames called from `base` (exclusive) are recorded
+    """
+
+    def __init__(self, thread_id: int, base, interval: float):
+        super(StackSampler, self).__init__(name='pcshell-profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.base = base
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and frame is not self.base:
+                code = frame.f_code
+                stack.append('{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+                frame = frame.f_back
+            if stack: self.stacks[tuple(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+    @property
+    def total(self) -> int:
+        return sum(self.stacks.values())
+
+    def collapsed(self) -> str:
+        """The samples in the "collapsed stack" format read by flamegraph tools"""
+        return ''.join('{} {}\n'.format(';'.join(stack), count) for stack, count in self.stacks.items())
+
+    def top(self, n: int):
+        """The functions most often at the top of the stack, with their sample count"""
+        leaves = Counter()
+        for stack, count in self.stacks.items(): leaves[stack[-1]] += count
+        return leaves.most_common(n)
+
+
+class ProfileResult(object):
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.profiler: 'cProfile.Profile' = None
+        self.sampler: StackSampler = None
+        self.snapshots = None
+        self.elapsed = 0.0
+
+
+def RunProfiled(run: Callable, mode: str = 'cprofile', memory=False, interval: float = None) -> ProfileResult:
+    """Calls `run` on the current thread under cProfile (`mode='cprofile'`) or the stack sampler (`mode='sample'`),
+    optionally taking tracemalloc snapshots before & after. Work done on other threads is not profiled
+    """
+    import cProfile
+    import tracemalloc
+
+    result = ProfileResult(mode)
+
+    tracing = tracemalloc.is_tracing()
+    if memory:
+        if not tracing: tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+
+    if mode == 'sample':
+        result.sampler = StackSampler(threading.get_ident(), sys._getframe(), interval or globs.PROFILE_SAMPLE_INTERVAL)
+        result.sampler.start()
+    else:
+        result.profiler = cProfile.Profile()
+        result.profiler.enable()
+
+    start = time.perf_counter()
+    try: run()
+    finally:
+        result.elapsed = time.perf_counter() - start
+        if result.sampler is not None: result.sampler.stop()
+        else: result.profiler.disable()
+
+        if memory:
+            ignore = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__))
+            result.snapshots = (before.filter_traces(ignore), tracemalloc.take_snapshot().filter_traces(ignore))
+            if not tracing: tracemalloc.stop()
+
+    return result
+
+
+def SaveProfile(result: ProfileResult, directory: str) -> str:
+    """Saves the profile next to the history file: a `.prof` file (pstats) for cProfile,
+    or a `.collapsed` file for the sampler. Returns its path
+    """
+    name = '{}-{}'.format(globs.PROFILE_FILENAME, time.strftime('%Y%m%d-%H%M%S'))
+
+    if result.sampler is not None:
+        path = os.path.join(directory, name + '.collapsed')
+        with open(path, 'w', encoding='utf-8') as f: f.write(result.sampler.collapsed())
+    else:
+        path = os.path.join(directory, name + '.prof')
+        result.profiler.dump_stats(path)
+    return path
+
+
+def ReportProfile(line: str, result: ProfileResult, top: int, sort: str, path: str = None) -> None:
+    click.echo('\n\t{}[profile]{} {} {}{:.2f} ms{}'.format(
+        colors.PROFILE_HEADER_STYLE, Style.RESET_ALL, line, colors.PROFILE_TIMING_STYLE, result.elapsed * 1000, Style.RESET_ALL))
+
+    if result.sampler is not None:
+        total = result.sampler.total
+        click.echo('\t  {}{} samples{}'.format(colors.PROFILE_TIMING_STYLE, total, Style.RESET_ALL))
+        for function, count in result.sampler.top(top if total else 0):
+            click.echo('\t  {:>7} {:>6.1f}%  {}'.format(count, count * 100 / total, function))
+    else:
+        import pstats
+
+        stream = StringIO()
+        stats = pstats.Stats(result.profiler, stream=stream)
+        stats.strip_dirs().sort_stats(sort).print_stats(top)
+        for row in stream.getvalue().strip('\n').splitlines():
+            click.echo('\t' + row)
+
+    if result.snapshots is not None:
+        before, after = result.snapshots
+        click.echo('\n\t{}Memory allocated (by line){}'.format(colors.PROFILE_HEADER_STYLE, Style.RESET_ALL))
+        for stat in after.compare_to(before, 'lineno')[:top]:
+            click.echo('\t  {}'.format(stat))
+
+    if path:
+        click.echo('\n\t{}Saved to {}{}'.format(colors.PROFILE_TIMING_STYLE, path, Style.RESET_ALL))
@@ -0,0 +1,406 @@
+from typing import List, Tuple
+from collections import OrderedDict
+from contextlib import redirect_stdout
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import tempfile
+import importlib
+import threading
+
+import click
+
+from . import globals as globs
+from ._utils import CreatePipeInput, EndPipeInput
+from ._metrics import Quantile
+
+
+# Named keys of a keystroke script (`{name}`), as sent by a VT100 terminal
+KEYS = OrderedDict([
+    ('enter', '\r'),
+    ('tab', '\t'),
+    ('s-tab', '\x1b[Z'),
+    ('space', ' '),
+    ('backspace', '\x7f'),
+    ('delete', '\x1b[3~'),
+    ('up', '\x1b[A'),
+    ('down', '\x1b[B'),
+    ('right', '\x1b[C'),
+    ('left', '\x1b[D'),
+    ('home', '\x1b[H'),
+    ('end', '\x1b[F'),
+    ('c-a', '\x01'),
+    ('c-c', '\x03'),
+    ('c-d', '\x04'),
+    ('c-e', '\x05'),
+    ('c-k', '\x0b'),
+    ('c-l', '\x0c'),
+    ('c-r', '\x12'),
+    ('c-u', '\x15'),
+    ('c-w', '\x17'),
+])
+
+STAGES = ('latency', 'completion', 'lexing', 'render')
+
+
+def ParseKeystrokes(script: str) -> List[Tuple[str, str]]:
+    """Splits a keystroke script into (label, data) pairs. Each character is typed as one keystroke, `{name}` presses
+    a named key (see `KEYS`), `{{` types a brace, and a newline presses Enter
+    """
+    keystrokes = []
+    for match in re.finditer(r'\{\{|\{([\w-]+)\}|\n|.', script, re.S):
+        token, name = match.group(0), match.group(1)
+        if name is not None:
+            if name.lower() not in KEYS: raise ValueError('Unknown key in keystroke script: {%s}' % name)
+            keystrokes.append(('{%s}' % name.lower(), KEYS[name.lower()]))
+        elif token == '\n': keystrokes.append(('{enter}', KEYS['enter']))
+        elif token == '{{': keystrokes.append(('{', '{'))
+        else: keystrokes.append((token, token))
+    return keystrokes
+
+
+def Summary(samples: List[float]) -> OrderedDict:
+    """Milliseconds: mean, median, 99th percentile & max of a list of durations in seconds"""
+    def ms(value): return round(value * 1000, 3)
+    return OrderedDict([
+        ('n', len(samples)),
+        ('mean_ms', ms(sum(samples) / len(samples)) if samples else 0.0),
+        ('p50_ms', ms(Quantile(samples, 0.5))),
+        ('p99_ms', ms(Quantile(samples, 0.99))),
+        ('max_ms', ms(max(samples)) if samples else 0.0),
+    ])
+
+
+class KeystrokeStats(object):
+    """The time spent processing one keystroke, by stage"""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.sent = None
+        self.latency = 0.0
+        self.completion = 0.0
+        self.lexing = 0.0
+        self.render = 0.0
+        self.completions = 0
+        self.renders = 0
+
+    def to_dict(self) -> OrderedDict:
+        def ms(value): return round(value * 1000, 3)
+        return OrderedDict([
+            ('key', self.label),
+            ('latency_ms', ms(self.latency)),
+            ('completion_ms', ms(self.completion)),
+            ('lexing_ms', ms(self.lexing)),
+            ('render_ms', ms(self.render)),
+            ('completions', self.completions),
+            ('renders', self.renders),
+        ])
+
+
+class KeystrokeReplay(object):
+    """Replays a keystroke script into the prompt of a shell without a terminal, and records the time spent on each
+    keystroke (completion, lexing & rendering) along with the result of every command executed.
+
+    While entered as a context manager, the replay is the active one (`globals.__REPLAY__`): any shell started reads
+    its input from the replay, renders to a `DummyOutput`, and has its prompt instrumented. Its history is kept in a
+    temporary file, removed once the replay ends, so the user's history is neither recalled nor changed: pass
+    `history=True` for the shells to use their own history files, or the path of another file.
+
+    The keystrokes are fed from a separate thread, one at a time: each is sent once the previous one was processed
+    (see `globals.REPLAY_SETTLE_TIME`). Once they run out, the input is closed, which exits the shell
+    """
+
+    def __init__(self, keystrokes, settle: float = None, timeout: float = None, history=None):
+        self.keystrokes = ParseKeystrokes(keystrokes) if isinstance(keystrokes, str) else list(keystrokes)
+        self.settle = globs.REPLAY_SETTLE_TIME if settle is None else settle
+        self.timeout = globs.REPLAY_KEY_TIMEOUT if timeout is None else timeout
+        self.history = history
+
+        self.input = None
+        self.output = None
+
+        self.keys: List[KeystrokeStats] = []
+        self.commands = []
+        self.first_prompt = None
+        self.timed_out = None
+
+        self._current = KeystrokeStats(None)
+        self._cond = threading.Condition()
+        self._ready = False
+        self._pending = 0
+        self._last_event = 0.0
+        self._finished = False
+        self._render_start = None
+        self._start = None
+        self._pipe = None
+        self._closed = False
+        self._prev = None
+        self._tmpdir = None
+
+    def __enter__(self):
+        from prompt_toolkit.output import DummyOutput
+
+        if self.history is None: self._tmpdir = tempfile.mkdtemp(prefix='pcshell-replay-')
+        self._pipe = CreatePipeInput()
+        self.input = self._pipe.__enter__()
+        self.output = DummyOutput()
+
+        self._prev = globs.__REPLAY__
+        globs.__REPLAY__ = self
+        return self
+
+    def __exit__(self, *exc):
+        globs.__REPLAY__ = self._prev
+        self.close()
+
+        pipe, self._pipe = self._pipe, None
+        if pipe is not None: pipe.__exit__(None, None, None)
+
+        if self.history is not True:
+            from ._history import ForgetHistory
+            ForgetHistory(self.history_file(None))
+        if self._tmpdir is not None:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            self._tmpdir = None
+        return False
+
+    def close(self) -> None:
+        """Ends the input, which exits the shell. Only the first call ends it, from whichever thread"""
+        with self._cond:
+            if self._closed or self._pipe is None: return
+            self._closed = True
+        EndPipeInput(self.input)
+
+    def history_file(self, path: str) -> str:
+        """The history file used during the replay by a shell whose own is `path`"""
+        if self.history is True: return path
+        return self.history or os.path.join(self._tmpdir, globs.HISTORY_FILENAME)
+
+
+    # ----------------------------------------------------------------------------------------------
+    # ANCHOR Running
+
+    def run(self, cli: click.BaseCommand, args: List[str] = None, prog_name: str = None) -> OrderedDict:
+        """Starts the shell of `cli` & replays the keystrokes into it, until it exits. Returns the report.
+        \nThe application must have been created in shell mode (`globals.__IsShell__`), so its built-in commands exist
+        """
+        feeder = threading.Thread(target=self.feed, name='pcshell-replay', daemon=True)
+        self._start = time.perf_counter()
+        feeder.start()
+        try:
+            cli.main(args=list(args or []), prog_name=prog_name or cli.name, standalone_mode=False)
+        except (click.exceptions.Exit, click.Abort, EOFError):
+            pass
+        finally:
+            with self._cond:
+                self._finished = True
+                self._cond.notify_all()
+            feeder.join()
+        return self.report()
+
+    def feed(self) -> None:
+        try:
+            if not self.wait(): return
+
+            for label, data in self.keystrokes:
+                stats = KeystrokeStats(label)
+                with self._cond:
+                    self._current = stats
+                    self._ready = False
+                    stats.sent = self._last_event = time.perf_counter()
+
+                self.input.send_text(data)
+                processed = self.wait()
+                # A keystroke that exited the shell was processed too
+                if processed or self._finished: self.keys.append(stats)
+                if not processed:
+                    if not self._finished: self.timed_out = label
+                    return
+        finally:
+            # Ends the shell once the keystrokes run out (or cannot be processed)
+            self.close()
+
+    def wait(self) -> bool:
+        """Waits until the last keystroke was processed. Returns False if the shell exited or the timeout expired"""
+        deadline = time.perf_counter() + self.timeout
+        with self._cond:
+            while not self._finished:
+                now = time.perf_counter()
+                idle = now - self._last_event
+                if self._ready and not self._pending and idle >= self.settle: return True
+                if now >= deadline: return False
+                self._cond.wait(min(max(self.settle - idle, 0.001), deadline - now))
+        return False
+
+
+    # ----------------------------------------------------------------------------------------------
+    # ANCHOR Instrumentation
+
+    def attach(self, session) -> None:
+        """Instruments the completer, lexer & rendering of a prompt session created by a shell"""
+        if session.completer is not None: session.completer = TimedCompleter(session.completer, self)
+        if session.lexer is not None: session.lexer = TimedLexer(session.lexer, self)
+        session.app.before_render += self.before_render
+        session.app.after_render += self.after_render
+
+    def event(self, ready: bool = None) -> None:
+        with self._cond:
+            self._last_event = time.perf_counter()
+            if ready is not None: self._ready = ready
+            self._cond.notify_all()
+
+    def before_render(self, app) -> None:
+        self._render_start = time.perf_counter()
+
+    def after_render(self, app) -> None:
+        now = time.perf_counter()
+        stats = self._current
+        if self._render_start is not None:
+            stats.render += now - self._render_start
+            stats.renders += 1
+        if stats.sent is not None: stats.latency = now - stats.sent
+        elif self.first_prompt is None and not app.is_done: self.first_prompt = now - self._start
+
+        # The final render of a prompt (once a line is accepted) is not the shell waiting for input
+        self.event(ready=not app.is_done)
+
+    def completion_started(self) -> None:
+        with self._cond: self._pending += 1
+
+    def completion_finished(self, elapsed: float) -> None:
+        stats = self._current
+        stats.completion += elapsed
+        stats.completions += 1
+        with self._cond: self._pending -= 1
+        self.event()
+
+    def lexed(self, elapsed: float) -> None:
+        self._current.lexing += elapsed
+
+    def record(self, line: str, error: BaseException, result: object, elapsed: float) -> None:
+        """Records a command executed by a shell"""
+        self.commands.append(OrderedDict([
+            ('line', line),
+            ('ok', error is None),
+            ('error', None if error is None else '{}: {}'.format(type(error).__name__, error)),
+            ('result', None if result is None else repr(result)[:200]),
+            ('elapsed_ms', round(elapsed * 1000, 3)),
+        ]))
+        self.event()
+
+
+    # ----------------------------------------------------------------------------------------------
+    # ANCHOR Report
+
+    @property
+    def complete(self) -> bool:
+        """True if every keystroke was processed"""
+        return len(self.keys) == len(self.keystrokes)
+
+    def report(self) -> OrderedDict:
+        return OrderedDict([
+            ('keystrokes', len(self.keystrokes)),
+            ('processed', len(self.keys)),
+            ('timed_out', self.timed_out),
+            ('first_prompt_ms', None if self.first_prompt is None else round(self.first_prompt * 1000, 3)),
+            ('summary', OrderedDict((stage, Summary([getattr(stats, stage) for stats in self.keys])) for stage in STAGES)),
+            ('keys', [stats.to_dict() for stats in self.keys]),
+            ('commands', self.commands),
+        ])
+
+
+def TimedCompleter(completer, replay: KeystrokeReplay):
+    """Wraps a prompt_toolkit completer, reporting the time taken to produce every completion to the replay"""
+    from prompt_toolkit.completion import Completer
+
+    class _TimedCompleter(Completer):
+        def get_completions(self, document, complete_event):
+            replay.completion_started()
+            start = time.perf_counter()
+            try: completions = list(completer.get_completions(document, complete_event))
+            finally: replay.completion_finished(time.perf_counter() - start)
+            return completions
+
+    return _TimedCompleter()
+
+
+def TimedLexer(lexer, replay: KeystrokeReplay):
+    """Wraps a prompt_toolkit lexer, reporting the time spent lexing (including every line rendered) to the replay"""
+    from prompt_toolkit.lexers import Lexer
+
+    class _TimedLexer(Lexer):
+        def lex_document(self, document):
+            start = time.perf_counter()
+            get_line = lexer.lex_document(document)
+            replay.lexed(time.perf_counter() - start)
+
+            def timed_get_line(lineno):
+                start = time.perf_counter()
+                try: return get_line(lineno)
+                finally: replay.lexed(time.perf_counter() - start)
+            return timed_get_line
+
+        def invalidation_hash(self):
+            return lexer.invalidation_hash()
+
+    return _TimedLexer()
+
+
+#------------------------------------------------------------------------------
+#  ANCHOR Command Line
+
+def LoadApplication(target: str) -> click.BaseCommand:
+    """Imports `module:attribute` in shell mode, so the application is built with its built-in commands"""
+    module, _, attr = target.partition(':')
+    if not module or not attr: raise click.BadParameter('Expected "module:attribute"', param_hint='APP')
+
+    if '' not in sys.path: sys.path.insert(0, '')
+    globs.__IsShell__ = True
+    return getattr(importlib.import_module(module), attr)
+
+
+def main(argv: List[str] = None) -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='python -m pcshell.replay',
+        description='Replay keystrokes into a pcshell application without a terminal, and report the time spent on each')
+    parser.add_argument('app', help='The shell to start, as "module:attribute"')
+    parser.add_argument('script', help='Keystroke script file ("-" for stdin): typed characters, {tab}, {up}, ... & newlines for Enter')
+    parser.add_argument('--settle', type=float, default=None, help='Seconds without activity after which a keystroke is processed')
+    parser.add_argument('--timeout', type=float, default=None, help='Seconds to wait for each keystroke to be processed')
+    parser.add_argument('--max-p99', type=float, default=None, help='Fail if the 99th percentile keystroke latency exceeds this (ms)')
+    parser.add_argument('--fail-on-error', action='store_true', help='Fail if a command raised an error')
+    parser.add_argument('--output', help='Write the report to this file instead of stdout')
+    parser.add_argument('--history', nargs='?', const=True, default=None, metavar='FILE',
+        help="Use the application's history file (or FILE) rather than a temporary one, which is removed afterwards")
+    args = parser.parse_args(argv)
+
+    if args.script == '-': script = sys.stdin.read()
+    else:
+        with open(args.script, 'r', encoding='utf-8') as f: script = f.read()
+
+    cli = LoadApplication(args.app)
+    # The output of the commands goes to stderr, leaving stdout to the report
+    with KeystrokeReplay(script, settle=args.settle, timeout=args.timeout, history=args.history) as replay, redirect_stdout(sys.stderr):
+        report = replay.run(cli)
+
+    failures = []
+    if not replay.complete:
+        failures.append('{} of {} keystrokes processed'.format(len(replay.keys), len(replay.keystrokes)))
+    if args.max_p99 is not None and report['summary']['latency']['p99_ms'] > args.max_p99:
+        failures.append('p99 keystroke latency {} ms exceeds {} ms'.format(report['summary']['latency']['p99_ms'], args.max_p99))
+    if args.fail_on_error:
+        failures += ['"{}" failed ({})'.format(command['line'], command['error']) for command in report['commands'] if not command['ok']]
+    report['failures'] = failures
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f: f.write(text + '\n')
+    else:
+        print(text)
+
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,162 @@
+from typing import Callable
+from collections import OrderedDict
+from functools import update_wrapper
+
+import atexit
+import inspect
+import logging
+import threading
+import traceback
+
+from logging import NullHandler
+
+from ._async import RunCoroutine
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(NullHandler())
+
+
+class ResourceRegistry(object):
+    """Named, session-scoped objects (clients, connection pools, loaded models, etc.) shared by every command & sub-shell.
+
+    A resource is created by its factory the first time it is requested, and torn down (in the reverse order of creation)
+    when the session closes. A factory may be:
+
+    - A function returning the resource (torn down by `teardown`, if given)
+    - A generator function that yields the resource, then cleans it up
+    - A function returning a context manager, which is entered & exited
+    - Any of the above as `async` variants, which are run on the session event loop
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._instances = OrderedDict()
+        self._finalizers = []
+        self._lock = threading.RLock()
+
+    def __contains__(self, name: str):
+        return name in self._factories
+
+    def register(self, name: str, factory: Callable, teardown: Callable = None) -> None:
+        with self._lock:
+            if name in self._instances:
+                raise RuntimeError('Resource "{}" is already in use and cannot be replaced'.format(name))
+            self._factories[name] = (factory, teardown)
+
+    def get(self, name: str) -> object:
+        try: return self._instances[name]
+        except KeyError: pass
+
+        with self._lock:
+            if name in self._instances: return self._instances[name]
+            try: factory, teardown = self._factories[name]
+            except KeyError: raise KeyError('No resource named "{}" has been registered'.format(name))
+
+            value, finalizer = self.__create(factory, teardown)
+            self._instances[name] = value
+            self._finalizers.append((name, finalizer))
+            return value
+
+    def is_created(self, name: str) -> bool:
+        return name in self._instances
+
+    def close(self) -> None:
+        """Tears down every created resource, most recently created first"""
+        with self._lock:
+            finalizers = self._finalizers
+            self._finalizers = []
+            self._instances.clear()
+
+        for name, finalizer in reversed(finalizers):
+            if finalizer is None: continue
+            try: finalizer()
+            except Exception:
+                logger.warning('Failed to tear down resource "%s"\n%s', name, traceback.format_exc())
+
+
+    @staticmethod
+    def __create(factory: Callable, teardown: Callable):
+        if inspect.isasyncgenfunction(factory):
+            gen = factory()
+            value = RunCoroutine(gen.__anext__())
+            return value, lambda: ResourceRegistry.__finish_async_generator(gen)
+
+        if inspect.isgeneratorfunction(factory):
+            gen = factory()
+            value = next(gen)
+            return value, lambda: ResourceRegistry.__finish_generator(gen)
+
+        value = factory()
+        if inspect.isawaitable(value): value = RunCoroutine(value)
+
+        if hasattr(value, '__aenter__') and hasattr(value, '__aexit__'):
+            manager = value
+            value = RunCoroutine(manager.__aenter__())
+            return value, lambda: RunCoroutine(manager.__aexit__(None, None, None))
+
+        if hasattr(value, '__enter__') and hasattr(value, '__exit__'):
+            manager = value
+            value = manager.__enter__()
+            return value, lambda: manager.__exit__(None, None, None)
+
+        if teardown is not None:
+            def finalizer():
+                rv = teardown(value)
+                if inspect.isawaitable(rv): RunCoroutine(rv)
+            return value, finalizer
+
+        return value, None
+
+    @staticmethod
+    def __finish_generator(gen):
+        try: next(gen)
+        except StopIteration: pass
+        else: raise RuntimeError('Resource generator yielded more than once')
+
+    @staticmethod
+    def __finish_async_generator(gen):
+        try: RunCoroutine(gen.__anext__())
+        except StopAsyncIteration: pass
+        else: raise RuntimeError('Resource generator yielded more than once')
+
+
+RESOURCES = ResourceRegistry()
+
+
+def RegisterResource(name: str, factory: Callable, teardown: Callable = None) -> None:
+    """Registers a factory for a session resource. See :class:`ResourceRegistry`"""
+    RESOURCES.register(name, factory, teardown)
+
+def GetResource(name: str) -> object:
+    """Returns the named session resource, creating it on first use"""
+    return RESOURCES.get(name)
+
+def CloseResources() -> None:
+    RESOURCES.close()
+
+
+def resource(name: str = None, teardown: Callable = None):
+    """Decorator registering the decorated function as the factory for a session resource.
+    The name defaults to the function name
+    """
+    def decorator(f):
+        RegisterResource(name or f.__name__, f, teardown)
+        return f
+
+    return decorator
+
+
+def pass_resource(name: str, arg: str = None):
+    """Passes the named session resource to the command callback, as the keyword argument `arg` (defaults to the name)"""
+    def decorator(f):
+        def new_func(*args, **kwargs):
+            kwargs[arg or name] = GetResource(name)
+            return f(*args, **kwargs)
+
+        return update_wrapper(new_func, f)
+
+    return decorator
+
+
+atexit.register(CloseResources)
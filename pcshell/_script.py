@@ -0,0 +1,136 @@
+from contextlib import contextmanager
+
+import io
+import os
+import sys
+import time
+
+import click
+
+from colorama import Style
+
+from . import globals as globs
+from . import _colors as colors
+
+
+class ScriptReader(object):
+    """Lazily streams the executable lines of a shell script (a file path or an open text stream), and keeps track of their status.
+
+    While entered as a context manager, the reader is the active script (`globals.__SCRIPT__`)
+    that any shell will consume its lines from instead of rendering a prompt
+    """
+
+    def __init__(self, source, report=None):
+        if isinstance(source, str):
+            self.path = os.path.abspath(source)
+            self.name = os.path.basename(source)
+            self.stream = None
+        else:
+            self.path = None
+            self.name = getattr(source, 'name', '<stream>')
+            self.stream = source
+        self.report = globs.SCRIPT_REPORT if report is None else report
+
+        self.lineno = 0
+        self.executed = 0
+        self.failed = 0
+        self.aborted = False
+
+        self._start = None
+        self._file = None
+        self._prev = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'r', encoding='utf-8') if self.stream is None else self.stream
+        self._prev = globs.__SCRIPT__
+        globs.__SCRIPT__ = self
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        globs.__SCRIPT__ = self._prev
+        if self.stream is None: self._file.close()
+        if self.report: self.summary()
+        return False
+
+
+    def readline(self) -> str:
+        """Returns the next executable line of the script, or None once the script has ended"""
+        if self.aborted: return None
+
+        for line in self._file:
+            self.lineno += 1
+            line = line.strip()
+            if line and not line.startswith(globs.SCRIPT_COMMENT_PREFIX):
+                return line
+        return None
+
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._start if self._start is not None else 0.0
+
+
+    def record(self, line: str, lineno: int, error: BaseException, elapsed: float) -> None:
+        self.executed += 1
+        if error is not None:
+            self.failed += 1
+            if isinstance(error, click.Abort): self.aborted = True
+
+        if self.report:
+            status = '{}OK'.format(colors.SCRIPT_STATUS_OK) if error is None else '{}{}'.format(colors.SCRIPT_STATUS_FAILED, type(error).__name__)
+            click.echo('\t{style}[{name}:{lineno}]{reset} {status}{reset} {timing}{ms:.2f} ms{reset}  {line}'.format(
+                style=colors.SCRIPT_LINE_STYLE, name=self.name, lineno=lineno, status=status,
+                timing=colors.SCRIPT_TIMING_STYLE, ms=elapsed * 1000, line=line, reset=Style.RESET_ALL
+            ), err=True)
+
+    def summary(self) -> None:
+        click.echo('\t{style}[{name}]{reset} {count} line{s} executed, {color}{failed} failed{reset} {timing}in {sec:.3f} s{reset}'.format(
+            style=colors.SCRIPT_LINE_STYLE, name=self.name, count=self.executed, s='' if self.executed == 1 else 's',
+            color=colors.SCRIPT_STATUS_FAILED if self.failed else colors.SCRIPT_STATUS_OK, failed=self.failed,
+            timing=colors.SCRIPT_TIMING_STYLE, sec=self.elapsed, reset=Style.RESET_ALL
+        ), err=True)
+
+
+#------------------------------------------------------------------------------
+#  ANCHOR Batched Output
+
+class BatchedTextWriter(io.TextIOWrapper):
+    """A text stream over an existing file descriptor that only flushes once per interval, rather than on every write"""
+
+    def __init__(self, stream, buffer_size: int, interval: float):
+        raw = open(stream.fileno(), 'wb', buffering=buffer_size, closefd=False)
+        super(BatchedTextWriter, self).__init__(raw, encoding=stream.encoding, errors=stream.errors)
+        self.interval = interval
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        now = time.monotonic()
+        if now - self._last_flush >= self.interval:
+            self._last_flush = now
+            super(BatchedTextWriter, self).flush()
+
+    def flush_all(self):
+        self._last_flush = time.monotonic()
+        super(BatchedTextWriter, self).flush()
+
+
+@contextmanager
+def BatchedStdOut():
+    """Temporarily replaces `sys.stdout` with a :class:`BatchedTextWriter`, if stdout is backed by a file descriptor"""
+    try:
+        writer = BatchedTextWriter(sys.stdout, globs.STREAM_BUFFER_SIZE, globs.STREAM_FLUSH_INTERVAL)
+    except (AttributeError, ValueError, OSError, io.UnsupportedOperation):
+        yield None
+        return
+
+    prev = sys.stdout
+    prev.flush()
+    sys.stdout = writer
+    try: yield writer
+    finally:
+        sys.stdout = prev
+        writer.flush_all()
+        writer.detach()
+
+#------------------------------------------------------------------------------
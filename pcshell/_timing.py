@@ -0,0 +1,122 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import os
+import time
+import threading
+
+import click
+
+from colorama import Style
+
+from . import _colors as colors
+
+
+PHASES = ('parse', 'invoke', 'output')
+
+
+class PhaseTimer(object):
+    """Accumulates the time spent in each phase of executing a command. Nested phases pause the enclosing phase,
+    so that the time of a sub-command's parsing is not also counted as the invocation of its group
+    """
+
+    def __init__(self):
+        self.phases = OrderedDict((name, 0.0) for name in PHASES)
+        self._stack = []
+
+    def enter(self, name: str) -> None:
+        now = time.perf_counter()
+        if self._stack:
+            outer = self._stack[-1]
+            self.phases[outer[0]] += now - outer[1]
+        self._stack.append([name, now])
+
+    def exit(self) -> None:
+        now = time.perf_counter()
+        name, start = self._stack.pop()
+        self.phases[name] = self.phases.get(name, 0.0) + (now - start)
+        if self._stack: self._stack[-1][1] = now
+
+
+__TIMER__ = threading.local()
+
+
+@contextmanager
+def Phase(name: str):
+    """Attributes the time spent within the block to a phase of the command being measured on this thread (if any)"""
+    timer: PhaseTimer = getattr(__TIMER__, 'timer', None)
+    if timer is None:
+        yield
+        return
+
+    timer.enter(name)
+    try: yield
+    finally: timer.exit()
+
+
+class Measurement(object):
+    def __init__(self):
+        self.wall = 0.0
+        self.user = 0.0
+        self.system = 0.0
+        self.peak = 0
+        self.phases = OrderedDict()
+
+    @property
+    def other(self) -> float:
+        return max(self.wall - sum(self.phases.values()), 0.0)
+
+
+@contextmanager
+def Measure():
+    """Measures the wall time, CPU time (of the whole process), peak memory allocated and time per phase of the enclosed block"""
+    import tracemalloc
+
+    measurement = Measurement()
+    timer = PhaseTimer()
+    prev = getattr(__TIMER__, 'timer', None)
+    __TIMER__.timer = timer
+
+    tracing = tracemalloc.is_tracing()
+    if not tracing: tracemalloc.start()
+    elif hasattr(tracemalloc, 'reset_peak'): tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+
+    times = os.times()
+    start = time.perf_counter()
+    try: yield measurement
+    finally:
+        measurement.wall = time.perf_counter() - start
+        end = os.times()
+        measurement.user = end.user - times.user
+        measurement.system = end.system - times.system
+
+        measurement.peak = max(tracemalloc.get_traced_memory()[1] - base, 0)
+        if not tracing: tracemalloc.stop()
+
+        __TIMER__.timer = prev
+        measurement.phases = timer.phases
+
+
+def FormatBytes(size: int) -> str:
+    if size < 1024: return '{} B'.format(size)
+    for unit in ('KiB', 'MiB', 'GiB'):
+        size /= 1024
+        if size < 1024 or unit == 'GiB': return '{:.1f} {}'.format(size, unit)
+
+
+def ReportMeasurement(line: str, measurement: Measurement) -> None:
+    def field(label, value):
+        return '{}{}{} {}{}{}'.format(colors.TIME_LABEL_STYLE, label, Style.RESET_ALL, colors.TIME_VALUE_STYLE, value, Style.RESET_ALL)
+
+    def ms(seconds):
+        return '{:.2f} ms'.format(seconds * 1000)
+
+    click.echo('\n\t{}[time]{} {}'.format(colors.TIME_HEADER_STYLE, Style.RESET_ALL, line))
+    click.echo('\t  ' + '   '.join([
+        field('wall', ms(measurement.wall)), field('user', ms(measurement.user)),
+        field('sys', ms(measurement.system)), field('peak', FormatBytes(measurement.peak))
+    ]))
+    click.echo('\t  ' + '   '.join(
+        [field(name, ms(seconds)) for name, seconds in measurement.phases.items()] + [field('other', ms(measurement.other))]
+    ))
@@ -89,4 +89,38 @@ def suggest(keys: List[str], flag: str):
             return replacenth(suggestion, ',', ', or', index)
     return None
 
-#------------------------------------------------------------------------------
\ No newline at end of file
+#------------------------------------------------------------------------------
+
+#------------------------------------------------------------------------------
+#  ANCHOR prompt_toolkit Compatibility
+
+def CreatePipeInput():
+    """A context manager returning a new prompt_toolkit pipe input, and closing it on exit.
+    prompt_toolkit 3.0.29+ only creates pipe inputs through a context manager, while earlier versions return the input itself
+    """
+    from contextlib import contextmanager
+    from prompt_toolkit.input.defaults import create_pipe_input
+
+    @contextmanager
+    def closing(pipe):
+        try: yield pipe
+        finally:
+            # Its writing end may already be closed (see EndPipeInput), which earlier versions do not check
+            try: pipe.close()
+            except OSError: pass
+
+    pipe = create_pipe_input()
+    if hasattr(pipe, 'send_text'): return closing(pipe)
+    return pipe
+
+
+def EndPipeInput(pipe_input) -> None:
+    """Closes the writing end of a pipe input, so the prompt reading it gets an EOF. The reading end must stay open
+    while the prompt runs (its event loop would not be woken otherwise): it is closed once :func:`CreatePipeInput` exits
+    """
+    pipe = getattr(pipe_input, 'pipe', None)
+    # prompt_toolkit 3.0.29+
+    if hasattr(pipe, 'close_write'): pipe.close_write()
+    # Earlier versions, whose `close` also closes the reading end
+    elif hasattr(pipe_input, '_w'): os.close(pipe_input._w)
+    else: pipe_input.close()
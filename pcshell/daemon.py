@@ -0,0 +1,6 @@
+"""
+Daemon mode: keeps an application loaded and runs the commands sent to it by a thin client over a Unix socket
+"""
+
+from ._daemon import ServeDaemon, IsDaemonSupported
+from ._client import RunClient
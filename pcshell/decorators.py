@@ -1,9 +1,18 @@
 from functools import update_wrapper
+from io import StringIO
+
+import inspect
 
 import click
 
 from .shell import MultiCommandShell
 from ._repeat import BuildCommandString
+from ._resources import pass_resource
+from ._cache import ResultCache, GetResultCachePath
+from ._jobs import CaptureOutput
+from ._async import RunCoroutine
+from ._output import IsStreamable, IterateResult
+from . import globals as globs
 
 from .pretty import argument, option, prettyGroup, prettyCommand
 
@@ -37,4 +46,48 @@ def repeatable(f):
         BuildCommandString(ctx)
         return f(*args, **kwargs)
 
-    return update_wrapper(repeat, f)
\ No newline at end of file
+    return update_wrapper(repeat, f)
+
+
+def memoize(f=None, ttl: float = None, maxsize: int = 128, persist=False):
+    """Caches the command's return value (the items of an iterator, as a list) & output, keyed by its parameters.
+    A cached result is returned (and its output written again) instead of invoking the command, unless the
+    `--no-cache` flag is given.
+    \nUse bare (`@memoize`) or with arguments: `ttl` in seconds, `maxsize` entries, and `persist` (True, or the path of a file)
+    to keep the cache on disk between sessions. Place this decorator beneath all other click decorators
+    """
+    def decorator(f):
+        path = None
+        if persist:
+            path = persist if isinstance(persist, str) else GetResultCachePath('{}.{}'.format(f.__module__, f.__qualname__))
+        cache = ResultCache(ttl=ttl, maxsize=maxsize, path=path)
+
+        no_cache_param = globs.MEMOIZE_NO_CACHE_OPTION.lstrip('-').replace('-', '_')
+
+        def memoized(*args, **kwargs):
+            no_cache = kwargs.pop(no_cache_param, False)
+            ctx = click.get_current_context()
+            key = cache.key({ k: v for k, v in ctx.params.items() if k != no_cache_param })
+
+            if not no_cache:
+                entry = cache.get(key)
+                if entry is not None:
+                    if entry.output: click.echo(entry.output, nl=False)
+                    return entry.value
+
+            output = StringIO()
+            with CaptureOutput(output, tee=True):
+                rv = f(*args, **kwargs)
+                if inspect.isawaitable(rv): rv = RunCoroutine(rv)
+                # An iterator could only be consumed once: its items (and output) are what is cached
+                if IsStreamable(rv): rv = list(IterateResult(rv))
+
+            cache.put(key, rv, output.getvalue())
+            return rv
+
+        memoized = update_wrapper(memoized, f)
+        memoized.cache = cache
+        return option(globs.MEMOIZE_NO_CACHE_OPTION, is_flag=True, help='Ignore any cached result of this command')(memoized)
+
+    if f is not None and callable(f): return decorator(f)
+    return decorator
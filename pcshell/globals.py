@@ -3,6 +3,8 @@
 
 # #####################################
 HISTORY_FILENAME = '.pcshell-history'
+PROFILE_FILENAME = '.pcshell-profile'
+RESULT_CACHE_DIRNAME = '.pcshell-cache'
 
 
 MASTERSHELL_COMMAND_ALIAS_RESTART = ['restart']
@@ -14,12 +16,91 @@ SHELL_COMMAND_ALIAS_CLEAR = ['cls', 'clear']
 SHELL_COMMAND_ALIAS_QUIT = ['q', 'quit']
 SHELL_COMMAND_ALIAS_EXIT = ['exit']
 SHELL_COMMAND_ALIAS_REPEAT = ['repeat']
+SHELL_COMMAND_ALIAS_SOURCE = ['source']
+SHELL_COMMAND_ALIAS_PARALLEL = ['parallel']
+SHELL_COMMAND_ALIAS_JOBS = ['jobs']
+SHELL_COMMAND_ALIAS_WAIT = ['wait']
+SHELL_COMMAND_ALIAS_FOREGROUND = ['fg']
+SHELL_COMMAND_ALIAS_KILL = ['kill']
+SHELL_COMMAND_ALIAS_TIME = ['time']
+SHELL_COMMAND_ALIAS_PROFILE = ['profile']
+
+SHELL_SCRIPT_OPTION = '--script'
+SHELL_FORMAT_OPTION = '--format'
+SHELL_DAEMON_OPTION = '--daemon'
+SCRIPT_COMMENT_PREFIX = '#'
 # #####################################
 
 
 # ----------------------------------------------------
 SHOW_STACKTRACE = True
 
+# Maximum number of parse results kept for commands defined with `parse_cache=True`
+PARSE_CACHE_SIZE = 256
+
+# Option added to memoized commands to bypass their cached result
+MEMOIZE_NO_CACHE_OPTION = '--no-cache'
+
+# Output format of command return values outside of the shell (json, compact, ndjson, csv, tsv, msgpack).
+# Selected with the master shell's `--format` option, or the environment variable below
+OUTPUT_FORMAT = 'json'
+OUTPUT_FORMAT_ENVVAR = 'PCSHELL_FORMAT'
+
+# Entries & bytes kept in the history file at most (None for no limit), and the duplicates dropped from it: 'consecutive'
+# (a command repeated right after itself), 'all' (only the most recent occurrence is kept) or None. The file is compacted
+# (rewritten atomically) when it is loaded or the shell exits, if it exceeds either limit or holds dropped duplicates
+HISTORY_MAX_ENTRIES = 10000
+HISTORY_MAX_BYTES = 4 * 1024 * 1024
+HISTORY_DEDUPLICATE = 'consecutive'
+
+# The history file can be shared by concurrent sessions: entries are appended while holding a lock on `<file>.lock`,
+# and synced to disk at most every interval (in seconds; 0 syncs every entry) and when the session closes
+HISTORY_FSYNC_INTERVAL = 1.0
+
+# Report the status & timing of every line executed from a script (to stderr)
+SCRIPT_REPORT = True
+
+# Output buffering used while a shell streams commands from a non-interactive stdin
+STREAM_BUFFER_SIZE = 65536
+STREAM_FLUSH_INTERVAL = 0.5
+
+# Worker pool used by the 'parallel' command & background ('&') commands. None uses the concurrent.futures default
+PARALLEL_MAX_WORKERS = None
+PARALLEL_PLACEHOLDER = '{}'
+BACKGROUND_SUFFIX = '&'
+JOB_POLL_INTERVAL = 0.05
+
+# Seconds after which a command is asked to stop and the shell returns to the prompt, unless the command sets
+# its own `timeout`. None disables the default. Commands must check `pcshell.jobs.CheckCancelled()` to actually stop
+COMMAND_TIMEOUT = None
+
+# Passes the return value of one command directly to the designated parameter (`pipe='<param>'`) of the next
+PIPE_OPERATOR = '|'
+
+# Defaults of the 'profile' command: number of functions listed, and the interval between samples of the sampling profiler
+PROFILE_TOP = 20
+PROFILE_SAMPLE_INTERVAL = 0.005
+
+# Per-command metrics (invocations, errors & latency) collected during the session. If a file is given, they are written
+# to it at most every METRICS_FLUSH_INTERVAL seconds, and when the session closes: in the Prometheus textfile-collector
+# format, or as JSON if the filename ends with '.json'
+METRICS_ENABLED = True
+METRICS_FILE = None
+METRICS_FLUSH_INTERVAL = 60
+METRICS_SAMPLE_SIZE = 1024
+METRICS_PREFIX = 'pcshell_command'
+
+# Pending connections of the daemon started with the master shell's `--daemon <socket>` option (Unix only)
+DAEMON_BACKLOG = 64
+
+# Keystroke replays (see `pcshell.replay`): a keystroke is processed once the prompt has rendered, no completion is pending,
+# and nothing else happened for the settle time (in seconds). A replay stops if a keystroke is not processed within the timeout
+REPLAY_SETTLE_TIME = 0.02
+REPLAY_KEY_TIMEOUT = 10
+
+# Seconds to wait for pending async tasks when the session event loop is closed
+ASYNC_SHUTDOWN_TIMEOUT = 5
+
 
 __IsShell__ = None
 
@@ -34,4 +115,7 @@ __SHELL_PATH__ = []
 __MASTER_SHELL__ = None
 
 __CURRENT_LINE__ = ''
+
+__SCRIPT__ = None
+__REPLAY__ = None
 # ----------------------------------------------------
\ No newline at end of file
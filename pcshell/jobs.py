@@ -0,0 +1,8 @@
+"""
+Background jobs & cooperative cancellation for commands run with 'parallel' or the '&' suffix
+"""
+
+from ._jobs import (
+    Job, JobCancelled, JobTimeout, JOBS,
+    CurrentJob, IsCancelled, CheckCancelled
+)
\ No newline at end of file
@@ -0,0 +1,8 @@
+"""
+Per-command metrics (invocations, errors by type & latency) collected for the lifetime of the shell session
+"""
+
+from ._metrics import (
+    MetricsRegistry, CommandMetrics, METRICS,
+    FlushMetrics
+)
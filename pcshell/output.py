@@ -0,0 +1,8 @@
+"""
+Encoders for the results of commands written outside of the shell, selected with `--format`
+"""
+
+from ._output import (
+    OutputEncoder, JsonEncoder, CompactJsonEncoder, NdJsonEncoder, CsvEncoder, MsgPackEncoder,
+    ENCODERS, RegisterEncoder, GetEncoder
+)
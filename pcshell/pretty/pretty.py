@@ -27,6 +27,11 @@ from .. import globals as globs
 from .. import _colors as colors
 from .._utils import HasKey, suggest
 from .. import chars
+from .._cmd import GetCurrentLine
+from .._cache import IsParseCacheable, GetParseCacheKey, CacheParseResult, ApplyParseResult
+from .._pipes import TakePipeInput
+from .._output import WriteOutput, GetEncoder, GetOutputFormat
+from .._timing import Phase
 
 
 
@@ -172,7 +177,7 @@ class PrettyHelper:
 
     @staticmethod
     def VerifyCommand(self: MultiCommand, ctx: Context):
-        line = globs.__CURRENT_LINE__
+        line = GetCurrentLine(ctx)
         commands = []
 
         for subcommand in self.list_commands(ctx):
@@ -189,12 +194,11 @@ class PrettyHelper:
 
 
     @staticmethod
-    def StdOut(ret: object) :
+    def StdOut(ret: object, format: str = None) :
         if not globs.__IsShell__:
-            try:
-                return click.echo((json.dumps(ret, sort_keys=True)).strip())
-            except:
-                return click.echo(ret.strip())
+            # Encoded with the selected output format (see `globals.OUTPUT_FORMAT`).
+            # Iterators are written item by item as they are produced, rather than collected first
+            with Phase('output'): return WriteOutput(ret, format)
 
 
     @staticmethod
@@ -222,11 +226,13 @@ class PrettyHelper:
         try:
             try:
                 with self.make_context(prog_name, args, **extra) as ctx:
+                    # An unknown output format is reported before the command runs, rather than after
+                    if not globs.__IsShell__: GetEncoder(GetOutputFormat(ctx.meta.get('pcshell.format')))
                     rv = self.invoke(ctx)
 
                     # Send returned data from command to stdout if not in Shell mode, 
                     # automatically dumping the json of serializable objects
-                    if rv: PrettyHelper.StdOut(rv)
+                    if rv: PrettyHelper.StdOut(rv, ctx.meta.get('pcshell.format'))
 
                     if not standalone_mode:
                         return rv
@@ -348,7 +354,7 @@ class PrettyHelper:
                     dic['%s_count' % key] -= 1
 
                 def typed_tuple_map() -> dict:
-                    line = globs.__CURRENT_LINE__
+                    line = GetCurrentLine(ctx)
                     matches = re.findall(r"\s(--[\w]*)([\s]*\[)", line)
 
                     dic = dict()
@@ -575,6 +581,16 @@ class PrettyHelper:
             click.echo(ctx.get_help(), color=ctx.color)
             ctx.exit()
 
+        # The return value of the previous command in a pipeline is passed as-is to the designated parameter
+        pipe = TakePipeInput(self, ctx)
+
+        # Commands that opted-in may skip parsing entirely for an identical argument list
+        cache_key = None
+        if globs.__IsShell__ and not ctx.resilient_parsing and pipe is None and IsParseCacheable(self):
+            cache_key = GetParseCacheKey(ctx, args)
+            cached = ApplyParseResult(cache_key, ctx)
+            if cached is not None: return cached
+
         args = PrettyHelper.parse_line(args)
         ctx.original_params = args.copy()
 
@@ -584,6 +600,12 @@ class PrettyHelper:
 
         i = 0
         for param in iter_params_for_processing(param_order, self.get_params(ctx)):
+            if pipe is not None and param.name == self.pipe:
+                if opts.get(param.name) is not None:
+                    ctx.fail('"{}" receives piped input and cannot also be given'.format(param.name))
+                if param.expose_value: ctx.params[param.name] = pipe.value
+                continue
+
             if supportsLiterals(param):
                 value, args, i = param.handle_parse_result(ctx, opts, args, i)
             else:
@@ -597,6 +619,7 @@ class PrettyHelper:
             )
 
         ctx.args = args
+        if cache_key: CacheParseResult(cache_key, ctx)
         return args
 
 
@@ -606,7 +629,7 @@ class PrettyParser(OptionParser):
 
         from .._completion import COMPLETION_TREE, deep_get
 
-        true_line = globs.__CURRENT_LINE__.rstrip()
+        true_line = GetCurrentLine(self.ctx).rstrip()
         line = (((' '.join(globs.__SHELL_PATH__) + ' ') if len(globs.__SHELL_PATH__) else '') + true_line).rstrip()
 
         if ' ' in line: words = line.split(' ')
@@ -796,7 +819,7 @@ class PrettyParser(OptionParser):
 
 
         def get_tuple_insert_index(option, value):
-            true_line = globs.__CURRENT_LINE__.rstrip()
+            true_line = GetCurrentLine(self.ctx).rstrip()
             line = (((' '.join(globs.__SHELL_PATH__) + ' ') if len(globs.__SHELL_PATH__) else '') + true_line).rstrip()
 
             query = '(?<=--{name}\s)(\[.*?\])'.format(name=option.name)
@@ -1,4 +1,6 @@
 from typing import List
+from importlib.util import find_spec
+import inspect
 import re
 
 import click
@@ -6,6 +8,8 @@ from click.core import iter_params_for_processing, make_str, OptionParser
 
 from .pretty import PrettyHelper, PrettyParser
 from .prettyoption import PrettyOption
+from .._async import RunCoroutine
+from .._timing import Phase
 
 
 class PrettyCommand(click.Command):
@@ -35,6 +39,17 @@ class PrettyCommand(click.Command):
         PrettyHelper.format_epilog(self, ctx, formatter)
 
 
+    def invoke(self, ctx):
+        """Invokes the callback. An `async def` callback is run to completion on the session's event loop
+        (use `pass_context` rather than `get_current_context()` to access the context from a coroutine)
+        """
+        with Phase('invoke'):
+            rv = click.Command.invoke(self, ctx)
+            if inspect.isawaitable(rv):
+                rv = RunCoroutine(rv)
+        return rv
+
+
     def main(self, args=None, prog_name=None, complete_var=None, standalone_mode=True, **extra):
         return PrettyHelper.main(self, args=args, prog_name=prog_name, complete_var=complete_var, standalone_mode=standalone_mode, **extra)
 
@@ -44,16 +59,14 @@ class PrettyCommand(click.Command):
         return isinstance(param, PrettyOption)
 
     def parse_args(self, ctx, args):
-        return PrettyHelper.parse_args(self, ctx, args, PrettyCommand.supportsLiterals)
+        with Phase('parse'):
+            return PrettyHelper.parse_args(self, ctx, args, PrettyCommand.supportsLiterals)
 
 
     def make_parser(self, ctx):
         """Creates the underlying option parser for this command."""
-        bUsePromptToolkit = False
-        try:
-            import prompt_toolkit
-            bUsePromptToolkit = True
-        except: pass
+        # Only checks that prompt_toolkit is installed, without importing it
+        bUsePromptToolkit = find_spec('prompt_toolkit') is not None
 
         parser = PrettyParser(ctx) if bUsePromptToolkit else OptionParser(ctx)
         for param in self.get_params(ctx):
@@ -2,6 +2,7 @@ import click
 
 from .pretty import PrettyHelper
 from .prettyoption import PrettyOption
+from .._timing import Phase
 
 
 class PrettyGroup(click.Group):
@@ -90,9 +91,10 @@ class PrettyGroup(click.Group):
             click.echo(ctx.get_help(), color=ctx.color)
             ctx.exit()
 
-        args = PrettyHelper.parse_line(args)
+        with Phase('parse'):
+            args = PrettyHelper.parse_line(args)
+            rest = click.Command.parse_args(self, ctx, args)
 
-        rest = click.Command.parse_args(self, ctx, args)
         if self.chain:
             ctx.protected_args = rest
             ctx.args = []
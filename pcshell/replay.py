@@ -0,0 +1,13 @@
+"""
+Headless keystroke replays: drives the prompt of a shell with recorded keystrokes (without a terminal), and reports
+the time spent on each keystroke & the result of every command. Run `python -m pcshell.replay --help`
+"""
+
+from ._replay import (
+    KeystrokeReplay, KeystrokeStats, KEYS,
+    ParseKeystrokes, main
+)
+
+
+if __name__ == '__main__':
+    main()
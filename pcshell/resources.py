@@ -0,0 +1,9 @@
+"""
+Session-scoped resources shared by every command & sub-shell, created lazily and torn down when the shell closes
+"""
+
+from ._resources import (
+    ResourceRegistry, RESOURCES,
+    RegisterResource, GetResource, CloseResources,
+    resource, pass_resource
+)
\ No newline at end of file
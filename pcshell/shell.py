@@ -1,8 +1,8 @@
-from typing import Callable
+from typing import Callable, List
 
 import sys
 import os
-from copy import deepcopy
+from copy import copy
 from io import StringIO
 
 import click
@@ -13,10 +13,18 @@ from colorama import Style
 from . import globals as globs
 from . import _colors as colors
 from .chars import IGNORE_LINE
-from .pretty import PrettyGroup, PrettyCommand
+from .pretty import PrettyGroup, PrettyCommand, PrettyOption, argument, option
 from .multicommand import CUSTOM_COMMAND_PROPS, CustomCommandPropsParser
 from .utils import HasKey
+from ._cmd import GetTrailingLine
 from ._cmd_factories import ClickCmdShell
+from ._script import ScriptReader
+from ._output import ENCODERS, GetEncoder
+from ._resources import resource
+from ._jobs import JOBS, ExpandLines, RunParallel, GetJob, ReportJob, ForegroundJob, NoTimeouts
+from ._timing import Measure, ReportMeasurement
+from ._profile import RunProfiled, SaveProfile, ReportProfile
+from ._daemon import ServeDaemon
 
 
 
@@ -38,6 +46,12 @@ class Shell(PrettyGroup):
     - :param:`fuzzy_completion`: If True, use fuzzy completion for prompt_toolkit suggestions
     - :param:`mouse_support`: If True, enables mouse support for prompt_toolkit
     - :param:`lexer`: If True, enables the prompt_toolkit lexer
+    - :param:`stream_piped_input`: If True, a non-interactive stdin is executed line by line without any prompt or history
+
+    An attached shell also accepts a `--script <file>` option, which executes each line of the file
+    in the shell without starting an interactive prompt. The master shell also accepts a `--format <name>` option,
+    which selects how the results of commands are written outside of the shell, and a `--daemon <socket>` option,
+    which keeps the application loaded and runs the commands sent by `pcshell/_client.py` (Unix only)
     """
 
     def __init__(self, 
@@ -53,6 +67,7 @@ class Shell(PrettyGroup):
         fuzzy_completion=True, 
         mouse_support=False,
         lexer=True,
+        stream_piped_input=True,
     **attrs):
         # Allows this class to be used as a subclass without a new shell instance attached
         self.isShell = isShell
@@ -79,13 +94,23 @@ class Shell(PrettyGroup):
             self.shell = ClickCmdShell(hist_file=hist_file, on_finished=on_shell_closed, 
                 add_command_callback=add_command_callback, before_start=on_shell_start, readline=readline,
                 complete_while_typing=complete_while_typing, fuzzy_completion=fuzzy_completion, mouse_support=mouse_support,
-                lexer=lexer
+                lexer=lexer, stream_piped_input=stream_piped_input
             )
 
             if prompt:
                 self.shell.prompt = prompt
             self.shell.intro = intro
 
+            # Options of the command line starting the shell, which are not listed by the shell's own help
+            self.params.append(PrettyOption([globs.SHELL_SCRIPT_OPTION], type=click.Path(exists=True, dir_okay=False), 
+                expose_value=False, callback=Shell.__store_script, hidden=globs.__IsShell__, help='Execute the lines of a script file instead of starting the shell'))
+
+            if globs.__MASTER_SHELL__ == self.name:
+                self.params.append(PrettyOption([globs.SHELL_FORMAT_OPTION], type=str, expose_value=False, callback=Shell.__store_format, hidden=globs.__IsShell__,
+                    help='Output format of command results ({}). Defaults to ${} or "{}"'.format(', '.join(ENCODERS), globs.OUTPUT_FORMAT_ENVVAR, globs.OUTPUT_FORMAT)))
+                self.params.append(PrettyOption([globs.SHELL_DAEMON_OPTION], type=click.Path(dir_okay=False), expose_value=False, hidden=globs.__IsShell__,
+                    callback=Shell.__store_daemon, help='Serve commands to clients connecting to this Unix socket, instead of starting the shell'))
+
         else:
             super(Shell, self).__init__(**attrs)
 
@@ -96,21 +121,52 @@ class Shell(PrettyGroup):
 
         _check_multicommand(self, name, cmd, register=True)
 
-        if type(name) is str:
-            self.commands[name] = cmd
-        else:
-            for _name_ in name:
-                self.commands[_name_] = cmd
+        names = [name] if type(name) is str else name
+        for _name_ in names:
+            self.commands[_name_] = cmd
+            if self.isShell: self.shell.add_command(cmd, _name_)
+
+
+    @staticmethod
+    def __store_script(ctx: click.Context, param, value):
+        if value and not ctx.resilient_parsing:
+            ctx.meta['pcshell.script'] = value
+        return value
 
-        if self.isShell: self.shell.add_command(cmd, name)
+
+    @staticmethod
+    def __store_format(ctx: click.Context, param, value):
+        if value and not ctx.resilient_parsing:
+            GetEncoder(value)
+            ctx.meta['pcshell.format'] = value
+        return value
+
+
+    @staticmethod
+    def __store_daemon(ctx: click.Context, param, value):
+        if value and not ctx.resilient_parsing:
+            ctx.meta['pcshell.daemon'] = value
+        return value
 
 
     def invoke(self, ctx: click.Context):
         if self.isShell:
             ret = super(Shell, self).invoke(ctx)
             if not ctx.protected_args and not ctx.invoked_subcommand:
+                daemon = ctx.meta.pop('pcshell.daemon', None)
+                if daemon:
+                    ServeDaemon(self, daemon, ctx.info_name)
+                    ctx.exit(0)
+
                 ctx.info_name = None
                 self.shell.ctx = ctx
+
+                script = ctx.meta.pop('pcshell.script', None)
+                if script:
+                    with ScriptReader(script) as reader:
+                        self.shell.cmdloop()
+                    ctx.exit(1 if reader.failed else 0)
+
                 return self.shell.cmdloop()
             return ret
         else:
@@ -130,6 +186,39 @@ class Shell(PrettyGroup):
         return decorator
 
 
+    def resource(self, name=None, teardown=None):
+        """A shortcut decorator that registers the decorated function as the factory for a session resource,
+        shared by the commands of every shell. See :class:`pcshell.resources.ResourceRegistry`
+        """
+        return resource(name, teardown)
+
+
+def CurrentShell() -> Shell:
+    """The shell that the command being executed was invoked from"""
+    ctx = click.get_current_context()
+    while ctx is not None:
+        if isinstance(ctx.command, Shell) and ctx.command.isShell: return ctx.command
+        ctx = ctx.parent
+    raise click.UsageError('This command can only be run from a shell')
+
+
+def MakeAlias(cmd: click.Command, alias: str) -> click.Command:
+    """A hidden command named `alias` that shares the definition (params, callback, settings) of `cmd`.
+
+    Only the attributes of the command object itself are copied, so each alias costs a single small object
+    """
+    proxy = copy(cmd)
+    proxy.name = alias
+    proxy.alias = True
+    proxy.alias_of = cmd
+    proxy.aliases = []
+    proxy.help = "(Alias for '{c}') {h}".format(c=cmd.name, h=cmd.help)
+    proxy.short_help = "Alias for '{}'".format(cmd.name)
+    proxy.true_hidden = cmd.hidden
+    proxy.hidden = True
+    return proxy
+
+
 class MultiCommandShell(Shell):
     """ A :class:`Click Group` implementation with an (optionally) attached shell, that also:
 
@@ -153,6 +242,7 @@ class MultiCommandShell(Shell):
     - :param:`fuzzy_completion`: If True, use fuzzy completion for prompt_toolkit suggestions
     - :param:`mouse_support`: If True, enables mouse support for prompt_toolkit
     - :param:`lexer`: If True, enables the prompt_toolkit lexer
+    - :param:`stream_piped_input`: If True, a non-interactive stdin is executed line by line without any prompt or history
     """
 
     def __init__(self, isShell=None, **attrs):
@@ -221,87 +311,89 @@ class MultiCommandShell(Shell):
         Also allows for use of custom kwargs defined in multicommand.py.
         """
         def decorator(f):
-            old_kwargs = kwargs.copy()
-            self.__strip_invalidKeys(kwargs)
-
-            from .pretty import prettyCommand
-
-            tmpCommand = None
-            origHelpTxt = None
-            aliases = []
-
-            try:
-                if isinstance(args[0], list):
-                    _args = [args[0][0]] + list(args[1:])
-                    for alias in args[0][1:]:
-                        if tmpCommand is None:
-                            cmd: PrettyCommand = prettyCommand(alias, None, **kwargs)(f)
-                            origHelpTxt = cmd.help
-                            cmd.alias = True
-                            cmd.aliases = []
-                            cmd.help = "(Alias for '{c}') {h}".format(c = _args[0], h = cmd.help)
-                            cmd.short_help = "Alias for '{}'".format(_args[0])
-                            cmd.true_hidden = cmd.hidden
-                            cmd.hidden = True
-                            self.__assign_invalidKeys(old_kwargs, cmd)
-                            super(MultiCommandShell, self).add_command(cmd)
-                            tmpCommand = cmd
-
-                        else:
-                            cmd = deepcopy(tmpCommand)
-                            cmd.alias = True
-                            cmd.aliases = []
-                            cmd.name = alias
-                            cmd.help = "(Alias for '{c}') {h}".format(c = _args[0], h = origHelpTxt)
-                            cmd.short_help = "Alias for '{}'".format(_args[0])
-                            cmd.hidden = True
-                            self.__assign_invalidKeys(old_kwargs, cmd)
-                            super(MultiCommandShell, self).add_command(cmd)
-
-                        aliases.append(alias)
-                else:
-                    _args = args
-
-
-                if tmpCommand is None:
-                    cmd: PrettyCommand = prettyCommand(*_args, **kwargs)(f)
-                    cmd.alias = False
-                    cmd.aliases = aliases
-                    self.__assign_invalidKeys(old_kwargs, cmd)
-                    super(MultiCommandShell, self).add_command(cmd)
-                    return cmd
-
-                else:
-                    cmd = deepcopy(tmpCommand)
-                    cmd.alias = False
-                    cmd.aliases = aliases
-                    cmd.name = _args[0]
-                    cmd.help = origHelpTxt
-                    cmd.short_help = ''
-                    cmd.hidden = cmd.true_hidden
-                    self.__assign_invalidKeys(old_kwargs, cmd)
-                    super(MultiCommandShell, self).add_command(cmd)
-                    return cmd
-
-            except:
-                cmd: PrettyCommand = prettyCommand(*args, **kwargs)(f)
-                cmd.alias = False
-                cmd.aliases = aliases
-                self.__assign_invalidKeys(old_kwargs, cmd)
+            commands = MultiCommandShell.build_command(f, *args, **kwargs)
+            for cmd in commands:
                 super(MultiCommandShell, self).add_command(cmd)
-                return cmd
+            return commands[-1]
 
         return decorator
 
 
+    @staticmethod
+    def build_command(f, *args, **kwargs) -> List[click.Command]:
+        """Creates the command defined by `f` (see :meth:`command`) without registering it.
+        Returns an alias proxy for each name after the first, followed by the command itself
+        """
+        old_kwargs = kwargs.copy()
+        kwargs = kwargs.copy()
+        MultiCommandShell.__strip_invalidKeys(kwargs)
+
+        from .pretty import prettyCommand
+
+        # A list of names defines the command by its first name, and aliases it by the others
+        aliases = []
+        if args and isinstance(args[0], list):
+            aliases = list(args[0][1:])
+            args = (args[0][0],) + args[1:]
+
+        cmd: PrettyCommand = prettyCommand(*args, **kwargs)(f)
+        cmd.alias = False
+        cmd.aliases = aliases
+        MultiCommandShell.__assign_invalidKeys(old_kwargs, cmd)
+
+        return [MakeAlias(cmd, alias) for alias in aliases] + [cmd]
+
+
 class BaseShellCommands:
+    """The builtin commands of shells.
+
+    Each set is created once per process, and attached to every shell (including nested ones) by reference.
+    The commands act on the shell they are invoked from (see :func:`CurrentShell`)
+    """
+
+    # Builtin commands by set, created when first attached
+    __BUILT__ = {}
+
+    @staticmethod
+    def attach(shell: MultiCommandShell, name: str, build: Callable) -> None:
+        commands = BaseShellCommands.__BUILT__.get(name)
+        if commands is None:
+            commands = []
+
+            def builtin(*args, **kwargs):
+                def decorator(f):
+                    built = MultiCommandShell.build_command(f, *args, **kwargs)
+                    commands.extend(built)
+                    return built[-1]
+                return decorator
+
+            build(builtin)
+            BaseShellCommands.__BUILT__[name] = commands
+
+        for cmd in commands:
+            Shell.add_command(shell, cmd)
+
 
     @staticmethod
     def addMasters(shell: MultiCommandShell):
+        BaseShellCommands.attach(shell, 'masters', BaseShellCommands.__buildMasters)
+
+    @staticmethod
+    def addBasics(shell: MultiCommandShell):
+        BaseShellCommands.attach(shell, 'basics', BaseShellCommands.__buildBasics)
+
+    @staticmethod
+    def addAll(shell: MultiCommandShell):
+        BaseShellCommands.attach(shell, 'all', BaseShellCommands.__buildAll)
 
-        @shell.command(globs.MASTERSHELL_COMMAND_ALIAS_RESTART, hidden=True)
+
+    @staticmethod
+    def __buildMasters(builtin: Callable):
+
+        @builtin(globs.MASTERSHELL_COMMAND_ALIAS_RESTART, hidden=True, timeout=0)
         def __restart_shell__():
             """Restarts the application"""
+            shell = CurrentShell()
             # Spawns a new shell within the current session by launching the python app again
             os.system('python "%s"' % sys.argv[0].replace('\\', '/'))
 
@@ -317,16 +409,18 @@ class BaseShellCommands:
 
 
     @staticmethod
-    def addBasics(shell: MultiCommandShell):
+    def __buildBasics(builtin: Callable):
 
-        @shell.command(globs.BASIC_COMMAND_ALIAS_HELP, hidden=True)
+        @builtin(globs.BASIC_COMMAND_ALIAS_HELP, hidden=True)
         def __get_help__():
+            shell = CurrentShell()
             with click.Context(shell) as ctx:
                 click.echo(shell.get_help(ctx))
 
-        @shell.command(globs.BASIC_COMMAND_ALIAS_CLEARHISTORY, hidden=True)
+        @builtin(globs.BASIC_COMMAND_ALIAS_CLEARHISTORY, hidden=True)
         def __clear_history__():
             """Clears the CLI history for this terminal for the current user"""
+            shell = CurrentShell()
             result = shell.shell.clear_history()
             print()
             click.echo('\t{}{} {}{}{}'.format(
@@ -338,28 +432,114 @@ class BaseShellCommands:
 
 
     @staticmethod
-    def addAll(shell: MultiCommandShell):
+    def __buildAll(builtin: Callable):
 
-        @shell.command(globs.SHELL_COMMAND_ALIAS_CLEAR, hidden=True)
+        @builtin(globs.SHELL_COMMAND_ALIAS_CLEAR, hidden=True)
         def cls():
             """Clears the Terminal"""
             click.clear()
 
-        @shell.command(globs.SHELL_COMMAND_ALIAS_QUIT, hidden=True, exit=True)
+        @builtin(globs.SHELL_COMMAND_ALIAS_QUIT, hidden=True, exit=True)
         def _exit_():
             """Exits the Shell"""
             pass
 
-        @shell.command(globs.SHELL_COMMAND_ALIAS_EXIT, exit=True)
+        @builtin(globs.SHELL_COMMAND_ALIAS_EXIT, exit=True)
         def __exit__():
             """Exits the Shell"""
             pass
 
-        @shell.command(globs.SHELL_COMMAND_ALIAS_REPEAT, hidden=True)
+        @builtin(globs.SHELL_COMMAND_ALIAS_REPEAT, hidden=True, timeout=0)
         def __repeat_command__():
             """Repeats the last valid command with all previous parameters"""
+            shell = CurrentShell()
             if globs.__LAST_COMMAND__:
+                if globs.__SCRIPT__ is not None:
+                    # Scripts do not have a prompt to pipe the command into
+                    shell.shell.cmdqueue.append(globs.__LAST_COMMAND__)
+                    return
+
                 globs.__IS_REPEAT__ = True
                 if shell.shell.readline:
                     globs.__PREV_STDIN__ = sys.stdin
-                    sys.stdin = StringIO(globs.__LAST_COMMAND__)
\ No newline at end of file
+                    sys.stdin = StringIO(globs.__LAST_COMMAND__)
+
+        @builtin(globs.SHELL_COMMAND_ALIAS_SOURCE, hidden=True, timeout=0)
+        @argument('file', type=click.Path(exists=True, dir_okay=False), help='The script file to execute')
+        def __source_script__(file):
+            """Executes each line of a script file in the current shell"""
+            shell = CurrentShell()
+            if not shell.shell.run_script(file):
+                raise click.ClickException('Script "{}" did not complete successfully'.format(file))
+
+        @builtin(globs.SHELL_COMMAND_ALIAS_PARALLEL, hidden=True, timeout=0)
+        @option('--jobs', '-j', type=int, default=None, help='Maximum number of commands to run at once')
+        @option('--unordered', is_flag=True, help='Display the output of each command as soon as it completes')
+        @argument('lines', nargs=-1, required=True, help='Command lines to run. If the first contains "{}", it is run once per remaining value')
+        def __parallel__(jobs, unordered, lines):
+            """Runs several commands concurrently, displaying the output of each once it has finished"""
+            shell = CurrentShell()
+            results = RunParallel(shell.shell, ExpandLines(lines), workers=jobs, ordered=not unordered)
+            failed = len([job for job in results if job.error is not None])
+            if failed:
+                raise click.ClickException('{} of {} commands failed'.format(failed, len(results)))
+
+        @builtin(globs.SHELL_COMMAND_ALIAS_JOBS, hidden=True)
+        def __jobs__():
+            """Lists the background commands and their status"""
+            if not JOBS:
+                click.echo('\t{}No background commands{}'.format(colors.JOB_STATUS_OTHER, Style.RESET_ALL))
+            for job in list(JOBS.values()):
+                job.emit(output=False)
+
+        @builtin(globs.SHELL_COMMAND_ALIAS_WAIT, hidden=True, timeout=0)
+        @argument('ids', type=int, nargs=-1, help='The jobs to wait for. Waits for every background command if omitted')
+        def __wait__(ids):
+            """Waits for background commands to finish, and displays their output"""
+            for job in [GetJob(id) for id in ids] if ids else list(JOBS.values()):
+                job.wait()
+                ReportJob(job)
+
+        @builtin(globs.SHELL_COMMAND_ALIAS_FOREGROUND, hidden=True, timeout=0)
+        @argument('id', type=int, required=False, help='The job to bring to the foreground. Defaults to the most recent')
+        def __foreground__(id):
+            """Displays a background command's output as it runs, until it finishes"""
+            if id is None:
+                if not JOBS: raise click.ClickException('There are no background commands')
+                id = next(reversed(JOBS))
+            ForegroundJob(GetJob(id))
+
+        @builtin(globs.SHELL_COMMAND_ALIAS_KILL, hidden=True)
+        @argument('ids', type=int, nargs=-1, required=True, help='The jobs to cancel')
+        def __kill__(ids):
+            """Asks background commands to stop. Long-running commands must check `pcshell.jobs.CheckCancelled()`"""
+            for job in [GetJob(id) for id in ids]:
+                job.cancel()
+                job.emit(output=False)
+
+        @builtin(globs.SHELL_COMMAND_ALIAS_TIME, hidden=True, timeout=0, context_settings=dict(ignore_unknown_options=True, allow_interspersed_args=False))
+        @argument('line', nargs=-1, required=True, type=click.UNPROCESSED, help='The command line to measure')
+        def __time__(line):
+            """Runs a command line, then reports its wall time, CPU time, peak memory allocated and the time spent parsing, invoking & writing output"""
+            shell = CurrentShell()
+            line = GetTrailingLine(click.get_current_context(), line)
+            # The command runs on this thread, so that its phases & memory can be measured
+            with Measure() as measurement, NoTimeouts():
+                shell.shell.onecmd(line)
+            ReportMeasurement(line, measurement)
+
+        @builtin(globs.SHELL_COMMAND_ALIAS_PROFILE, hidden=True, timeout=0, context_settings=dict(ignore_unknown_options=True, allow_interspersed_args=False))
+        @option('--top', '-n', type=int, default=globs.PROFILE_TOP, help='Number of functions to list')
+        @option('--sort', type=click.Choice(['cumulative', 'tottime', 'calls', 'ncalls', 'name']), default='cumulative', help='Order of the listed functions (cProfile only)')
+        @option('--sample', is_flag=True, help='Use the sampling profiler, saving collapsed stacks for flamegraph tools, instead of cProfile')
+        @option('--memory', is_flag=True, help='Also list the lines that allocated the most memory (tracemalloc)')
+        @option('--save/--no-save', default=True, help='Save the profile next to the history file')
+        @argument('line', nargs=-1, required=True, type=click.UNPROCESSED, help='The command line to profile')
+        def __profile__(top, sort, sample, memory, save, line):
+            """Runs a command line under a profiler, then lists the functions it spent the most time in"""
+            shell = CurrentShell()
+            line = GetTrailingLine(click.get_current_context(), line)
+            with NoTimeouts():
+                result = RunProfiled(lambda: shell.shell.onecmd(line), mode='sample' if sample else 'cprofile', memory=memory)
+            path = SaveProfile(result, os.path.dirname(shell.shell.hist_file)) if save else None
+            ReportProfile(line, result, top, sort, path)
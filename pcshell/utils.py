@@ -5,4 +5,8 @@ Common utilities used by pretty-click-shell
 from ._utils import (
     HasKey, ExtractPasswordAndSetEnv,
     replacenth, suggest
+)
+
+from ._async import (
+    GetSessionLoop, RunCoroutine
 )
\ No newline at end of file
@@ -0,0 +1,71 @@
+"""
+Fixtures shared by the tests: shell applications built in shell mode (so they have their built-in commands),
+with their history & home directory in a temporary directory
+"""
+
+import pytest
+
+import pcshell
+from pcshell import globals as globs
+from pcshell import _jobs, _completion
+
+
+@pytest.fixture
+def shell_mode(monkeypatch, tmp_path):
+    """Applications created during the test are shells, and the first one is the master shell"""
+    monkeypatch.setattr(globs, '__IsShell__', True)
+    monkeypatch.setattr(globs, '__MASTER_SHELL__', None)
+    monkeypatch.setattr(globs, '__SHELL_PATH__', [])
+    monkeypatch.setattr(_completion, 'COMPLETION_TREE', {})
+    monkeypatch.setenv('HOME', str(tmp_path))
+    monkeypatch.setenv('USERPROFILE', str(tmp_path))
+    yield
+
+    # Background commands never outlive the test that started them
+    _jobs.CancelJobs()
+    for job in list(_jobs.JOBS.values()): job.wait()
+    _jobs.JOBS.clear()
+    _jobs.__FINISHED__.clear()
+
+
+@pytest.fixture
+def app(shell_mode, tmp_path):
+    """A new shell application without commands. Add commands to it, then call `start()`"""
+    @pcshell.shell(prompt='test', intro='', hist_file=str(tmp_path / 'history'))
+    def app():
+        """Test shell"""
+
+    return app
+
+
+@pytest.fixture
+def start(app):
+    """Returns a function preparing the shell of `app` to execute lines (with `onecmd`) as starting it does,
+    without displaying any prompt. It returns the shell
+    """
+    def start_() -> pcshell.ClickCmdShell:
+        from pcshell._completion import BuildCompletionTree
+
+        ctx = app.make_context(app.name, [])
+        ctx.info_name = None
+        app.shell.ctx = ctx
+        # Typed tuple literals are parsed with the completion tree
+        BuildCompletionTree(ctx)
+        return app.shell
+
+    return start_
+
+
+@pytest.fixture
+def replay(app):
+    """Returns a function replaying a keystroke script (see :func:`pcshell.replay.ParseKeystrokes`) into the shell of
+    `app`, which exits once the keystrokes run out. It returns the replay, whose `report()` lists the commands executed
+    """
+    from pcshell.replay import KeystrokeReplay
+
+    def replay_(script: str, **kwargs) -> KeystrokeReplay:
+        with KeystrokeReplay(script, **kwargs) as replay:
+            replay.run(app)
+        return replay
+
+    return replay_
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+
+import click
+import pytest
+
+import pcshell
+from pcshell import _async
+from pcshell._async import GetSessionLoop, RunCoroutine
+
+
+@pytest.fixture(autouse=True)
+def session_loop():
+    """Every test starts without a session loop, and closes the one it started"""
+    _async.CloseSessionLoop()
+    yield
+    _async.CloseSessionLoop()
+
+
+@pytest.fixture
+def shell(app, start):
+    @app.command()
+    @pcshell.argument('word', type=str)
+    async def wait(word):
+        """Answers after a while"""
+        await asyncio.sleep(0.01)
+        click.echo('waited for {}'.format(word))
+        return (word, asyncio.get_running_loop())
+
+    @app.command()
+    @pcshell.argument('count', type=int)
+    async def count(count):
+        """Counts asynchronously"""
+        for i in range(count):
+            await asyncio.sleep(0)
+            yield i
+
+    @app.command(pipe='values')
+    @pcshell.option('--values', hidden=True)
+    def total(values):
+        """Adds up the values piped in"""
+        return sum(values)
+
+    return start()
+
+
+def test_async_commands_run_on_the_session_loop(shell, capsys):
+    shell.onecmd('wait first')
+    word, loop = shell.last_result
+    assert word == 'first'
+    assert 'waited for first' in capsys.readouterr().out
+
+    assert loop is GetSessionLoop() is shell.loop
+    assert loop.is_running()
+
+    # The loop lives for the session, rather than for one command
+    shell.onecmd('wait second')
+    assert shell.last_result == ('second', loop)
+
+
+def test_async_generators_are_iterated_into_pipes(shell):
+    shell.onecmd('count 4 | total')
+    assert shell.last_error is None
+    assert shell.last_result == 6
+
+
+def test_coroutines_run_from_any_thread():
+    async def double(n):
+        await asyncio.sleep(0)
+        return n * 2
+
+    results = []
+    worker = threading.Thread(target=lambda: results.append(RunCoroutine(double(21))))
+    worker.start()
+    worker.join(10)
+    assert results == [42]
+
+
+def test_coroutines_cannot_block_the_session_loop():
+    async def nested():
+        inner = asyncio.sleep(0)
+        try: RunCoroutine(inner)
+        finally: inner.close()
+
+    with pytest.raises(RuntimeError, match='within the session event loop'):
+        RunCoroutine(nested())
+
+
+def test_the_session_loop_closes_with_the_session(shell):
+    shell.onecmd('wait first')
+    _, loop = shell.last_result
+
+    shell.close_session()
+    assert loop.is_closed()
+    assert _async.__LOOP__ is None and _async.__LOOP_THREAD__ is None
+
+    # A new loop is started if a command runs after all
+    shell.onecmd('wait again')
+    assert shell.last_result[1] is not loop
@@ -0,0 +1,199 @@
+import time
+
+import click
+import pytest
+
+import pcshell
+from pcshell._cache import LRUCache, ResultCache, PARSE_CACHE, ClearParseCache, IsParseCacheable
+
+
+class Counted(click.ParamType):
+    """Upper-cases its value, counting the conversions"""
+    name = 'counted'
+
+    def __init__(self):
+        self.calls = 0
+
+    def convert(self, value, param, ctx):
+        self.calls += 1
+        return value.upper()
+
+
+class Uncopyable(object):
+    def __deepcopy__(self, memo):
+        raise TypeError('cannot be copied')
+
+
+class UncopyableType(click.ParamType):
+    name = 'uncopyable'
+
+    def __init__(self):
+        self.calls = 0
+
+    def convert(self, value, param, ctx):
+        self.calls += 1
+        return Uncopyable()
+
+
+@pytest.fixture(autouse=True)
+def empty_parse_cache():
+    ClearParseCache()
+    yield
+    ClearParseCache()
+
+
+#------------------------------------------------------------------------------
+#  ANCHOR Parse Cache
+
+def test_identical_arguments_are_parsed_once(app, start):
+    counted = Counted()
+
+    @app.command(parse_cache=True)
+    @pcshell.argument('word', type=counted)
+    def greet(word):
+        return word
+
+    shell = start()
+    for _ in range(3):
+        shell.onecmd('greet hello')
+        assert shell.last_error is None
+        assert shell.last_result == 'HELLO'
+
+    assert counted.calls == 1
+
+    shell.onecmd('greet there')
+    assert shell.last_result == 'THERE'
+    assert counted.calls == 2
+
+
+def test_commands_parse_every_time_unless_opted_in(app, start):
+    counted = Counted()
+
+    @app.command()
+    @pcshell.argument('word', type=counted)
+    def greet(word):
+        return word
+
+    shell = start()
+    shell.onecmd('greet hello')
+    shell.onecmd('greet hello')
+    assert counted.calls == 2
+    assert not len(PARSE_CACHE)
+
+
+def test_file_parameters_are_never_cached(app, start, tmp_path, capsys):
+    path = tmp_path / 'source.txt'
+
+    @app.command(parse_cache=True)
+    @pcshell.option('--src', type=click.File('r'))
+    def read(src):
+        click.echo(src.read().strip())
+
+    assert not IsParseCacheable(app.commands['read'])
+
+    shell = start()
+    path.write_text('first')
+    shell.onecmd('read --src {}'.format(path))
+    path.write_text('second')
+    shell.onecmd('read --src {}'.format(path))
+
+    assert shell.last_error is None
+    assert capsys.readouterr().out.split() == ['first', 'second']
+
+
+def test_values_that_cannot_be_copied_are_parsed_again(app, start):
+    uncopyable = UncopyableType()
+
+    @app.command(parse_cache=True)
+    @pcshell.argument('handle', type=uncopyable)
+    def use(handle):
+        return handle
+
+    shell = start()
+    for _ in range(2):
+        shell.onecmd('use something')
+        assert shell.last_error is None
+        assert isinstance(shell.last_result, Uncopyable)
+
+    assert uncopyable.calls == 2
+    assert not len(PARSE_CACHE)
+
+
+#------------------------------------------------------------------------------
+#  ANCHOR Result Cache
+
+def test_memoized_results_and_output_are_replayed(app, start, capsys):
+    calls = []
+
+    @app.command()
+    @pcshell.argument('n', type=int)
+    @pcshell.memoize
+    def square(n):
+        calls.append(n)
+        click.echo('computing {}'.format(n))
+        return n * n
+
+    shell = start()
+    shell.onecmd('square 4')
+    shell.onecmd('square 4')
+    assert shell.last_result == 16
+    assert calls == [4]
+    assert capsys.readouterr().out.split('\n').count('computing 4') == 2
+
+    shell.onecmd('square 4 --no-cache')
+    assert calls == [4, 4]
+
+
+def test_result_cache_expires_entries():
+    cache = ResultCache(ttl=0.05)
+    key = cache.key({ 'n': 1 })
+    cache.put(key, 'value')
+    assert cache.get(key).value == 'value'
+
+    time.sleep(0.1)
+    assert cache.get(key) is None
+
+
+def test_result_cache_persists_between_sessions(tmp_path):
+    path = str(tmp_path / 'cache' / 'results.cache')
+    cache = ResultCache(path=path)
+    key = cache.key({ 'n': 2, 'names': {'b', 'a'} })
+    cache.put(key, [1, 2], 'output')
+
+    entry = ResultCache(path=path).get(key)
+    assert (entry.value, entry.output) == ([1, 2], 'output')
+
+
+def test_lru_cache_drops_least_recently_used():
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert 'a' in cache and 'c' in cache and 'b' not in cache
+
+
+def test_memoized_generators_are_cached_as_their_items(app, start, capsys):
+    calls = []
+
+    @app.command()
+    @pcshell.argument('n', type=int)
+    @pcshell.memoize
+    def rows(n):
+        calls.append(n)
+        for i in range(n):
+            click.echo('row {}'.format(i))
+            yield i
+
+    @app.command(pipe='values')
+    @pcshell.option('--values', hidden=True)
+    def count(values):
+        return len(list(values))
+
+    shell = start()
+    for _ in range(2):
+        shell.onecmd('rows 3 | count')
+        assert shell.last_result == 3
+
+    assert calls == [3]
+    assert capsys.readouterr().out.split('\n').count('row 2') == 2
@@ -0,0 +1,132 @@
+import pytest
+
+import pcshell
+from pcshell._metrics import METRICS
+
+
+@pytest.fixture
+def metrics():
+    METRICS.clear()
+    yield METRICS
+    METRICS.clear()
+
+
+def test_aliases_share_the_definition_of_their_command(app, start):
+    @app.command(['show', 'sh', 'display'])
+    @pcshell.argument('word', type=str)
+    def show(word):
+        return word
+
+    command, alias = app.commands['show'], app.commands['sh']
+    assert alias.alias_of is command
+    assert alias.params is command.params
+    assert alias.hidden and not command.hidden
+
+    shell = start()
+    shell.onecmd('display hello')
+    assert shell.last_result == 'hello'
+
+
+def test_metrics_of_aliases_are_recorded_under_their_command(app, start, metrics):
+    @app.command(['show', 'sh'])
+    def show():
+        pass
+
+    @app.command()
+    def boom():
+        raise RuntimeError('boom')
+
+    shell = start()
+    shell.onecmd('show')
+    shell.onecmd('sh')
+    shell.onecmd('boom')
+
+    commands = metrics.to_dict()['commands']
+    assert list(commands) == ['show', 'boom']
+    assert commands['show']['invocations'] == 2
+    assert commands['boom']['errors'] == { 'RuntimeError': 1 }
+
+
+def test_commands_can_be_declared_without_a_name(app):
+    @app.command()
+    def unnamed():
+        pass
+
+    @app.command(name='named')
+    def other():
+        pass
+
+    assert {'unnamed', 'named'} <= set(app.commands)
+
+
+def test_errors_declaring_a_command_are_raised_as_is(app):
+    with pytest.raises(TypeError, match='unexpected_setting'):
+        @app.command(['first', 'second'], unexpected_setting=True)
+        def first():
+            pass
+
+
+@pytest.mark.parametrize('option', ['--script', '--format', '--daemon'])
+def test_options_starting_the_shell_are_not_listed_in_the_shell(app, start, capsys, option):
+    @app.new_shell(prompt='sub')
+    def sub():
+        """A subshell"""
+
+    shell = start()
+    for line in ('help', '--help', 'sub --help'):
+        shell.onecmd(line)
+        out = capsys.readouterr().out
+        assert 'Options:' in out and option not in out
+
+
+def test_command_names_are_listed_once(app, start):
+    shell = start()
+    names = shell.get_names()
+    assert 'do_help' in names and 'help_help' in names
+    assert len(names) == len(set(names))
+
+
+@pytest.fixture
+def nested(app):
+    @app.command()
+    def top():
+        """Runs in the application"""
+        return 'top'
+
+    @app.new_shell(prompt='sub')
+    def sub():
+        """A subshell"""
+
+    @sub.command()
+    def inner():
+        """Runs in the subshell"""
+        return 'inner'
+
+    return sub
+
+
+def test_builtin_commands_are_shared_by_every_shell(app, nested):
+    for name in ('help', 'h', 'exit', 'quit', 'repeat', 'jobs'):
+        assert nested.commands[name] is app.commands[name]
+
+
+def test_help_lists_the_commands_of_the_shell_it_is_invoked_from(app, start, nested, capsys):
+    shell = start()
+    shell.onecmd('help')
+    out = capsys.readouterr().out
+    assert 'top' in out and 'sub' in out and 'inner' not in out
+
+    nested.shell.ctx = nested.make_context('sub', [], parent=shell.ctx)
+    nested.shell.onecmd('help')
+    out = capsys.readouterr().out
+    assert 'inner' in out and 'top' not in out
+
+
+def test_exit_leaves_the_shell_it_is_invoked_from(app, nested, replay):
+    result = replay('sub\ninner\nexit\ntop\n')
+    assert result.complete
+
+    # Commands are reported once they end: the subshell ends with its exit, and the application goes on
+    commands = result.report()['commands']
+    assert [command['line'] for command in commands] == ['inner', 'exit', 'sub', 'top']
+    assert commands[-1]['ok'] and commands[-1]['result'] == "'top'"
@@ -0,0 +1,137 @@
+import os
+import subprocess
+import sys
+import textwrap
+import time
+
+import pytest
+
+from pcshell.daemon import IsDaemonSupported
+
+
+pytestmark = pytest.mark.skipif(not IsDaemonSupported(), reason='The daemon requires Unix domain sockets & fork()')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLIENT = os.path.join(ROOT, 'pcshell', '_client.py')
+
+APP = '''
+import os
+import sys
+
+import click
+import pcshell
+
+
+@pcshell.shell(prompt='daemon', intro='')
+def cli():
+    """Served by the daemon"""
+
+
+@cli.command()
+@pcshell.argument('word', type=str)
+def echo(word):
+    click.echo(word)
+
+
+@cli.command()
+def upper():
+    click.echo(sys.stdin.read().upper(), nl=False)
+
+
+@cli.command()
+def where():
+    click.echo(os.getcwd())
+    click.echo(os.environ.get('PCSHELL_TEST_VALUE'))
+
+
+@cli.command()
+def boom():
+    raise RuntimeError('boom')
+
+
+@cli.command()
+def bye():
+    sys.exit(7)
+'''
+
+
+@pytest.fixture(scope='module')
+def daemon(tmp_path_factory):
+    path = tmp_path_factory.mktemp('daemon')
+    (path / 'daemonapp.py').write_text(textwrap.dedent(APP))
+    sock = str(path / 'sock')
+
+    env = dict(os.environ, HOME=str(path), USERPROFILE=str(path), PYTHONPATH=os.pathsep.join([ROOT, str(path)]))
+    server = subprocess.Popen([sys.executable, '-c', 'import daemonapp; daemonapp.cli()', '--daemon', sock],
+        env=env, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    deadline = time.time() + 30
+    while not os.path.exists(sock):
+        if server.poll() is not None or time.time() > deadline:
+            server.kill()
+            pytest.fail('The daemon did not start:\n' + server.stderr.read().decode())
+        time.sleep(0.05)
+
+    yield sock, env
+
+    server.terminate()
+    server.wait(10)
+    server.stderr.close()
+
+
+def Run(daemon, *args, **kwargs) -> subprocess.CompletedProcess:
+    """Runs the thin client, as a user would"""
+    sock, _ = daemon
+    return subprocess.run([sys.executable, '-I', '-S', CLIENT, sock] + list(args),
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, timeout=30, **kwargs)
+
+
+def RunDirectly(daemon, *args) -> subprocess.CompletedProcess:
+    """Runs the application itself, without the daemon"""
+    _, env = daemon
+    return subprocess.run([sys.executable, '-c', 'import daemonapp; daemonapp.cli()'] + list(args),
+        env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, timeout=30)
+
+
+def test_output_is_written_to_the_streams_of_the_client(daemon):
+    result = Run(daemon, 'echo', 'hello')
+    assert (result.returncode, result.stdout, result.stderr) == (0, 'hello\n', '')
+
+
+def test_commands_read_the_stdin_of_the_client(daemon):
+    result = Run(daemon, 'upper', input='first line\nsecond line\n')
+    assert result.returncode == 0
+    assert result.stdout == 'FIRST LINE\nSECOND LINE\n'
+
+
+def test_commands_run_in_the_directory_and_environment_of_the_client(daemon, tmp_path):
+    env = dict(os.environ, PCSHELL_TEST_VALUE='from the client')
+    result = Run(daemon, 'where', cwd=str(tmp_path), env=env)
+    assert result.stdout.splitlines() == [os.path.realpath(str(tmp_path)), 'from the client']
+
+
+@pytest.mark.parametrize('args, code', [
+    (['boom'], 1),
+    (['echo'], 2),
+    (['bye'], 7),
+])
+def test_exit_codes_are_those_of_the_command(daemon, args, code):
+    assert Run(daemon, *args).returncode == code
+
+
+@pytest.mark.parametrize('args', [['echo', 'hello'], ['boom'], ['echo'], ['unknown'], ['bye']])
+def test_exit_codes_match_running_the_application_directly(daemon, args):
+    assert Run(daemon, *args).returncode == RunDirectly(daemon, *args).returncode
+
+
+def test_uncaught_exceptions_are_reported_to_the_client(daemon):
+    result = Run(daemon, 'boom')
+    assert 'RuntimeError: boom' in result.stderr
+
+
+def test_concurrent_clients_are_served_separately(daemon):
+    sock, _ = daemon
+    clients = [subprocess.Popen([sys.executable, '-I', '-S', CLIENT, sock, 'echo', str(i)],
+        stdout=subprocess.PIPE, universal_newlines=True) for i in range(5)]
+    outputs = [client.communicate(timeout=30)[0] for client in clients]
+    assert outputs == ['{}\n'.format(i) for i in range(5)]
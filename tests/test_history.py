@@ -0,0 +1,243 @@
+import asyncio
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from prompt_toolkit.history import History
+
+from pcshell import globals as globs
+from pcshell import _history
+from pcshell._history import (ShellHistory, SharedHistory, GetHistory, IsSharedLoadingSupported,
+    ReadEntriesReversed, ReadRecordsReversed, ParseEntries, FilterRecords)
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(autouse=True)
+def histories(monkeypatch):
+    """Histories opened by the test are not shared with the rest of the run"""
+    monkeypatch.setattr(_history, '__HISTORIES__', {})
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'history')
+
+
+def Append(path: str, *entries) -> None:
+    history = ShellHistory(path)
+    for entry in entries: history.append(entry)
+    history.close()
+
+
+#------------------------------------------------------------------------------
+#  ANCHOR Reading
+
+def test_entries_are_read_back_most_recent_first(path):
+    Append(path, 'first', 'multi\nline', 'last')
+    assert list(ReadEntriesReversed(path)) == ['last', 'multi\nline', 'first']
+
+    with open(path, 'rb') as f:
+        assert ParseEntries(f.read()) == ['first', 'multi\nline', 'last']
+
+
+def test_missing_files_have_no_entries(path):
+    assert list(ReadEntriesReversed(path)) == []
+
+
+@pytest.mark.parametrize('deduplicate, limits, expected', [
+    (None, {}, ['c', 'b', 'b', 'a', 'b']),
+    ('consecutive', {}, ['c', 'b', 'a', 'b']),
+    ('all', {}, ['c', 'b', 'a']),
+    ('consecutive', { 'max_entries': 2 }, ['c', 'b']),
+])
+def test_records_are_filtered(path, deduplicate, limits, expected):
+    Append(path, 'b', 'a', 'b', 'b', 'c')
+    records = FilterRecords(ReadRecordsReversed(path), deduplicate=deduplicate, **limits)
+    assert [entry for entry, _ in records] == expected
+
+
+def test_invalid_deduplication_modes_are_refused():
+    with pytest.raises(ValueError):
+        list(FilterRecords([], deduplicate='sometimes'))
+
+
+#------------------------------------------------------------------------------
+#  ANCHOR Shell History
+
+def test_files_beyond_the_limits_are_compacted_once_loaded(path, monkeypatch):
+    monkeypatch.setattr(globs, 'HISTORY_MAX_ENTRIES', 3)
+    Append(path, 'one', 'two', 'two', 'three', 'four', 'five')
+
+    assert list(ShellHistory(path).load_history_strings()) == ['five', 'four', 'three']
+    assert list(ReadEntriesReversed(path)) == ['five', 'four', 'three']
+
+
+def test_entries_of_other_sessions_are_polled(path):
+    Append(path, 'before')
+    history, other = ShellHistory(path), ShellHistory(path)
+    assert list(history.load_history_strings()) == ['before']
+
+    other.append('from the other session')
+    assert history.poll() == ['from the other session']
+    assert history.poll() == []
+
+    other.append('again')
+    assert history.append('mine') == ['again']
+    assert list(ReadEntriesReversed(path)) == ['mine', 'again', 'from the other session', 'before']
+
+
+def test_a_cleared_history_keeps_being_appended_to(path):
+    history = ShellHistory(path)
+    history.append('old')
+    history.clear()
+    history.append('new')
+    history.close()
+    assert list(ReadEntriesReversed(path)) == ['new']
+
+
+def test_sessions_keep_appending_to_a_history_cleared_by_another(path):
+    history, other = ShellHistory(path), ShellHistory(path)
+    other.append('old')
+    history.clear()
+    other.append('new')
+    other.close()
+    assert list(ReadEntriesReversed(path)) == ['new']
+
+
+def test_clearing_does_not_cut_short_a_session_loading_the_file(path):
+    # A process, so that a crash reading the file (SIGBUS, were it truncated while mapped) fails the test only
+    script = textwrap.dedent('''
+        import sys
+        from pcshell import globals as globs
+        from pcshell._history import ShellHistory
+
+        globs.HISTORY_MAX_ENTRIES = None
+        writer = ShellHistory(sys.argv[1])
+        for i in range(20000): writer.append('entry {}'.format(i))
+        writer.close()
+
+        entries = ShellHistory(sys.argv[1]).load_history_strings()
+        first = next(entries)
+        ShellHistory(sys.argv[1]).clear()
+        print(first, len(list(entries)))
+    ''')
+
+    result = subprocess.run([sys.executable, '-c', script, path], env=dict(os.environ, PYTHONPATH=ROOT),
+        stdout=subprocess.PIPE, universal_newlines=True, timeout=60)
+    assert result.returncode == 0
+    assert result.stdout.split() == ['entry', '19999', '19999']
+    assert list(ReadEntriesReversed(path)) == []
+
+
+def test_concurrent_processes_append_whole_entries(path):
+    processes, count = 4, 50
+    script = textwrap.dedent('''
+        import sys
+        from pcshell._history import ShellHistory
+
+        history = ShellHistory(sys.argv[1])
+        for i in range(int(sys.argv[3])):
+            history.append('{0} {1}\\nsecond line of {0} {1}'.format(sys.argv[2], i))
+        history.close()
+    ''')
+
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    workers = [subprocess.Popen([sys.executable, '-c', script, path, str(n), str(count)], env=env) for n in range(processes)]
+    assert [worker.wait(60) for worker in workers] == [0] * processes
+
+    entries = list(ReadEntriesReversed(path))
+    expected = ['{0} {1}\nsecond line of {0} {1}'.format(n, i) for n in range(processes) for i in range(count)]
+    assert sorted(entries) == sorted(expected)
+
+    # Each process appended its own entries in order
+    for n in range(processes):
+        mine = [entry for entry in reversed(entries) if entry.startswith('{} '.format(n))]
+        assert mine == ['{0} {1}\nsecond line of {0} {1}'.format(n, i) for i in range(count)]
+
+
+#------------------------------------------------------------------------------
+#  ANCHOR prompt_toolkit Versions
+
+@pytest.mark.skipif(SharedHistory is None, reason='Requires prompt_toolkit 3.0.17+')
+def test_shared_history_loads_in_the_background_and_polls(path):
+    Append(path, 'one', 'two')
+    history = GetHistory(path)
+    assert isinstance(history, SharedHistory)
+    assert GetHistory(path) is history
+
+    async def load():
+        return [entry async for entry in history.load()]
+
+    assert asyncio.run(load()) == ['two', 'one']
+
+    history.append_string('three')
+    Append(path, 'from another session')
+    assert asyncio.run(load()) == ['from another session', 'three', 'two', 'one']
+    assert list(ReadEntriesReversed(path)) == ['from another session', 'three', 'two', 'one']
+
+
+class Pt2ThreadedHistory(History):
+    """The shape of prompt_toolkit 2.0's `ThreadedHistory`: loading calls back rather than yields"""
+
+    def __init__(self, history):
+        self.history = history
+        super(Pt2ThreadedHistory, self).__init__()
+
+    def load(self, item_loaded_callback):
+        pass
+
+    def load_history_strings(self):
+        return self.history.load_history_strings()
+
+    def store_string(self, string):
+        self.history.store_string(string)
+
+
+def test_older_prompt_toolkit_versions_load_the_shell_history_itself(path, monkeypatch):
+    assert not IsSharedLoadingSupported(Pt2ThreadedHistory)
+    assert not IsSharedLoadingSupported(None)
+
+    monkeypatch.setattr(_history, 'SharedHistory', None)
+    Append(path, 'one')
+
+    history = GetHistory(path)
+    assert type(history) is ShellHistory
+    assert list(history.load_history_strings()) == ['one']
+
+    history.append_string('two')
+    history.close()
+    assert list(ReadEntriesReversed(path)) == ['two', 'one']
+
+
+@pytest.mark.skipif(not os.environ.get('PCSHELL_PT2_PATH'), reason='Set $PCSHELL_PT2_PATH to a directory holding prompt_toolkit 2.0')
+def test_shells_replay_on_prompt_toolkit_2(tmp_path):
+    """Runs a shell with prompt_toolkit 2.0 (installed with `pip install --target $PCSHELL_PT2_PATH prompt_toolkit==2.0.10`)"""
+    (tmp_path / 'pt2app.py').write_text(textwrap.dedent('''
+        import pcshell
+
+        @pcshell.shell(prompt='pt2', intro='')
+        def app():
+            """prompt_toolkit 2.0"""
+
+        @app.command()
+        @pcshell.argument('word', type=str)
+        def say(word):
+            return word
+    '''))
+    (tmp_path / 'script.keys').write_text('say one\nsay two\n{up}{up}\n')
+
+    env = dict(os.environ, HOME=str(tmp_path), USERPROFILE=str(tmp_path),
+        PYTHONPATH=os.pathsep.join([os.environ['PCSHELL_PT2_PATH'], ROOT, str(tmp_path)]))
+    check = subprocess.run([sys.executable, '-c', 'import prompt_toolkit; print(prompt_toolkit.__version__)'],
+        env=env, stdout=subprocess.PIPE, universal_newlines=True)
+    assert check.stdout.startswith('2.')
+
+    result = subprocess.run([sys.executable, '-m', 'pcshell.replay', 'pt2app:app', str(tmp_path / 'script.keys'), '--fail-on-error', '--history'],
+        env=env, cwd=str(tmp_path), stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, timeout=120)
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert list(ReadEntriesReversed(str(tmp_path / globs.HISTORY_FILENAME))) == ['say one', 'say two', 'say one']
@@ -0,0 +1,83 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+APP = '''
+import click
+import pcshell
+
+
+@pcshell.shell(prompt='oneshot', intro='')
+def cli():
+    """Runs one command"""
+
+
+@cli.command()
+@pcshell.option('--name', default='world')
+def hello(name):
+    """Says hello"""
+    click.echo('hello {}'.format(name))
+'''
+
+# Modules only the interactive shell, or the commands measuring & running other commands, should need
+DEFERRED_MODULES = (
+    'prompt_toolkit', 'pygments', 'asyncio', 'pcshell._lexer', 'pcshell._completion',
+    'cProfile', 'pstats', 'tracemalloc', 'pickle', 'csv', 'concurrent.futures.thread'
+)
+
+
+@pytest.fixture
+def run(tmp_path):
+    """Returns a function running Python code in a fresh interpreter, next to the application"""
+    (tmp_path / 'oneshotapp.py').write_text(textwrap.dedent(APP))
+    env = dict(os.environ, HOME=str(tmp_path), USERPROFILE=str(tmp_path), PYTHONPATH=os.pathsep.join([ROOT, str(tmp_path)]))
+
+    def run_(code: str, *args) -> subprocess.CompletedProcess:
+        return subprocess.run([sys.executable] + list(args) + ['-c', textwrap.dedent(code)], env=env, cwd=str(tmp_path),
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, timeout=60)
+
+    return run_
+
+
+def ImportedModules(importtime: str) -> list:
+    """The modules listed by `python -X importtime`, in the order they were imported"""
+    return [line.rsplit('|', 1)[1].strip() for line in importtime.splitlines() if line.startswith('import time:')][1:]
+
+
+def test_one_shot_runs_leave_the_deferred_modules_unimported(run):
+    result = run('''
+        import sys
+        import oneshotapp
+        sys.argv = ['oneshotapp', 'hello', '--name', 'cron']
+        oneshotapp.cli()
+    ''', '-X', 'importtime')
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == 'hello cron\n'
+
+    modules = ImportedModules(result.stderr)
+    assert 'click' in modules and 'pcshell.shell' in modules
+    assert [name for name in modules if name.startswith(DEFERRED_MODULES)] == []
+
+
+def test_the_lexer_and_completers_are_imported_on_first_access(run):
+    result = run('''
+        import sys
+        import pcshell
+
+        assert 'prompt_toolkit' not in sys.modules and 'pcshell._lexer' not in sys.modules
+        from pcshell._lexer import ShellLexer
+        from pcshell._completion import ClickCompleter, StyledFuzzyCompleter
+        assert pcshell.ShellLexer is ShellLexer
+        assert pcshell.ClickCompleter is ClickCompleter and pcshell.StyledFuzzyCompleter is StyledFuzzyCompleter
+
+        try: pcshell.Missing
+        except AttributeError as e: print(e)
+    ''')
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "module 'pcshell' has no attribute 'Missing'"
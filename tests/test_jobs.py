@@ -0,0 +1,235 @@
+from io import StringIO
+
+import sys
+import time
+import threading
+
+import click
+import pytest
+
+import pcshell
+from pcshell import globals as globs
+from pcshell import _jobs
+from pcshell.jobs import JOBS, JobTimeout, CheckCancelled
+from pcshell._jobs import CaptureOutput, EmitFinished
+
+
+def LastJob() -> _jobs.Job:
+    return list(JOBS.values())[-1]
+
+
+class Terminal(StringIO):
+    def isatty(self):
+        return True
+
+
+def UseTerminal(monkeypatch) -> Terminal:
+    """Makes standard output a terminal, so click keeps the colors of what is written to it.
+    Called from the test itself, as pytest sets its own standard output before running it
+    """
+    terminal = Terminal()
+    monkeypatch.setattr(sys, 'stdout', terminal)
+    return terminal
+
+
+@pytest.fixture
+def shell(app, start):
+    @app.command()
+    @pcshell.option('--pair', default=[], literal_tuple_type=[int, str])
+    @pcshell.argument('word', type=str)
+    def show(pair, word):
+        click.echo('{} {!r}'.format(word, pair))
+        return pair
+
+    @app.command()
+    @pcshell.argument('word', type=str)
+    def colored(word):
+        click.secho(word, fg='red')
+
+    @app.command()
+    def spin():
+        while True:
+            CheckCancelled()
+            time.sleep(0.005)
+
+    @app.command(timeout=0.05)
+    def timed():
+        while True:
+            CheckCancelled()
+            time.sleep(0.005)
+
+    return start()
+
+
+#------------------------------------------------------------------------------
+#  ANCHOR Parallel & Background Commands
+
+def test_parallel_commands_parse_typed_tuples_from_their_own_line(shell, capsys):
+    shell.onecmd('parallel "show --pair [1, a] p" "show --pair [2, b] q"')
+    assert shell.last_error is None
+
+    out = capsys.readouterr().out
+    assert "p [1, 'a']" in out
+    assert "q [2, 'b']" in out
+
+
+def test_parallel_output_keeps_its_colors(shell, monkeypatch):
+    terminal = UseTerminal(monkeypatch)
+    shell.onecmd('parallel "colored one" "colored two"')
+    assert shell.last_error is None
+
+    out = terminal.getvalue()
+    assert click.style('one', fg='red') in out and click.style('two', fg='red') in out
+
+
+def test_parallel_expands_a_template_line(shell, capsys):
+    shell.onecmd('parallel "show {}" one two three')
+    assert shell.last_error is None
+    assert [line for line in capsys.readouterr().out.splitlines() if line.endswith(' None')] == ['one None', 'two None', 'three None']
+
+
+def test_background_commands_parse_typed_tuples_from_their_own_line(shell):
+    shell.onecmd('show --pair [3, c] r &')
+    job = LastJob()
+    job.wait()
+    assert job.error is None
+    assert job.result == [3, 'c']
+
+
+def test_background_output_is_held_until_reported(app, start, capsys):
+    release = threading.Event()
+
+    @app.command()
+    def slow():
+        click.echo('from the background')
+        release.wait(5)
+        return 'done'
+
+    shell = start()
+    assert shell.onecmd('slow &') is False
+    job = LastJob()
+
+    time.sleep(0.05)
+    assert job.status == 'Running'
+    assert 'from the background' not in capsys.readouterr().out
+
+    release.set()
+    job.wait()
+    assert job.result == 'done'
+    assert job.output.getvalue() == 'from the background\n'
+
+    EmitFinished()
+    assert job.id not in JOBS
+    assert 'from the background' in capsys.readouterr().out
+
+
+def test_background_output_keeps_its_colors(shell, monkeypatch):
+    terminal = UseTerminal(monkeypatch)
+    shell.onecmd('colored red &')
+    job = LastJob()
+    job.wait()
+    assert click.style('red', fg='red') in job.output.getvalue()
+
+    EmitFinished()
+    assert click.style('red', fg='red') in terminal.getvalue()
+
+
+def test_killed_commands_stop_cooperatively(shell, capsys):
+    shell.onecmd('spin &')
+    job = LastJob()
+
+    shell.onecmd('jobs')
+    assert '[{}]'.format(job.id) in capsys.readouterr().out
+
+    shell.onecmd('kill {}'.format(job.id))
+    job.wait()
+    assert job.status == 'Cancelled'
+
+
+#------------------------------------------------------------------------------
+#  ANCHOR Timeouts
+
+def test_timed_out_commands_are_moved_to_the_job_table(shell):
+    shell.onecmd('timed')
+    assert isinstance(shell.last_error, JobTimeout)
+
+    job = LastJob()
+    job.wait()
+    assert job.status == 'Timed out'
+
+
+def test_commands_finishing_in_time_keep_their_colors(app, start, monkeypatch):
+    @app.command(timeout=5)
+    def quick():
+        click.secho('in time', fg='red')
+
+    shell = start()
+    terminal = UseTerminal(monkeypatch)
+    shell.onecmd('quick')
+    assert shell.last_error is None
+    assert click.style('in time', fg='red') in terminal.getvalue()
+
+
+def test_timed_out_commands_do_not_hold_background_workers(app, start, monkeypatch, capsys):
+    # A single worker for background commands, which a command ignoring its cancellation must not keep
+    monkeypatch.setattr(globs, 'PARALLEL_MAX_WORKERS', 1)
+    monkeypatch.setattr(_jobs, '__EXECUTOR__', None)
+    release = threading.Event()
+
+    @app.command(timeout=0.05)
+    def hang():
+        release.wait(5)
+
+    @app.command()
+    def quick():
+        return 'done'
+
+    shell = start()
+    try:
+        shell.onecmd('hang')
+        assert isinstance(shell.last_error, JobTimeout)
+        hung = LastJob()
+
+        shell.onecmd('jobs')
+        assert 'Timed out, still running' in capsys.readouterr().out
+
+        shell.onecmd('quick &')
+        job = LastJob()
+        assert job.future.result(timeout=2) is job
+        assert job.result == 'done'
+        assert not hung.done
+    finally:
+        release.set()
+
+
+#------------------------------------------------------------------------------
+#  ANCHOR Per-Thread Output
+
+def test_output_is_captured_for_the_current_thread_only(capsys):
+    captured = StringIO()
+    ready, written = threading.Event(), threading.Event()
+
+    def other():
+        ready.wait(5)
+        print('from the other thread')
+        written.set()
+
+    thread = threading.Thread(target=other)
+    thread.start()
+    with CaptureOutput(captured):
+        print('from this thread')
+        ready.set()
+        written.wait(5)
+    thread.join()
+
+    assert captured.getvalue() == 'from this thread\n'
+    assert capsys.readouterr().out == 'from the other thread\n'
+
+
+def test_captured_output_can_be_teed(capsys):
+    captured = StringIO()
+    with CaptureOutput(captured, tee=True):
+        print('both')
+
+    assert captured.getvalue() == 'both\n'
+    assert capsys.readouterr().out == 'both\n'
@@ -0,0 +1,76 @@
+import click
+import pytest
+
+import pcshell
+
+
+@pytest.fixture
+def shell(app, start):
+    @app.command()
+    @pcshell.option('--pair', default=[], literal_tuple_type=[int, str])
+    @pcshell.argument('word', type=str)
+    def show(pair, word):
+        """Shows a word & a pair"""
+        click.echo('{} {!r}'.format(word, pair))
+        return pair
+
+    return start()
+
+
+#------------------------------------------------------------------------------
+#  ANCHOR Time
+
+def test_time_runs_the_line_as_typed(shell, capsys):
+    shell.onecmd('time show --pair [1, a] p')
+
+    out = capsys.readouterr().out
+    assert "p [1, 'a']" in out
+    assert '[time] show --pair [1, a] p' in click.unstyle(out)
+    assert 'wall' in out and 'peak' in out
+
+
+#------------------------------------------------------------------------------
+#  ANCHOR Profile
+
+@pytest.fixture
+def busy(app):
+    @app.command()
+    @pcshell.argument('n', type=int)
+    def busy(n):
+        """Spends some time allocating"""
+        data = []
+        for i in range(n): data.append(str(i))
+        return data
+
+
+def test_profile_runs_the_line_as_typed(shell, capsys):
+    shell.onecmd('profile --top 3 --no-save show --pair [1, a] p')
+
+    out = click.unstyle(capsys.readouterr().out)
+    assert "p [1, 'a']" in out
+    assert '[profile] show --pair [1, a] p' in out
+    assert 'function calls' in out
+
+
+def test_profiles_are_saved_next_to_the_history(shell, tmp_path, capsys):
+    shell.onecmd('profile show p')
+    assert len(list(tmp_path.glob('*.prof'))) == 1
+
+
+def test_the_sampling_profiler_saves_collapsed_stacks(shell, busy, tmp_path, capsys):
+    shell.onecmd('profile --sample busy 500000')
+
+    out = click.unstyle(capsys.readouterr().out)
+    assert ' samples' in out
+    saved, = tmp_path.glob('*.collapsed')
+    stacks = saved.read_text().splitlines()
+    assert stacks and all(line.rsplit(' ', 1)[1].isdigit() for line in stacks)
+    assert any('busy' in line for line in stacks)
+
+
+def test_the_memory_profiler_lists_allocations(shell, busy, capsys):
+    shell.onecmd('profile --memory --no-save busy 1000')
+
+    out = click.unstyle(capsys.readouterr().out)
+    assert 'Memory allocated (by line)' in out
+    assert 'test_measure.py' in out.split('Memory allocated (by line)')[1]
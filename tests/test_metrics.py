@@ -0,0 +1,62 @@
+import json
+import time
+
+import pytest
+
+from pcshell import globals as globs
+from pcshell._metrics import MetricsRegistry, METRICS
+
+
+@pytest.fixture
+def path(tmp_path, monkeypatch):
+    path = tmp_path / 'metrics.json'
+    monkeypatch.setattr(globs, 'METRICS_FILE', str(path))
+    return path
+
+
+@pytest.fixture
+def registry(path):
+    registry = MetricsRegistry()
+    yield registry
+    # Any pending write is done now, rather than after the test
+    registry.flush()
+
+
+def Invocations(path) -> dict:
+    return { name: command['invocations'] for name, command in json.loads(path.read_text())['commands'].items() }
+
+
+def test_metrics_are_written_once_the_interval_has_passed(registry, path, monkeypatch):
+    monkeypatch.setattr(globs, 'METRICS_FLUSH_INTERVAL', 0)
+    registry.record('show', 0.01)
+    assert Invocations(path) == { 'show': 1 }
+
+
+def test_idle_sessions_write_what_they_recorded_once_the_interval_has_passed(registry, path, monkeypatch):
+    monkeypatch.setattr(globs, 'METRICS_FLUSH_INTERVAL', 0.2)
+    registry.record('show', 0.01)
+    registry.record('show', 0.01, RuntimeError())
+    assert not path.exists()
+
+    # No command ends after these
+    deadline = time.monotonic() + 10
+    while not path.exists() and time.monotonic() < deadline: time.sleep(0.02)
+    assert Invocations(path) == { 'show': 2 }
+
+
+def test_metrics_are_written_when_the_session_closes(app, start, path, monkeypatch):
+    monkeypatch.setattr(globs, 'METRICS_FLUSH_INTERVAL', 3600)
+    METRICS.clear()
+
+    @app.command()
+    def show():
+        """Shows nothing"""
+
+    shell = start()
+    shell.onecmd('show')
+    assert not path.exists()
+
+    shell.close_session()
+    assert Invocations(path) == { 'show': 1 }
+    assert METRICS._timer is None
+    METRICS.clear()
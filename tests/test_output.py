@@ -0,0 +1,114 @@
+import sys
+
+import click
+import pytest
+
+import pcshell
+from pcshell import globals as globs
+from pcshell.output import RegisterEncoder, ENCODERS, JsonEncoder
+from pcshell._output import WriteOutput
+
+
+ROWS = [{ 'name': 'a', 'size': 1 }, { 'name': 'b', 'size': 2 }]
+
+
+@pytest.fixture
+def one_shot(monkeypatch, tmp_path):
+    """Applications created during the test run single commands, and write their results with the output format"""
+    monkeypatch.setattr(globs, '__IsShell__', False)
+    monkeypatch.setattr(globs, '__MASTER_SHELL__', None)
+    monkeypatch.delenv(globs.OUTPUT_FORMAT_ENVVAR, raising=False)
+    monkeypatch.setenv('HOME', str(tmp_path))
+    monkeypatch.setenv('USERPROFILE', str(tmp_path))
+
+
+@pytest.fixture
+def calls():
+    return []
+
+
+@pytest.fixture
+def app(one_shot, tmp_path, calls):
+    @pcshell.shell(prompt='test', intro='', hist_file=str(tmp_path / 'history'))
+    def app():
+        """Test application"""
+
+    @app.command()
+    def rows():
+        calls.append('rows')
+        return ROWS
+
+    return app
+
+
+@pytest.mark.parametrize('format, expected', [
+    ('json', '[{"name": "a", "size": 1}, {"name": "b", "size": 2}]\n'),
+    ('compact', '[{"name":"a","size":1},{"name":"b","size":2}]\n'),
+    ('ndjson', '{"name":"a","size":1}\n{"name":"b","size":2}\n'),
+    ('csv', 'name,size\na,1\nb,2\n'),
+    ('tsv', 'name\tsize\na\t1\nb\t2\n'),
+])
+def test_encoders(format, expected, capsys):
+    WriteOutput(ROWS, format)
+    assert capsys.readouterr().out == expected
+
+
+def test_iterators_are_written_item_by_item(capsys):
+    written = []
+
+    def items():
+        for row in ROWS:
+            yield row
+            written.append(capsys.readouterr().out)
+
+    WriteOutput(items(), 'ndjson')
+    assert written == ['{"name":"a","size":1}\n', '{"name":"b","size":2}\n']
+
+
+def test_registered_encoders_can_be_selected(app, monkeypatch, capsys):
+    class Names(JsonEncoder):
+        def write_value(self, value, out):
+            out.write(','.join(row['name'] for row in value) + '\n')
+
+    monkeypatch.setitem(ENCODERS, 'names', None)
+    RegisterEncoder('names', Names())
+
+    app.main(args=['--format', 'names', 'rows'], standalone_mode=False)
+    assert capsys.readouterr().out == 'a,b\n'
+
+
+def test_the_format_falls_back_to_the_environment(app, monkeypatch, capsys):
+    monkeypatch.setenv(globs.OUTPUT_FORMAT_ENVVAR, 'csv')
+    app.main(args=['rows'], standalone_mode=False)
+    assert capsys.readouterr().out == 'name,size\na,1\nb,2\n'
+
+
+def test_an_unknown_format_fails_before_the_command_runs(app, monkeypatch, calls):
+    monkeypatch.setenv(globs.OUTPUT_FORMAT_ENVVAR, 'unknown')
+    with pytest.raises(click.BadParameter):
+        app.main(args=['rows'], standalone_mode=False)
+    assert calls == []
+
+    monkeypatch.delenv(globs.OUTPUT_FORMAT_ENVVAR)
+    with pytest.raises(click.BadParameter):
+        app.main(args=['--format', 'unknown', 'rows'], standalone_mode=False)
+    assert calls == []
+
+
+def test_msgpack_is_written_as_bytes(capfdbinary):
+    msgpack = pytest.importorskip('msgpack')
+    WriteOutput(ROWS, 'msgpack')
+    assert msgpack.unpackb(capfdbinary.readouterr().out) == ROWS
+
+
+def test_a_missing_msgpack_fails_before_the_command_runs(app, monkeypatch, calls):
+    # Importing a module set to None raises an ImportError
+    monkeypatch.setitem(sys.modules, 'msgpack', None)
+    with pytest.raises(click.UsageError, match='msgpack'):
+        app.main(args=['--format', 'msgpack', 'rows'], standalone_mode=False)
+    assert calls == []
+
+    monkeypatch.setenv(globs.OUTPUT_FORMAT_ENVVAR, 'msgpack')
+    with pytest.raises(click.UsageError, match='msgpack'):
+        app.main(args=['rows'], standalone_mode=False)
+    assert calls == []
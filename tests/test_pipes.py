@@ -0,0 +1,105 @@
+import click
+import pytest
+
+import pcshell
+from pcshell._pipes import SplitPipeline
+
+
+@pytest.fixture
+def produced():
+    return []
+
+
+RECORD = { 'name': 'value' }
+
+
+@pytest.fixture
+def shell(app, start, produced):
+    @app.command()
+    @pcshell.argument('n', type=int)
+    def produce(n):
+        for i in range(n):
+            produced.append(i)
+            yield i
+
+    @app.command()
+    def record():
+        return RECORD
+
+    @app.command(pipe='values')
+    @pcshell.option('--values', hidden=True)
+    def total(values):
+        return sum(values)
+
+    @app.command(pipe='values')
+    @pcshell.option('--values', hidden=True)
+    @pcshell.argument('n', type=int)
+    def head(values, n):
+        return [value for value, _ in zip(values, range(n))]
+
+    @app.command(pipe='obj')
+    @pcshell.option('--obj', hidden=True)
+    def same(obj):
+        return obj
+
+    @app.command()
+    def plain():
+        return 'plain'
+
+    return start()
+
+
+@pytest.mark.parametrize('line, stages', [
+    ('a | b', ['a', 'b']),
+    ('a "x | y" | b', ['a "x | y"', 'b']),
+    ("a 'x | y'", ["a 'x | y'"]),
+    ('a x\\|y | b', ['a x\\|y', 'b']),
+    ('a --t [1|2] | b', ['a --t [1|2]', 'b']),
+    ('a || b', ['a || b']),
+    ('a |', ['a', '']),
+])
+def test_split_pipeline(line, stages):
+    assert SplitPipeline(line) == stages
+
+
+def test_return_values_are_passed_as_is(shell):
+    shell.onecmd('produce 4 | total')
+    assert shell.last_error is None
+    assert shell.last_result == 6
+
+
+def test_objects_are_not_serialized(shell):
+    shell.onecmd('record | same')
+    assert shell.last_result is RECORD
+
+    shell.onecmd('record | same | same')
+    assert shell.last_result is RECORD
+
+
+def test_generators_are_consumed_lazily(shell, produced):
+    shell.onecmd('produce 1000 | head 3')
+    assert shell.last_result == [0, 1, 2]
+    assert len(produced) <= 4
+
+
+def test_unpiped_generators_run_to_completion(shell, produced):
+    shell.onecmd('produce 5')
+    assert shell.last_error is None
+    assert produced == [0, 1, 2, 3, 4]
+
+
+def test_commands_without_a_pipe_parameter_fail(shell):
+    shell.onecmd('record | plain')
+    assert isinstance(shell.last_error, click.UsageError)
+    assert 'does not accept piped input' in shell.last_error.format_message()
+
+
+def test_empty_stages_fail(shell):
+    shell.onecmd('record |')
+    assert isinstance(shell.last_error, click.UsageError)
+
+
+def test_a_failed_stage_ends_the_pipeline(shell, produced):
+    shell.onecmd('total --values 1 | produce 3')
+    assert shell.last_error is not None
+    assert produced == []
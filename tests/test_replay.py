@@ -0,0 +1,109 @@
+import tempfile
+
+import click
+import pytest
+
+import pcshell
+from pcshell.replay import KeystrokeReplay, ParseKeystrokes, KEYS
+from pcshell._history import ReadEntriesReversed
+
+
+@pytest.fixture
+def app(app):
+    @app.command()
+    @pcshell.argument('word', type=str)
+    def say(word):
+        """Says a word"""
+        click.echo('said {}'.format(word))
+        return word
+
+    @app.command()
+    def fail():
+        """Always fails"""
+        raise RuntimeError('boom')
+
+    return app
+
+
+def Lines(replay: KeystrokeReplay) -> list:
+    return [command['line'] for command in replay.report()['commands']]
+
+
+@pytest.mark.parametrize('script, expected', [
+    ('ab', [('a', 'a'), ('b', 'b')]),
+    ('a\n', [('a', 'a'), ('{enter}', KEYS['enter'])]),
+    ('{Tab}{up}', [('{tab}', KEYS['tab']), ('{up}', KEYS['up'])]),
+    ('{{}', [('{', '{'), ('}', '}')]),
+])
+def test_keystroke_scripts(script, expected):
+    assert ParseKeystrokes(script) == expected
+
+
+def test_unknown_keys_are_refused():
+    with pytest.raises(ValueError):
+        ParseKeystrokes('{nokey}')
+
+
+def test_commands_and_their_results_are_reported(replay, capsys):
+    result = replay('say one\nsay two\nfail\n')
+    assert result.complete and result.timed_out is None
+
+    commands = result.report()['commands']
+    assert [(command['line'], command['ok'], command['result']) for command in commands] == [
+        ('say one', True, "'one'"), ('say two', True, "'two'"), ('fail', False, None)]
+    assert commands[2]['error'] == 'RuntimeError: boom'
+    out = capsys.readouterr().out
+    assert 'said one' in out and 'said two' in out
+
+
+def test_the_shell_exits_once_the_keystrokes_run_out(replay):
+    # Neither ending with "exit" nor with a complete line
+    result = replay('say one\nsay tw', timeout=5)
+    assert result.complete
+    assert Lines(result) == ['say one']
+
+
+def test_keystrokes_are_timed(replay):
+    result = replay('say one\n')
+    report = result.report()
+    assert report['processed'] == report['keystrokes'] == 8
+    assert report['first_prompt_ms'] is not None
+    assert report['summary']['latency']['n'] == 8
+
+
+def test_history_is_recalled_without_using_the_history_file(replay, tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+    (tmp_path / 'history').write_bytes(b'')
+    result = replay('say one\n{up}\nsay two\n{up}{up}\n')
+    assert Lines(result) == ['say one', 'say one', 'say two', 'say one']
+    assert list(ReadEntriesReversed(str(tmp_path / 'history'))) == []
+
+    # The next replay starts with a history of its own
+    result = replay('{up}say three\n')
+    assert Lines(result) == ['say three']
+    # Its temporary history file was removed
+    assert not list(tmp_path.glob('pcshell-replay-*'))
+
+
+def test_the_history_file_is_used_if_asked(replay, tmp_path):
+    replay('say one\n', history=True)
+    result = replay('{up}\n', history=True)
+    assert Lines(result) == ['say one']
+    assert list(ReadEntriesReversed(str(tmp_path / 'history'))) == ['say one']
+
+    other = str(tmp_path / 'other')
+    replay('say two\n', history=other)
+    assert list(ReadEntriesReversed(other)) == ['say two']
+    assert list(ReadEntriesReversed(str(tmp_path / 'history'))) == ['say one']
+
+
+def test_commands_are_completed(replay):
+    result = replay('sa{tab} one\n')
+    assert Lines(result) == ['say one']
+
+
+def test_the_input_is_closed_once():
+    with KeystrokeReplay('') as replay:
+        replay.close()
+        replay.close()
+    replay.close()
@@ -0,0 +1,120 @@
+import asyncio
+import contextlib
+
+import pytest
+
+from pcshell import _async, _resources
+from pcshell.resources import ResourceRegistry, resource, pass_resource, GetResource
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    """Resources registered by the test are not shared with the rest of the run"""
+    registry = ResourceRegistry()
+    monkeypatch.setattr(_resources, 'RESOURCES', registry)
+    yield registry
+    registry.close()
+    _async.CloseSessionLoop()
+
+
+@pytest.fixture
+def events():
+    return []
+
+
+def test_resources_are_shared_by_the_shell_and_its_subshells(app, start, events):
+    @resource()
+    def client():
+        events.append('created')
+        return object()
+
+    @app.command()
+    @pass_resource('client')
+    def top(client):
+        """Uses the client"""
+        return client
+
+    @app.new_shell(prompt='sub')
+    def sub():
+        """A subshell"""
+
+    @sub.command()
+    @pass_resource('client', arg='shared')
+    def nested(shared):
+        """Uses the client too"""
+        return shared
+
+    shell = start()
+    shell.onecmd('top')
+    first = shell.last_result
+
+    sub.shell.ctx = sub.make_context('sub', [], parent=shell.ctx)
+    sub.shell.onecmd('nested')
+    assert sub.shell.last_result is first
+    assert shell.get_resource('client') is first is GetResource('client')
+    assert events == ['created']
+
+
+def test_resources_are_torn_down_in_reverse_order_once_the_shell_closes(app, start, registry, events):
+    @resource()
+    def generated():
+        events.append('create generated')
+        yield 'generated'
+        events.append('close generated')
+
+    @resource()
+    @contextlib.contextmanager
+    def managed():
+        events.append('create managed')
+        yield 'managed'
+        events.append('close managed')
+
+    @resource(teardown=lambda value: events.append('close ' + value))
+    def plain():
+        events.append('create plain')
+        return 'plain'
+
+    @resource()
+    async def awaited():
+        events.append('create awaited')
+        await asyncio.sleep(0)
+        yield 'awaited'
+        events.append('close awaited')
+
+    @resource()
+    def unused():
+        events.append('create unused')
+
+    shell = start()
+    for name in ('managed', 'plain', 'awaited', 'generated'): shell.get_resource(name)
+    assert events == ['create managed', 'create plain', 'create awaited', 'create generated']
+
+    events.clear()
+    shell.postloop()
+    assert events == ['close generated', 'close awaited', 'close plain', 'close managed']
+    assert not registry.is_created('plain')
+
+
+def test_failed_teardowns_do_not_stop_the_others(registry, events, caplog):
+    def broken(value):
+        raise RuntimeError('broken')
+
+    registry.register('first', lambda: 'first', teardown=events.append)
+    registry.register('second', lambda: 'second', teardown=broken)
+    registry.get('first'), registry.get('second')
+
+    registry.close()
+    assert events == ['first']
+    assert 'Failed to tear down resource "second"' in caplog.text
+
+
+def test_resources_in_use_cannot_be_replaced(registry):
+    registry.register('value', lambda: 1)
+    registry.register('value', lambda: 2)
+    assert registry.get('value') == 2
+
+    with pytest.raises(RuntimeError, match='already in use'):
+        registry.register('value', lambda: 3)
+
+    with pytest.raises(KeyError, match='missing'):
+        registry.get('missing')
@@ -0,0 +1,142 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import click
+import pytest
+
+from pcshell import globals as globs
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+APP = '''
+import click
+import pcshell
+
+
+@pcshell.shell(prompt='script', intro='')
+def cli():
+    """Runs scripts"""
+
+
+@cli.command()
+@pcshell.argument('word', type=str)
+def say(word):
+    """Says a word"""
+    click.echo('said {}'.format(word))
+
+
+@cli.command()
+def fail():
+    """Always fails"""
+    raise click.ClickException('failed')
+'''
+
+
+@pytest.fixture
+def run(tmp_path):
+    """Returns a function running the application in a process, with the lines of a script"""
+    (tmp_path / 'scriptapp.py').write_text(textwrap.dedent(APP).replace("intro=''", "intro='Welcome'"))
+    env = dict(os.environ, HOME=str(tmp_path), USERPROFILE=str(tmp_path), PYTHONPATH=os.pathsep.join([ROOT, str(tmp_path)]))
+
+    def run_(script: str, *args, **kwargs) -> subprocess.CompletedProcess:
+        path = tmp_path / 'lines.pcsh'
+        path.write_text(textwrap.dedent(script).lstrip('\n'))
+        return subprocess.run([sys.executable, '-c', 'import scriptapp; scriptapp.cli()'] + [arg.format(path) for arg in args],
+            env=env, cwd=str(tmp_path), stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, timeout=60, **kwargs)
+
+    return run_
+
+
+@pytest.fixture
+def pipe(run):
+    """Returns a function running the shell in a process, with its lines piped to stdin"""
+    def pipe_(lines: str) -> subprocess.CompletedProcess:
+        return run('', input=textwrap.dedent(lines).lstrip('\n'))
+
+    return pipe_
+
+
+def test_scripts_exit_with_0_once_every_line_succeeded(run):
+    result = run('''
+        # A comment
+        say one
+
+        say two
+    ''', '--script', '{}')
+    assert result.returncode == 0
+    assert [line for line in result.stdout.splitlines() if line] == ['said one', 'said two']
+    assert '2 lines executed, 0 failed' in click.unstyle(result.stderr)
+
+
+def test_scripts_exit_with_1_from_the_first_failed_line(run):
+    result = run('''
+        say one
+        fail
+        say two
+    ''', '--script={}')
+    assert result.returncode == 1
+
+    report = click.unstyle(result.stderr)
+    assert '[lines.pcsh:2] ClickException' in report
+    assert '[lines.pcsh:3] OK' in report
+    assert '3 lines executed, 1 failed' in report
+
+
+def test_piped_lines_run_without_an_intro_a_prompt_or_history(pipe, tmp_path):
+    result = pipe('''
+        say one
+        say two
+    ''')
+    assert result.returncode == 0
+    assert result.stdout == 'said one\nsaid two\n'
+    assert not (tmp_path / globs.HISTORY_FILENAME).exists()
+
+
+def test_piped_lines_exit_with_1_once_a_line_failed(pipe):
+    result = pipe('''
+        say one
+        fail
+        say two
+    ''')
+    assert result.returncode == 1
+    assert result.stdout == 'said one\nsaid two\n'
+    assert 'Error: failed' in result.stderr
+
+
+def test_piped_lines_stop_at_exit(pipe):
+    result = pipe('''
+        say one
+        exit
+        say two
+    ''')
+    assert result.returncode == 0
+    assert result.stdout == 'said one\n'
+
+
+def test_one_shot_help_lists_the_script_option(run):
+    result = run('', '--help')
+    assert '--script' in result.stdout
+
+
+def test_sourced_scripts_run_in_the_current_shell(app, start, tmp_path, capsys):
+    @app.command()
+    @click.argument('word')
+    def say(word):
+        """Says a word"""
+        click.echo('said {}'.format(word))
+
+    path = tmp_path / 'lines.pcsh'
+    path.write_text('say one\nsay two\n')
+
+    shell = start()
+    shell.onecmd('source {}'.format(path))
+    assert shell.last_error is None
+    assert 'said one\nsaid two\n' in capsys.readouterr().out
+
+    path.write_text('say one\nunknown\nsay two\n')
+    shell.onecmd('source {}'.format(path))
+    assert isinstance(shell.last_error, click.ClickException)
+    assert 'did not complete successfully' in shell.last_error.format_message()